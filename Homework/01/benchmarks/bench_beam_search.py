@@ -0,0 +1,54 @@
+"""
+Скорость лучевого поиска при разной ширине луча по сравнению с жадной генерацией.
+
+Шагов декодирования в секунду (один шаг - один батчевый вызов модели для всех лучей) и токенов в секунду,
+где токены - все продолжения, которые модель оценивает за шаг (ширина луча * шаги).
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_beam_search.py --beam-widths 1 2 4 8 16 --max-length 128
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.generation import beam_search, generate  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.tokenizer import ByteTokenizer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--beam-widths', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    tokenizer = ByteTokenizer()
+    model = Model(tokenizer.get_vocab_size(), hidden_size=args.hidden_size)
+    # Без eos все гипотезы доходят до max_length, и число шагов одинаково для всех ширин
+    model.logits.bias.data[tokenizer.eos_token_id] = -100.0
+
+    # Прогрев: первые вызовы LSTM заметно медленнее
+    beam_search(model, tokenizer, num_beams=2, max_length=8)
+
+    start = time.perf_counter()
+    generate(model, tokenizer, temperature=0, max_length=args.max_length)
+    elapsed = time.perf_counter() - start
+    print(f'{"method":>10} {"steps/s":>10} {"tokens/s":>10}')
+    print(f'{"greedy":>10} {args.max_length / elapsed:10.0f} {args.max_length / elapsed:10.0f}')
+    for width in args.beam_widths:
+        start = time.perf_counter()
+        beam_search(model, tokenizer, num_beams=width, max_length=args.max_length)
+        elapsed = time.perf_counter() - start
+        steps_per_sec = args.max_length / elapsed
+        print(f'{"beam " + str(width):>10} {steps_per_sec:10.0f} {steps_per_sec * width:10.0f}')
+
+
+if __name__ == '__main__':
+    main()
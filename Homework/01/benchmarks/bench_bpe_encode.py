@@ -0,0 +1,61 @@
+"""
+Сравнение способов кодирования BpeTokenizer:
+наивного (apply_merges_naive) и рангового (apply_merges) применения склеиваний,
+а также кодирования с предварительным разбиением на слова без кэша и с LRU-кэшем.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_bpe_encode.py --max-vocab 1024 --n-texts 200 --pattern gpt2
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.tokenizer import BpeTokenizer, apply_merges_naive  # noqa: E402
+from scripts.bpe import apply_merges  # noqa: E402
+from bench_bpe_train import make_corpus  # noqa: E402
+
+
+def report(name: str, elapsed: float, n_bytes: int) -> None:
+    print(f'{name:>10}: {elapsed:.3f}s, {n_bytes / elapsed / 2 ** 20:.3f} MB/s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--train-mb', type=float, default=1)
+    parser.add_argument('--max-vocab', type=int, default=1024)
+    parser.add_argument('--n-texts', type=int, default=200)
+    parser.add_argument('--pattern', default='gpt2')
+    args = parser.parse_args()
+
+    texts = make_corpus(0.1, seed=1)[:args.n_texts]
+    n_bytes = sum(len(text.encode('utf-8')) for text in texts)
+    train_texts = make_corpus(args.train_mb)
+
+    tokenizer = BpeTokenizer()
+    tokenizer.train(train_texts, max_vocab=args.max_vocab)
+    list_of_ids = [list(text.encode('utf-8')) for text in texts]
+    results = {}
+    for name, fn in [('naive', apply_merges_naive), ('rank', apply_merges)]:
+        start = time.perf_counter()
+        results[name] = [fn(ids, tokenizer.merges) for ids in list_of_ids]
+        report(name, time.perf_counter() - start, n_bytes)
+    assert results['naive'] == results['rank'], 'encoders disagree'
+
+    tokenizer = BpeTokenizer(pattern=args.pattern)
+    tokenizer.train(train_texts, max_vocab=args.max_vocab)
+    uncached = copy.deepcopy(tokenizer)
+    uncached.cache_size = 0
+    for name, tok in [('no cache', uncached), ('lru cache', tokenizer)]:
+        start = time.perf_counter()
+        results[name] = [tok.encode(text) for text in texts]
+        report(name, time.perf_counter() - start, n_bytes)
+    assert results['no cache'] == results['lru cache'], 'cache changes the output'
+    print(tokenizer.cache_info())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Сравнение наивного и инкрементального обучения BpeTokenizer.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_bpe_train.py --corpus-mb 100 --naive-mb 1 --max-vocab 512
+
+Наивный алгоритм на больших корпусах работает часами, поэтому он запускается только
+на корпусах размером не больше --naive-mb мегабайт. С --pattern (например, gpt2)
+обучение идёт по частотам слов, и память ограничена размером словаря слов.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.tokenizer import BpeTokenizer  # noqa: E402
+
+
+def make_corpus(size_mb: float, seed: int = 0, text_len: int = 1000):
+    """Синтетический корпус: слова из словаря с распределением Ципфа, разбитые на тексты по ~text_len байт."""
+    rng = random.Random(seed)
+    alphabet = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяabcdefghijklmnopqrstuvwxyz'
+    words = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 10))) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    texts, size, target = [], 0, int(size_mb * 2 ** 20)
+    while size < target:
+        text = ' '.join(rng.choices(words, weights, k=text_len // 8))
+        texts.append(text)
+        size += len(text.encode('utf-8'))
+    return texts
+
+
+def run(texts, max_vocab: int, incremental: bool, pattern=None):
+    tokenizer = BpeTokenizer(pattern=pattern)
+    start = time.perf_counter()
+    tokenizer.train(texts, max_vocab=max_vocab, incremental=incremental)
+    return time.perf_counter() - start, tokenizer.merges
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus-mb', type=float, nargs='+', default=[0.25, 1, 10, 100])
+    parser.add_argument('--naive-mb', type=float, default=1)
+    parser.add_argument('--max-vocab', type=int, default=512)
+    parser.add_argument('--pattern', default=None)
+    args = parser.parse_args()
+
+    print(f'{"corpus, MB":>10} | {"naive, s":>10} | {"incremental, s":>14} | {"speedup":>8}')
+    for size_mb in args.corpus_mb:
+        texts = make_corpus(size_mb)
+        fast_time, fast_merges = run(texts, args.max_vocab, incremental=True, pattern=args.pattern)
+        if size_mb <= args.naive_mb:
+            naive_time, naive_merges = run(texts, args.max_vocab, incremental=False, pattern=args.pattern)
+            assert list(naive_merges.items()) == list(fast_merges.items()), 'merges tables differ'
+            print(f'{size_mb:>10} | {naive_time:>10.2f} | {fast_time:>14.2f} | {naive_time / fast_time:>7.1f}x')
+        else:
+            print(f'{size_mb:>10} | {"-":>10} | {fast_time:>14.2f} | {"-":>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Доля паддинга и скорость обучения Trainer со случайными батчами и с BucketBatchSampler.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_bucketing.py --n-texts 2000 --batch-size 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.collator import Collator  # noqa: E402
+from scripts.dataset import MyDataset  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.sampler import BucketBatchSampler, get_lengths  # noqa: E402
+from scripts.tokenizer import ByteTokenizer  # noqa: E402
+from scripts.trainer import Trainer  # noqa: E402
+
+
+def padding_stats(loader, pad_token_id: int):
+    """Доля паддинга и количество настоящих токенов за эпоху."""
+    padded = total = 0
+    for ids in loader:
+        padded += (ids == pad_token_id).sum().item()
+        total += ids.numel()
+    return padded / total, total - padded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-texts', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-length', type=int, default=512)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    text_lengths = np.clip(rng.lognormal(4, 1, size=args.n_texts).astype(int), 1, args.max_length)
+    texts = [''.join(rng.choice(list('abcdefgh '), size=n)) for n in text_lengths]
+    tokenizer = ByteTokenizer()
+    dataset = MyDataset(texts, tokenizer, max_length=args.max_length)
+    lengths = get_lengths(dataset)
+    collator = Collator(tokenizer.pad_token_id)
+
+    samplers = {
+        'random': None,
+        'buckets': BucketBatchSampler(lengths, batch_size=args.batch_size, drop_last=True),
+        'max_tokens': BucketBatchSampler(lengths, max_tokens=args.batch_size * int(lengths.mean())),
+    }
+    print(f'{"sampler":>10} | {"steps":>5} | {"padded":>7} | {"steps/s":>7} | {"tokens/s":>9}')
+    for name, sampler in samplers.items():
+        model = Model(tokenizer.get_vocab_size(), emb_size=64, hidden_size=256)
+        trainer = Trainer(
+            model, dataset, dataset, n_epochs=1, lr=1e-3, train_batch_size=args.batch_size,
+            collator=collator, train_batch_sampler=sampler
+        )
+        ratio, n_tokens = padding_stats(trainer.train_loader, tokenizer.pad_token_id)
+        start = time.perf_counter()
+        trainer.train()
+        elapsed = time.perf_counter() - start
+        steps = len(trainer.train_loader)
+        print(f'{name:>10} | {steps:>5} | {ratio:>7.1%} | {steps / elapsed:>7.2f} | {n_tokens / elapsed:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Время сборки батча: torch.tensor на каждую последовательность + pad_sequence против Collator
+с заранее выделенным буфером (из списков Python и из срезов np.memmap).
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_collator.py --batch-size 64 --max-length 512
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import torch
+from torch.nn.utils.rnn import pad_sequence
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.collator import Collator  # noqa: E402
+
+
+def pad_sequence_collate(data, padding_value: int):
+    """Прежняя реализация Collator."""
+    data = [torch.tensor(x, dtype=torch.long) for x in data]
+    return pad_sequence(data, batch_first=True, padding_value=padding_value)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-length', type=int, default=512)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(1, args.max_length, size=args.batch_size)
+    tokens = rng.integers(0, 259, size=lengths.sum()).astype(np.uint16)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    lists = [tokens[start:start + length].tolist() for start, length in zip(starts, lengths)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tokens.bin')
+        tokens.tofile(path)
+        memmap = np.memmap(path, dtype=np.uint16, mode='r')
+        views = [memmap[start:start + length] for start, length in zip(starts, lengths)]
+
+        collator = Collator(256)
+        masked = Collator(256, return_mask=True)
+        cases = [
+            ('pad_sequence, lists', lambda: pad_sequence_collate(lists, 256)),
+            ('Collator, lists', lambda: collator(lists)),
+            ('Collator, memmap', lambda: collator(views)),
+            ('Collator + mask, memmap', lambda: masked(views)),
+        ]
+        assert torch.equal(cases[0][1](), cases[2][1]())
+        for name, fn in cases:
+            elapsed = timeit.timeit(fn, number=args.repeats) / args.repeats
+            print(f'{name:>24}: {elapsed * 1e6:8.1f} us/batch')
+        del memmap, views
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Масштабирование обучения Trainer в режиме data parallel (torch.distributed, gloo) на одной машине.
+
+Для каждого числа процессов скрипт запускает сам себя через torchrun (python -m torch.distributed.run)
+с одинаковым общим батчем (на каждый процесс приходится global_batch_size / nprocs примеров) и выводит
+время шага оптимизатора, ускорение и потери: при одинаковом общем батче они должны совпадать
+с точностью до ошибок округления.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_ddp.py --nprocs 1 2 4 8 --global-batch-size 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.distributed import get_world_size, init_distributed, is_main_process  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.trainer import Trainer  # noqa: E402
+
+
+def worker(args):
+    init_distributed('gloo')
+    world_size = get_world_size()
+    torch.manual_seed(0)
+    vocab_size = 259
+    generator = torch.Generator().manual_seed(0)
+    train_dataset = [torch.randint(0, vocab_size, (args.length,), generator=generator) for _ in range(args.num_texts)]
+    eval_dataset = train_dataset[:args.global_batch_size]
+    model = Model(vocab_size, hidden_size=args.hidden_size)
+    trainer = Trainer(
+        model, train_dataset, eval_dataset, n_epochs=1, lr=1e-3,
+        train_batch_size=args.global_batch_size // world_size, eval_batch_size=8, logging_steps=1
+    )
+    start = time.perf_counter()
+    trainer.train()
+    elapsed = time.perf_counter() - start
+    eval_loss = trainer.evaluate()
+    if is_main_process():
+        print(json.dumps({
+            'nprocs': world_size,
+            'step_time': elapsed / trainer.iterations,
+            'loss': trainer.log_history[-1]['loss'],
+            'eval_loss': eval_loss,
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nprocs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--num-texts', type=int, default=1024)
+    parser.add_argument('--length', type=int, default=128)
+    parser.add_argument('--global-batch-size', type=int, default=64)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    parser.add_argument('--worker', action='store_true', help='внутренний режим: запуск под torchrun')
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    print(f'{"nprocs":>6} {"step, ms":>10} {"speedup":>8} {"loss":>10} {"eval loss":>10}')
+    base = None
+    for nprocs in args.nprocs:
+        command = [
+            sys.executable, '-m', 'torch.distributed.run', '--standalone', f'--nproc-per-node={nprocs}',
+            os.path.abspath(__file__), '--worker', f'--num-texts={args.num_texts}', f'--length={args.length}',
+            f'--global-batch-size={args.global_batch_size}', f'--hidden-size={args.hidden_size}'
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        base = base or result['step_time']
+        print(f'{nprocs:>6} {1e3 * result["step_time"]:10.1f} {base / result["step_time"]:8.2f} '
+              f'{result["loss"]:10.5f} {result["eval_loss"]:10.5f}')
+
+
+if __name__ == '__main__':
+    main()
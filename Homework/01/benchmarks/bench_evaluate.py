@@ -0,0 +1,53 @@
+"""
+Скорость Trainer.evaluate при разных размерах батча оценки, включая eval_batch_size='auto'.
+
+Тексты разной длины собираются Collator с маской паддинга; выводятся время оценки, токены в секунду
+и потери (при любом размере батча они одинаковы, так как усредняются по токенам).
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_evaluate.py --num-texts 1024 --max-length 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.collator import Collator  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.trainer import Trainer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-texts', type=int, default=1024)
+    parser.add_argument('--max-length', type=int, default=256)
+    parser.add_argument('--batch-sizes', type=str, nargs='+', default=['1', '8', '32', 'auto'])
+    parser.add_argument('--eval-max-tokens', type=int, default=16384)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    vocab_size = 259
+    lengths = torch.randint(2, args.max_length + 1, (args.num_texts,)).tolist()
+    dataset = [torch.randint(1, vocab_size, (length,)).tolist() for length in lengths]
+    model = Model(vocab_size, hidden_size=args.hidden_size)
+
+    print(f'{"batch size":>10} {"time, s":>8} {"tokens/s":>10} {"loss":>10}')
+    for batch_size in args.batch_sizes:
+        batch_size = batch_size if batch_size == 'auto' else int(batch_size)
+        trainer = Trainer(
+            model, dataset, dataset, collator=Collator(0, return_mask=True), eval_batch_size=batch_size,
+            eval_max_tokens=args.eval_max_tokens
+        )
+        start = time.perf_counter()
+        metrics = trainer.evaluate_metrics()
+        elapsed = time.perf_counter() - start
+        print(f'{str(batch_size):>10} {elapsed:8.2f} {metrics["tokens"] / elapsed:10.0f} {metrics["loss"]:10.5f}')
+
+
+if __name__ == '__main__':
+    main()
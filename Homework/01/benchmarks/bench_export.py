@@ -0,0 +1,81 @@
+"""
+Экспорт модели для генерации: задержка одного шага декодирования и перплексия для eager fp32,
+TorchScript, torch.compile и динамически квантованной (int8) модели.
+
+Модель сначала немного обучается на синтетическом корпусе (см. bench_bpe_train.make_corpus), чтобы перплексия
+была осмысленной, затем перплексия каждого варианта считается на отложенных текстах.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_export.py --hidden-size 256 --train-steps 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bpe_train import make_corpus  # noqa: E402
+from scripts.collator import Collator  # noqa: E402
+from scripts.export import export_model, perplexity  # noqa: E402
+from scripts.generation import generate  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.tokenizer import ByteTokenizer  # noqa: E402
+from scripts.trainer import Trainer  # noqa: E402
+
+
+def step_latency(model, vocab_size, n_steps):
+    """Среднее время одного шага декодирования с батчем 1 в микросекундах."""
+    x = torch.randint(0, vocab_size, (1, 1))
+    hx = None
+    with torch.inference_mode():
+        for _ in range(20):
+            _, hx = model(x, hx)
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            _, hx = model(x, hx)
+    return (time.perf_counter() - start) / n_steps * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hidden-size', type=int, default=256)
+    parser.add_argument('--num-layers', type=int, default=1)
+    parser.add_argument('--train-steps', type=int, default=200)
+    parser.add_argument('--latency-steps', type=int, default=1000)
+    parser.add_argument('--backends', type=str, nargs='+', default=['torchscript', 'compile'])
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    tokenizer = ByteTokenizer()
+    texts = [[tokenizer.bos_token_id] + tokenizer.encode(text[:256]) + [tokenizer.eos_token_id]
+             for text in make_corpus(0.5, text_len=256)]
+    train_texts, eval_texts = texts[:-200], texts[-200:]
+    model = Model(tokenizer.get_vocab_size(), hidden_size=args.hidden_size, num_layers=args.num_layers)
+    trainer = Trainer(
+        model, train_texts, eval_texts, n_epochs=max(1, args.train_steps * 32 // len(train_texts)), lr=3e-3,
+        train_batch_size=32, collator=Collator(tokenizer.pad_token_id, return_mask=True), logging_steps=10 ** 9
+    )
+    trainer.train()
+
+    variants = {'eager fp32': model}
+    for backend in args.backends:
+        variants[f'{backend} fp32'] = export_model(model, backend=backend)
+    variants['eager int8'] = export_model(model, quantize=True, backend='eager')
+    variants['torchscript int8'] = export_model(model, quantize=True)
+
+    base_ppl = perplexity(model, eval_texts)
+    print(f'{"variant":>18} {"step, us":>10} {"tokens/s":>10} {"perplexity":>11} {"delta":>8}')
+    for name, variant in variants.items():
+        latency = step_latency(variant, tokenizer.get_vocab_size(), args.latency_steps)
+        start = time.perf_counter()
+        n_tokens = len(tokenizer.encode(generate(variant, tokenizer, temperature=0, max_length=256)))
+        tokens_per_sec = n_tokens / (time.perf_counter() - start)
+        ppl = perplexity(variant, eval_texts)
+        print(f'{name:>18} {latency:10.1f} {tokens_per_sec:10.0f} {ppl:11.4f} {ppl - base_ppl:+8.4f}')
+
+
+if __name__ == '__main__':
+    main()
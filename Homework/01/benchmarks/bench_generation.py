@@ -0,0 +1,46 @@
+"""
+Скорость генерации: generate по одной последовательности против generate_batch с разными размерами батча.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_generation.py --batch-sizes 1 8 64 256 --max-length 128
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.generation import generate, generate_batch  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.tokenizer import ByteTokenizer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64, 256])
+    parser.add_argument('--max-length', type=int, default=128)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    tokenizer = ByteTokenizer()
+    # Необученная модель почти никогда не выдаёт eos, поэтому все последовательности имеют длину около max_length.
+    # Токены считаются как байты декодированного текста (для ByteTokenizer это почти одно и то же)
+    model = Model(tokenizer.get_vocab_size(), hidden_size=args.hidden_size)
+
+    start = time.perf_counter()
+    n_tokens = len(tokenizer.encode(generate(model, tokenizer, max_length=args.max_length)))
+    print(f'{"generate":>16}: {n_tokens / (time.perf_counter() - start):10.0f} tokens/s')
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        texts = generate_batch(model, tokenizer, num_samples=batch_size, max_length=args.max_length)
+        elapsed = time.perf_counter() - start
+        n_tokens = sum(len(tokenizer.encode(text)) for text in texts)
+        print(f'{"batch " + str(batch_size):>16}: {n_tokens / elapsed:10.0f} tokens/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Время подготовки промпта с PromptCache и без него: повторный промпт и промпт, продолжающий уже закэшированный.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_prompt_cache.py --prompt-lengths 64 256 1024 --repeats 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.generation import encode_prompt  # noqa: E402
+from scripts.model import Model  # noqa: E402
+from scripts.prompt_cache import PromptCache  # noqa: E402
+from scripts.tokenizer import ByteTokenizer  # noqa: E402
+
+
+def timeit(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prompt-lengths', type=int, nargs='+', default=[64, 256, 1024])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    tokenizer = ByteTokenizer()
+    model = Model(tokenizer.get_vocab_size(), hidden_size=args.hidden_size)
+
+    print(f'{"length":>8} {"no cache, ms":>14} {"same, ms":>10} {"+16 bytes, ms":>14}')
+    for length in args.prompt_lengths:
+        prompt = 'a' * length
+        cache = PromptCache(model)
+        no_cache = timeit(lambda: encode_prompt(model, tokenizer, prompt), args.repeats)
+        encode_prompt(model, tokenizer, prompt, cache)
+        same = timeit(lambda: encode_prompt(model, tokenizer, prompt, cache), args.repeats)
+        # Каждый раз новое продолжение, чтобы измерить попадание по префиксу, а не полное попадание
+        suffixes = iter(range(args.repeats))
+        extended = timeit(lambda: encode_prompt(model, tokenizer, prompt + f'{next(suffixes):016d}', cache), args.repeats)
+        print(f'{length:>8} {no_cache:>14.2f} {same:>10.3f} {extended:>14.2f}')
+        print(f'{"":>8} {cache.cache_info()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Время выбора одного токена (батч из одной строки, общие параметры) через sample_next_token и через NumPy,
+как это делал generate до перехода на torch: softmax, перевод в NumPy, np.argpartition и np.random.choice.
+
+Размеры словаря по умолчанию - ByteTokenizer (259) и BpeTokenizer из homework.ipynb (max_vocab=2048).
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_sampling.py --vocab-sizes 259 2048 --repeats 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.sampling import sample_next_token  # noqa: E402
+
+
+def sample_numpy(logits, temperature, top_k):
+    logits = logits / temperature
+    p = F.softmax(logits, -1)[0].numpy()
+    ids = np.arange(len(p))
+    if top_k is not None:
+        ids = np.argpartition(logits[0].numpy(), -top_k)[-top_k:]
+        p = p[ids] / p[ids].sum()
+    return np.random.choice(ids, p=p)
+
+
+def timeit(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vocab-sizes', type=int, nargs='+', default=[259, 2048])
+    parser.add_argument('--temperature', type=float, default=0.8)
+    parser.add_argument('--repeats', type=int, default=5000)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print(f'{"vocab":>6} {"top_k":>6} {"numpy, us":>10} {"torch, us":>10}')
+    for vocab_size in args.vocab_sizes:
+        logits = torch.randn(1, vocab_size)
+        for top_k in (None, 50, vocab_size):
+            numpy_time = timeit(lambda: sample_numpy(logits, args.temperature, top_k), args.repeats)
+            torch_time = timeit(
+                lambda: sample_next_token(logits, temperature=args.temperature, top_k=top_k), args.repeats
+            )
+            print(f'{vocab_size:>6} {str(top_k):>6} {numpy_time:10.1f} {torch_time:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
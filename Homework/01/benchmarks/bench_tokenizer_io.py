@@ -0,0 +1,55 @@
+"""
+Время сохранения и загрузки BpeTokenizer: бинарный формат (save/load) против pickle.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_tokenizer_io.py --corpus-mb 20 --max-vocab 50000
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.tokenizer import BpeTokenizer  # noqa: E402
+from bench_bpe_train import make_corpus  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus-mb', type=float, default=20)
+    parser.add_argument('--max-vocab', type=int, default=50000)
+    args = parser.parse_args()
+
+    tokenizer = BpeTokenizer(pattern='gpt2')
+    tokenizer.train_from_iterator(make_corpus(args.corpus_mb), max_vocab=args.max_vocab)
+    text = make_corpus(0.01, seed=1)[0]
+    print(f'vocab size: {tokenizer.get_vocab_size()}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_path = os.path.join(tmp, 'tokenizer.bin')
+        pkl_path = os.path.join(tmp, 'tokenizer.pkl')
+        _, save_ms = timed(lambda: tokenizer.save(bin_path))
+        _, dump_ms = timed(lambda: pickle.dump(tokenizer, open(pkl_path, 'wb')))
+
+        loaded, load_ms = timed(lambda: BpeTokenizer.load(bin_path))
+        _, first_encode_ms = timed(lambda: loaded.encode(text))
+        unpickled, unpickle_ms = timed(lambda: pickle.load(open(pkl_path, 'rb')))
+        assert loaded.encode(text) == unpickled.encode(text) == tokenizer.encode(text)
+
+        print(f'{"format":>8} | {"size, KB":>9} | {"save, ms":>8} | {"load, ms":>8}')
+        print(f'{"binary":>8} | {os.path.getsize(bin_path) / 1024:>9.1f} | {save_ms:>8.1f} | {load_ms:>8.1f}')
+        print(f'{"pickle":>8} | {os.path.getsize(pkl_path) / 1024:>9.1f} | {dump_ms:>8.1f} | {unpickle_ms:>8.1f}')
+        print(f'first encode after load (builds the merges dict): {first_encode_ms:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
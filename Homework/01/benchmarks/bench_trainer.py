@@ -0,0 +1,92 @@
+"""
+Скорость обучения Trainer в разных режимах: fp32, bf16 autocast и накопление градиентов.
+
+Данные - тексты марковской цепи, в которой за каждым токеном следует один из 4 токенов (минимально
+возможные потери ln 4 = 1.386), поэтому модель действительно обучается. Для каждого режима модель
+обучается с одинаковой инициализацией и порядком примеров; выводятся токены в секунду, доли времени
+фаз шага (по log_history), потери на отложенных текстах после обучения и их отличие от режима fp32.
+С --log-file записи log_history всех режимов дописываются в JSONL-файл с полем mode.
+
+Запуск (из папки Homework/01):
+    python benchmarks/bench_trainer.py --num-texts 512 --length 128 --batch-size 32 --n-epochs 3 --log-file bench.jsonl
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.model import Model  # noqa: E402
+from scripts.monitor import PHASES, write_jsonl  # noqa: E402
+from scripts.trainer import Trainer  # noqa: E402
+
+
+def make_texts(num_texts, length, vocab_size, generator):
+    """Тексты марковской цепи: следующий токен - (3 * предыдущий + один из 4 сдвигов) по модулю vocab_size."""
+    texts = torch.empty(num_texts, length, dtype=torch.long)
+    texts[:, 0] = torch.randint(0, vocab_size, (num_texts,), generator=generator)
+    shifts = torch.randint(0, 4, (num_texts, length), generator=generator)
+    for i in range(1, length):
+        texts[:, i] = (3 * texts[:, i - 1] + shifts[:, i]) % vocab_size
+    return list(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-texts', type=int, default=512)
+    parser.add_argument('--length', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    parser.add_argument('--n-epochs', type=int, default=3)
+    parser.add_argument('--lr', type=float, default=1e-2)
+    parser.add_argument('--log-file', type=str, default=None)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    vocab_size = 259
+    generator = torch.Generator().manual_seed(0)
+    data = make_texts(args.num_texts, args.length, vocab_size, generator)
+    eval_data = make_texts(64, args.length, vocab_size, generator)
+    modes = {
+        'fp32': dict(train_batch_size=args.batch_size),
+        'fp32, loss.item() every step': dict(train_batch_size=args.batch_size, logging_steps=1),
+        'bf16': dict(train_batch_size=args.batch_size, bf16=True),
+        'fp32, accumulation 2': dict(train_batch_size=args.batch_size // 2, gradient_accumulation_steps=2),
+        'bf16, clipping': dict(train_batch_size=args.batch_size, bf16=True, max_grad_norm=1.0),
+    }
+    # Прогрев: первые шаги LSTM заметно медленнее
+    Trainer(Model(vocab_size, hidden_size=args.hidden_size), data, data[:1], n_epochs=1,
+            train_batch_size=args.batch_size).train()
+
+    header = ' '.join(f'{name + " %":>11}' for name in PHASES)
+    torch.manual_seed(0)
+    initial_loss = Trainer(Model(vocab_size, hidden_size=args.hidden_size), data, eval_data).evaluate()
+    print(f'eval loss before training: {initial_loss:.4f}')
+    print(f'{"mode":>30} {"tokens/s":>10} {header} {"eval loss":>10} {"vs fp32":>9}')
+    for name, kwargs in modes.items():
+        torch.manual_seed(0)
+        model = Model(vocab_size, hidden_size=args.hidden_size)
+        kwargs.setdefault('logging_steps', 10)
+        trainer = Trainer(model, data, eval_data, n_epochs=args.n_epochs, lr=args.lr, **kwargs)
+        start = time.perf_counter()
+        trainer.train()
+        elapsed = time.perf_counter() - start
+        n_tokens = args.n_epochs * len(trainer.train_loader) * trainer.train_loader.batch_size * (args.length - 1)
+        # Доли фаз считаются по записанным окнам logging_steps
+        phases = {phase: sum(record.get(f'{phase}_time', 0.0) for record in trainer.log_history) for phase in PHASES}
+        logged = sum(record['elapsed'] for record in trainer.log_history if 'elapsed' in record)
+        shares = ' '.join(f'{100 * value / logged:11.1f}' if logged > 0 else f'{"-":>11}' for value in phases.values())
+        eval_loss = trainer.evaluate()
+        if name == 'fp32':
+            reference = eval_loss
+        print(f'{name:>30} {n_tokens / elapsed:10.0f} {shares} {eval_loss:10.4f} {eval_loss - reference:+9.1e}')
+        if args.log_file is not None:
+            for record in trainer.log_history:
+                write_jsonl(args.log_file, {'mode': name, **record})
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 from .tokenizer import BpeTokenizer
 from .model import Model
-from .dataset import MyDataset
-from .collator import Collator
+from .dataset import MyDataset, ShardedDataset, PackedDataset, write_token_shards
+from .collator import Collator, Batch
 from .trainer import Trainer
-from .generation import generate
+from .generation import beam_search, generate, generate_batch, stream_generate
+from .prompt_cache import PromptCache
+from .export import export_model
@@ -0,0 +1,221 @@
+import heapq
+from array import array
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+
+def iter_merges(
+        list_of_ids: List[List[int]],
+        first_idx: int,
+        weights: Optional[List[int]] = None
+) -> Iterator[Tuple[Tuple[int, int], int]]:
+    """
+    Инкрементально обучает таблицу склеиваний BPE, возвращая склеивания по одному.
+
+    В отличие от наивного цикла (count_pairs + merge по всему корпусу на каждом шаге),
+    частоты пар и индексы их позиций считаются один раз, а после каждого склеивания
+    обновляются только соседи затронутых позиций. Наиболее частотная пара выбирается
+    с помощью кучи с ленивым удалением устаревших записей.
+
+    Порядок склеиваний совпадает с наивным алгоритмом: при равной частоте выбирается
+    пара, которая раньше всех встречается в корпусе (так работает max по словарю из count_pairs).
+
+    Параметры:
+    ----------
+    list_of_ids : List[List[int]]
+        Исходные последовательности токенов (например, байты текстов в кодировке utf-8).
+    first_idx : int
+        Номер, который получит первый новый токен. Каждое следующее склеивание получает номер на единицу больше.
+    weights : Optional[List[int]], по умолчанию None
+        Кратность каждой последовательности (например, частота слова в корпусе). Результат совпадает с обучением
+        на корпусе, где каждая последовательность повторена weights[i] раз подряд в месте своего первого появления.
+        Если None, все кратности равны 1.
+
+    Возвращает:
+    -----------
+    Iterator[Tuple[Tuple[int, int], int]]
+        Пары (пара токенов, её частота). Склеивание применяется к корпусу, когда у генератора
+        запрашивается следующий элемент, поэтому вызывающий код может остановиться в любой момент
+        (например, если частота равна 1), не применяя последнее склеивание.
+
+    Пример:
+    -------
+    >>> list(iter_merges([[0, 1, 0, 1, 2], [0, 1, 2]], first_idx=3))
+    [((0, 1), 3), ((3, 2), 2), ((3, 4), 1)]
+    """
+    # Все последовательности хранятся в одном двусвязном списке: номер узла - позиция в корпусе,
+    # поэтому порядок узлов совпадает с порядком обхода текстов в count_pairs
+    tokens = array('l')
+    prv = array('l')
+    nxt = array('l')
+    # Кратность последовательности, которой принадлежит узел
+    wts = array('l')
+    where: Dict[Tuple[int, int], array] = {}
+    for k, ids in enumerate(list_of_ids):
+        start, n = len(tokens), len(ids)
+        if n == 0:
+            continue
+        tokens.extend(ids)
+        wts.extend([1 if weights is None else weights[k]] * n)
+        prv.extend(range(start - 1, start + n - 1))
+        nxt.extend(range(start + 1, start + n + 1))
+        prv[start] = -1
+        nxt[-1] = -1
+        for i, pair in enumerate(zip(ids, ids[1:]), start):
+            positions = where.get(pair)
+            if positions is None:
+                where[pair] = positions = array('l')
+            positions.append(i)
+
+    if weights is None:
+        counts = {pair: len(positions) for pair, positions in where.items()}
+    else:
+        counts = {pair: sum(wts[i] for i in positions) for pair, positions in where.items()}
+    firsts = {pair: positions[0] for pair, positions in where.items()}
+    # Пары, у которых было удалено первое вхождение: их firsts[pair] - лишь нижняя оценка
+    dirty: Set[Tuple[int, int]] = set()
+    # Пары, частота которых изменилась за текущее склеивание: в кучу они попадают один раз в конце шага
+    touched: Set[Tuple[int, int]] = set()
+    heap = [(-count, firsts[pair], pair) for pair, count in counts.items()]
+    heapq.heapify(heap)
+
+    def is_valid(i: int, pair: Tuple[int, int]) -> bool:
+        j = nxt[i]
+        return tokens[i] == pair[0] and j != -1 and tokens[j] == pair[1]
+
+    def add(pair: Tuple[int, int], i: int) -> None:
+        count = counts.get(pair)
+        if count is None:
+            counts[pair] = wts[i]
+            where[pair] = array('l', [i])
+            firsts[pair] = i
+        else:
+            counts[pair] = count + wts[i]
+            where[pair].append(i)
+            if i < firsts[pair]:
+                firsts[pair] = i
+        touched.add(pair)
+
+    def remove(pair: Tuple[int, int], i: int) -> None:
+        count = counts.get(pair)
+        if count is None:
+            return
+        count -= wts[i]
+        if count == 0:
+            del counts[pair], where[pair], firsts[pair]
+            dirty.discard(pair)
+            return
+        counts[pair] = count
+        if firsts[pair] == i:
+            dirty.add(pair)
+        touched.add(pair)
+
+    new_idx = first_idx
+    while heap:
+        neg_count, first, pair = heapq.heappop(heap)
+        count = counts.get(pair)
+        if count is None or count != -neg_count:
+            continue
+        if pair in dirty:
+            # Уточняем первое вхождение и заодно выбрасываем из индекса устаревшие позиции
+            positions = array('l', (i for i in where[pair] if is_valid(i, pair)))
+            where[pair] = positions
+            firsts[pair] = min(positions)
+            dirty.discard(pair)
+            heapq.heappush(heap, (neg_count, firsts[pair], pair))
+            continue
+        if first != firsts[pair]:
+            heapq.heappush(heap, (neg_count, firsts[pair], pair))
+            continue
+
+        yield pair, count
+
+        # Склеиваем все вхождения пары слева направо, как это делает merge
+        positions = sorted(where.pop(pair))
+        del counts[pair], firsts[pair]
+        a, b = pair
+        for i in positions:
+            if not is_valid(i, pair):
+                continue
+            j = nxt[i]
+            p, n = prv[i], nxt[j]
+            if p != -1:
+                remove((tokens[p], a), p)
+            if n != -1:
+                remove((b, tokens[n]), j)
+            tokens[i] = new_idx
+            tokens[j] = -1
+            nxt[i] = n
+            if n != -1:
+                prv[n] = i
+                add((new_idx, tokens[n]), i)
+            if p != -1:
+                add((tokens[p], new_idx), p)
+        for touched_pair in touched:
+            count = counts.get(touched_pair)
+            if count is not None:
+                heapq.heappush(heap, (-count, firsts[touched_pair], touched_pair))
+        touched.clear()
+        new_idx += 1
+
+
+def apply_merges(ids: List[int], merges: Dict[Tuple[int, int], int]) -> List[int]:
+    """
+    Применяет таблицу склеиваний BPE к последовательности токенов за O(n log n).
+
+    Номер нового токена в merges одновременно является рангом склеивания: токены добавляются
+    в словарь в порядке обучения. Поэтому все соседние пары, для которых есть склеивание,
+    кладутся в кучу с ключом (ранг, позиция) и склеиваются в порядке извлечения из кучи
+    на двусвязном списке токенов. Результат совпадает с последовательным применением merge
+    для каждой пары в порядке таблицы: склеивание всегда порождает пары с большим рангом.
+
+    Параметры:
+    ----------
+    ids : List[int]
+        Исходная последовательность токенов (например, байты текста в кодировке utf-8).
+    merges : Dict[Tuple[int, int], int]
+        Таблица склеиваний: пара токенов -> номер нового токена.
+
+    Возвращает:
+    -----------
+    List[int]
+        Последовательность токенов после применения всех склеиваний.
+
+    Пример:
+    -------
+    >>> apply_merges([0, 0, 0, 1], {(0, 0): 2, (2, 0): 3, (0, 1): 4})
+    [3, 1]
+    """
+    n = len(ids)
+    if n < 2 or not merges:
+        return list(ids)
+    tokens = list(ids)
+    prv = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    nxt[-1] = -1
+    heap = []
+    for i, pair in enumerate(zip(ids, ids[1:])):
+        rank = merges.get(pair)
+        if rank is not None:
+            heap.append((rank, i))
+    heapq.heapify(heap)
+
+    while heap:
+        rank, i = heapq.heappop(heap)
+        j = nxt[i]
+        # Позиция устарела, если один из токенов уже склеен с другим соседом
+        if j == -1 or tokens[i] == -1 or merges.get((tokens[i], tokens[j])) != rank:
+            continue
+        tokens[i] = rank
+        tokens[j] = -1
+        p, n = prv[i], nxt[j]
+        nxt[i] = n
+        if n != -1:
+            prv[n] = i
+            new_rank = merges.get((rank, tokens[n]))
+            if new_rank is not None:
+                heapq.heappush(heap, (new_rank, i))
+        if p != -1:
+            new_rank = merges.get((tokens[p], rank))
+            if new_rank is not None:
+                heapq.heappush(heap, (new_rank, p))
+    return [token for token in tokens if token != -1]
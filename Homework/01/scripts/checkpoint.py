@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+import torch
+
+CHECKPOINT_PATTERN = re.compile(r'^checkpoint-(\d+)\.pt$')
+
+
+def to_cpu(obj: Any) -> Any:
+    """Рекурсивно копирует все тензоры вложенной структуры (dict, list, tuple) в память CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+
+class CheckpointManager:
+    """
+    Сохраняет чекпоинты обучения в фоновом потоке.
+
+    save делает снимок состояния в памяти CPU (копии всех тензоров), после чего обучение может сразу
+    продолжаться: запись на диск идёт в фоновом потоке. Файл сначала пишется во временный файл и затем
+    атомарно переименовывается (os.replace), поэтому на диске никогда не бывает недописанного чекпоинта.
+    После записи удаляются все чекпоинты, кроме keep_last последних. Одновременно пишется не больше одного
+    чекпоинта: следующий save ждёт окончания предыдущей записи.
+
+    Параметры:
+    ----------
+    directory : str
+        Папка для чекпоинтов checkpoint-<шаг>.pt.
+    keep_last : Optional[int], по умолчанию 3
+        Сколько последних чекпоинтов хранить (None - все).
+
+    Пример:
+    ----------
+    >>> manager = CheckpointManager('checkpoints', keep_last=2)
+    >>> manager.save({'model': model.state_dict()}, step=100)
+    >>> manager.wait()
+    >>> state = manager.load(manager.latest())
+    """
+    def __init__(self, directory: str, keep_last: Optional[int] = 3):
+        self.directory = directory
+        self.keep_last = keep_last
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, step: int) -> str:
+        """Возвращает путь к чекпоинту шага step."""
+        return os.path.join(self.directory, f'checkpoint-{step:08d}.pt')
+
+    def checkpoints(self) -> List[str]:
+        """Возвращает пути ко всем чекпоинтам в папке по возрастанию шага."""
+        found = []
+        for name in os.listdir(self.directory):
+            match = CHECKPOINT_PATTERN.match(name)
+            if match is not None:
+                found.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return [path for _, path in sorted(found)]
+
+    def latest(self) -> Optional[str]:
+        """Возвращает путь к последнему чекпоинту или None, если чекпоинтов нет."""
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def _write(self, state: Dict[str, Any], path: str) -> None:
+        tmp_path = path + '.tmp'
+        try:
+            torch.save(state, tmp_path)
+            os.replace(tmp_path, path)
+            if self.keep_last is not None:
+                for old_path in self.checkpoints()[:-self.keep_last or None]:
+                    os.remove(old_path)
+        except BaseException as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._error = e
+
+    def wait(self) -> None:
+        """Дожидается окончания фоновой записи. Если запись завершилась ошибкой, выбрасывает её."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def save(self, state: Dict[str, Any], step: int, blocking: bool = False) -> str:
+        """
+        Сохраняет снимок состояния как чекпоинт шага step.
+
+        Параметры:
+        ----------
+        state : Dict[str, Any]
+            Состояние (например, state_dict модели и оптимизатора). Тензоры копируются в CPU до возврата из метода,
+            поэтому после вызова их можно менять.
+        step : int
+            Номер шага, по которому называется файл.
+        blocking : bool, по умолчанию False
+            Если True, метод ждёт окончания записи.
+
+        Возвращает:
+        -----------
+        str
+            Путь к чекпоинту.
+        """
+        self.wait()
+        snapshot = to_cpu(state)
+        path = self.path(step)
+        self._thread = threading.Thread(target=self._write, args=(snapshot, path), daemon=True)
+        self._thread.start()
+        if blocking:
+            self.wait()
+        return path
+
+    @staticmethod
+    def load(path: str) -> Dict[str, Any]:
+        """
+        Загружает чекпоинт, записанный save.
+
+        Чекпоинт содержит не только тензоры (состояния генераторов NumPy и random, эпоху), поэтому загрузка идёт
+        с weights_only=False (с torch 2.6 по умолчанию True). Загружайте только свои чекпоинты.
+        """
+        return torch.load(path, map_location='cpu', weights_only=False)
@@ -1,28 +1,65 @@
 import torch
-from typing import List
-from torch.nn.utils.rnn import pad_sequence
+import numpy as np
+from typing import List, NamedTuple, Union
 from torch import Tensor
 
+
+class Batch(NamedTuple):
+    """
+    Батч, который возвращает Collator(return_mask=True).
+
+    Атрибуты:
+        input_ids (Tensor): Номера токенов с паддингом размером (batch_size, max_len), dtype int64.
+        attention_mask (Tensor): Маска настоящих (не паддинговых) позиций размером (batch_size, max_len), dtype bool.
+        lengths (Tensor): Длины последовательностей размером (batch_size,), dtype int64.
+    """
+    input_ids: Tensor
+    attention_mask: Tensor
+    lengths: Tensor
+
+
 class Collator:
     """
     Класс Collator используется для дополнения (padding) списков разной длины
     до одинаковой длины с использованием заданного значения padding_value.
 
+    Батч собирается в один заранее выделенный буфер int64: каждая последовательность (список Python,
+    np.ndarray или срез np.memmap) копируется в свою строку буфера средствами NumPy, без создания
+    промежуточных тензоров для каждой последовательности.
+
     Аргументы:
         padding_value (int): Значение, которое будет использоваться для дополнения
         (padding) последовательностей до одинаковой длины.
+        pin_memory (bool, по умолчанию False): Выделять ли буфер в закреплённой (pinned) памяти
+        для быстрого копирования на GPU. Без доступной CUDA игнорируется.
+        return_mask (bool, по умолчанию False): Если True, возвращается Batch с маской и длинами,
+        иначе - только тензор номеров токенов.
     """
 
-    def __init__(self, padding_value: int):
+    def __init__(self, padding_value: int, pin_memory: bool = False, return_mask: bool = False):
         self.padding_value = padding_value
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self.return_mask = return_mask
         """
         Инициализирует Collator с заданным значением для дополнения.
 
         Аргументы:
             padding_value (int): Значение для padding.
+            pin_memory (bool): Выделять ли буфер батча в закреплённой памяти.
+            return_mask (bool): Возвращать ли вместе с номерами токенов маску и длины.
         """
 
-    def __call__(self, data: List[List[int]]) -> Tensor:
-        data = [torch.tensor(x, dtype=torch.long) for x in data]
-        data = pad_sequence(data, batch_first=True , padding_value=self.padding_value)
-        return data
+    def __call__(self, data: List[Union[List[int], np.ndarray]]) -> Union[Tensor, Batch]:
+        lengths = np.fromiter((len(x) for x in data), dtype=np.int64, count=len(data))
+        max_len = int(lengths.max()) if len(data) else 0
+        input_ids = torch.full(
+            (len(data), max_len), self.padding_value, dtype=torch.long, pin_memory=self.pin_memory
+        )
+        # Строки буфера заполняются через NumPy-представление тензора (общая память, без копии)
+        buffer = input_ids.numpy()
+        for row, x, length in zip(buffer, data, lengths):
+            row[:length] = x
+        if not self.return_mask:
+            return input_ids
+        attention_mask = torch.from_numpy(np.arange(max_len) < lengths[:, None])
+        return Batch(input_ids, attention_mask, torch.from_numpy(lengths))
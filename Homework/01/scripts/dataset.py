@@ -1,7 +1,11 @@
-from typing import List, Optional
-from tqdm import tqdm
+import os
+import re
+from typing import Iterable, List, Optional
+import numpy as np
 from torch.utils.data import Dataset
 from scripts.tokenizer import ByteTokenizer
+from scripts.sampler import get_lengths
+from scripts.serialization import read_arrays, write_arrays
 
 
 class MyDataset(Dataset):
@@ -23,6 +27,8 @@ class MyDataset(Dataset):
         Токенизатор, который преобразует текст в последовательность токенов.
     max_length : Optional[int], по умолчанию None
         Максимальная длина последовательности токенов (опционально). Если задано, обрезает последовательность до этой длины.
+    num_workers : int, по умолчанию 0
+        Количество процессов для токенизации (см. ByteTokenizer.encode_batch). При 0 токенизация идёт в текущем процессе.
 
     Методы:
     -------
@@ -41,15 +47,18 @@ class MyDataset(Dataset):
     >>> dataset[0]
     [tokenizer.bos_token_id, 1, 2, 3, tokenizer.eos_token_id]  # Пример токенов
     """
-    def __init__(self, texts: List[str], tokenizer: ByteTokenizer, max_length: Optional[int] = None):
+    def __init__(
+            self,
+            texts: List[str],
+            tokenizer: ByteTokenizer,
+            max_length: Optional[int] = None,
+            num_workers: int = 0
+    ):
         self.max_length = max_length
         self.data = []
-        for text in tqdm(texts):
-            token_ids = [257] #bos
-            # Получаем список токенов (номеров) для данного текста и добавляем к началу и концу спецтокены bos, eos (см. пример)
-            token_ids += tokenizer.encode(text)
-            token_ids += [258] #eos
-            self.data.append(token_ids)
+        # Получаем список токенов (номеров) для каждого текста и добавляем к началу и концу спецтокены bos, eos (см. пример)
+        for ids in tokenizer.encode_batch(texts, num_workers=num_workers, progress=True):
+            self.data.append([tokenizer.bos_token_id] + ids + [tokenizer.eos_token_id])
 
     def __getitem__(self, idx: int) -> List[int]:
         """
@@ -68,6 +77,272 @@ class MyDataset(Dataset):
         #my
         return self.data[idx][:self.max_length]
 
+    @property
+    def lengths(self) -> List[int]:
+        """Длины последовательностей, которые вернёт __getitem__ (с учётом max_length)."""
+        return [len(ids[:self.max_length]) for ids in self.data]
+
     def __len__(self) -> int:
         """Возвращает количество текстов в наборе данных."""
         return len(self.data)
+
+
+def _remove_token_shards(path: str) -> None:
+    """Удаляет из папки path индекс и шарды, записанные write_token_shards."""
+    for name in os.listdir(path):
+        if name == 'index.bin' or re.fullmatch(r'shard_\d{5,}\.bin', name):
+            os.remove(os.path.join(path, name))
+
+
+def write_token_shards(
+        texts: Iterable[str],
+        tokenizer: ByteTokenizer,
+        path: str,
+        shard_size: int = 2 ** 28,
+        batch_size: int = 10000,
+        num_workers: int = 0
+) -> None:
+    """
+    Токенизирует тексты и записывает номера токенов в плоские бинарные файлы-шарды для ShardedDataset.
+
+    Каждый документ записывается как [bos, ...токены текста..., eos] подряд в текущий шард
+    (uint16, если словарь помещается в 65536 токенов, иначе uint32). Когда в шарде набирается
+    shard_size токенов, начинается новый шард; документы не разрезаются между шардами.
+    Номер шарда, смещение и длина каждого документа сохраняются в index.bin. Индекс и шарды, оставшиеся
+    в папке от прошлой записи, удаляются до начала записи. Если токенизация или запись завершается ошибкой,
+    файл шарда закрывается, а начатые шарды удаляются.
+
+    Параметры:
+    ----------
+    texts : Iterable[str]
+        Тексты для токенизации; читаются пачками по batch_size штук.
+    tokenizer : ByteTokenizer
+        Токенизатор.
+    path : str
+        Папка, в которую будут записаны шарды и индекс.
+    shard_size : int, по умолчанию 2 ** 28
+        Максимальное количество токенов в одном шарде (если документ длиннее, он занимает шард целиком).
+    batch_size : int, по умолчанию 10000
+        Количество текстов, которые токенизируются за раз.
+    num_workers : int, по умолчанию 0
+        Количество процессов для токенизации (см. ByteTokenizer.encode_batch).
+    """
+    os.makedirs(path, exist_ok=True)
+    # Старый индекс ссылался бы на новые шарды, а старые шарды с большими номерами остались бы лишними
+    _remove_token_shards(path)
+    dtype = np.uint16 if tokenizer.get_vocab_size() <= 2 ** 16 else np.uint32
+    doc_shard, doc_start, doc_length = [], [], []
+    shard_idx, shard_tokens = 0, 0
+    shard_file = open(os.path.join(path, f'shard_{shard_idx:05d}.bin'), 'wb')
+
+    def write_batch(batch: List[str]) -> None:
+        nonlocal shard_idx, shard_tokens, shard_file
+        for ids in tokenizer.encode_batch(batch, num_workers=num_workers):
+            doc = np.array([tokenizer.bos_token_id] + ids + [tokenizer.eos_token_id], dtype=dtype)
+            if shard_tokens > 0 and shard_tokens + len(doc) > shard_size:
+                shard_file.close()
+                shard_idx, shard_tokens = shard_idx + 1, 0
+                shard_file = open(os.path.join(path, f'shard_{shard_idx:05d}.bin'), 'wb')
+            shard_file.write(doc.tobytes())
+            doc_shard.append(shard_idx)
+            doc_start.append(shard_tokens)
+            doc_length.append(len(doc))
+            shard_tokens += len(doc)
+
+    try:
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                write_batch(batch)
+                batch = []
+        write_batch(batch)
+    except BaseException:
+        shard_file.close()
+        # Без индекса шарды не прочитать: удаляем все шарды, начатые этим вызовом
+        _remove_token_shards(path)
+        raise
+    shard_file.close()
+
+    write_arrays(
+        os.path.join(path, 'index.bin'),
+        {'dtype': np.dtype(dtype).name, 'n_shards': shard_idx + 1},
+        {
+            'doc_shard': np.array(doc_shard, dtype=np.int32),
+            'doc_start': np.array(doc_start, dtype=np.int64),
+            'doc_length': np.array(doc_length, dtype=np.int64)
+        }
+    )
+
+
+class ShardedDataset(Dataset):
+    """
+    Набор данных, хранящий токены в шардах на диске (см. write_token_shards) и читающий их через np.memmap.
+
+    В отличие от MyDataset, документы не хранятся в памяти в виде списков Python: __getitem__ возвращает
+    срез отображённого в память шарда без копирования. Шарды открываются лениво в каждом процессе,
+    поэтому процессы DataLoader (num_workers > 0) разделяют одни и те же страницы через кэш ОС.
+
+    Параметры:
+    ----------
+    path : str
+        Папка с шардами и индексом.
+    max_length : Optional[int], по умолчанию None
+        Максимальная длина последовательности токенов (опционально). Если задано, обрезает последовательность до этой длины.
+
+    Методы:
+    -------
+    __getitem__(idx: int) -> np.ndarray
+        Возвращает последовательность токенов документа [bos, ..., eos], обрезанную до max_length.
+    __len__() -> int
+        Возвращает количество документов.
+
+    Пример:
+    ----------
+    >>> write_token_shards(["Привет, мир!", "Это тест."], tokenizer, 'data/shards')
+    >>> dataset = ShardedDataset('data/shards', max_length=10)
+    >>> dataset[0]
+    memmap([257, 208, 159, 209, 128, 208, 184, 208, 178, 208], dtype=uint16)
+    """
+    def __init__(self, path: str, max_length: Optional[int] = None):
+        self.path = path
+        self.max_length = max_length
+        header, index = read_arrays(os.path.join(path, 'index.bin'), mmap=False)
+        self.dtype = np.dtype(header['dtype'])
+        self.n_shards = header['n_shards']
+        self.doc_shard = index['doc_shard']
+        self.doc_start = index['doc_start']
+        self.doc_length = index['doc_length']
+        self._shards = None
+
+    def _open_shards(self) -> List[np.ndarray]:
+        shards = []
+        for shard_idx in range(self.n_shards):
+            shard_path = os.path.join(self.path, f'shard_{shard_idx:05d}.bin')
+            if os.path.getsize(shard_path) == 0:
+                shards.append(np.empty(0, dtype=self.dtype))
+            else:
+                shards.append(np.memmap(shard_path, dtype=self.dtype, mode='r'))
+        return shards
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Длины последовательностей, которые вернёт __getitem__ (с учётом max_length)."""
+        if self.max_length is None:
+            return self.doc_length
+        return np.minimum(self.doc_length, self.max_length)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        """
+        Возвращает последовательность токенов документа по индексу, обрезанную до max_length.
+
+        Параметры:
+        ----------
+        idx : int
+            Индекс элемента в наборе данных, который нужно вернуть
+
+        Возвращает:
+        -----------
+        np.ndarray
+            Срез шарда (без копирования) с номерами токенов
+        """
+        start = int(self.doc_start[idx])
+        length = int(self.doc_length[idx])
+        if self.max_length is not None:
+            length = min(length, self.max_length)
+        return self.shard(self.doc_shard[idx])[start:start + length]
+
+    def shard(self, shard_idx: int) -> np.ndarray:
+        """Возвращает отображённый в память шард с номером shard_idx (документы в нём записаны подряд)."""
+        if self._shards is None:
+            self._shards = self._open_shards()
+        return self._shards[shard_idx]
+
+    def __len__(self) -> int:
+        """Возвращает количество документов в наборе данных."""
+        return len(self.doc_length)
+
+    def __getstate__(self):
+        # Отображения в память не передаются в процессы DataLoader: каждый процесс открывает шарды сам
+        state = self.__dict__.copy()
+        state['_shards'] = None
+        return state
+
+
+class PackedDataset(Dataset):
+    """
+    Набор данных, склеивающий документы другого набора в один поток токенов и нарезающий его на блоки фиксированной длины.
+
+    Документы уже начинаются с bos и заканчиваются eos, поэтому в потоке они разделены токеном eos.
+    Поток не копируется в память: хранятся только смещения начала документов (накопленные суммы длин),
+    а каждый блок собирается при обращении из срезов документов, которые он задевает. Для ShardedDataset
+    без max_length блок внутри одного шарда - срез отображённого в память шарда без копирования.
+    Блок с номером k - это срез потока [k * block_size, (k + 1) * block_size + 1): соседние блоки
+    пересекаются на один токен, поэтому после сдвига в Trainer (x = ids[:, :-1], y = ids[:, 1:])
+    метки образуют сплошной поток и каждый токен предсказывается ровно один раз. Все блоки одной длины,
+    поэтому Collator не добавляет паддинг. Состояние LSTM внутри блока переходит через границы документов,
+    и модель учится сбрасывать контекст после eos.
+
+    Параметры:
+    ----------
+    dataset : Dataset
+        Исходный набор данных (например, MyDataset или ShardedDataset).
+    block_size : int
+        Количество предсказываемых токенов в блоке (длина блока - block_size + 1).
+    drop_last : bool, по умолчанию True
+        Отбрасывать ли неполный последний блок. Если False, он возвращается укороченным.
+
+    Атрибуты:
+    ----------
+    n_tokens : int
+        Количество токенов в потоке.
+    utilization : float
+        Доля позиций в батчах, занятых настоящими токенами, а не паддингом (с учётом отброшенного или неполного хвоста).
+
+    Пример:
+    ----------
+    >>> dataset = PackedDataset(MyDataset(["aa", "b"], ByteTokenizer()), block_size=3)
+    >>> len(dataset), dataset[0], dataset.utilization
+    (2, array([257,  97,  97, 258], dtype=int32), 1.0)
+    """
+    def __init__(self, dataset: Dataset, block_size: int, drop_last: bool = True):
+        self.dataset = dataset
+        self.block_size = block_size
+        self.drop_last = drop_last
+        # offsets[i] - позиция начала документа i в потоке, offsets[-1] - длина потока
+        self.offsets = np.concatenate([[0], np.cumsum(get_lengths(dataset))])
+        self.n_tokens = int(self.offsets[-1])
+        # Документы шарда лежат в нём подряд, поэтому блок внутри одного шарда - это срез шарда
+        self._sharded = isinstance(dataset, ShardedDataset) and dataset.max_length is None
+
+        n_predicted = max(self.n_tokens - 1, 0)
+        self.n_blocks = n_predicted // block_size
+        if not drop_last and n_predicted % block_size:
+            self.n_blocks += 1
+        # Каждый блок занимает block_size позиций в батче после сдвига; паддинг появляется только у неполного блока
+        used = min(self.n_blocks * block_size, n_predicted)
+        self.utilization = used / (self.n_blocks * block_size) if self.n_blocks else 0.0
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        """Возвращает блок токенов длины block_size + 1 (последний блок при drop_last=False может быть короче)."""
+        if not 0 <= idx < self.n_blocks:
+            raise IndexError(f'block index {idx} is out of range')
+        start = idx * self.block_size
+        end = min(start + self.block_size + 1, self.n_tokens)
+        # Первый и последний документы, которые задевает блок
+        first = int(np.searchsorted(self.offsets, start, side='right')) - 1
+        last = int(np.searchsorted(self.offsets, end - 1, side='right')) - 1
+        if self._sharded and self.dataset.doc_shard[first] == self.dataset.doc_shard[last]:
+            shard_start = int(self.dataset.doc_start[first]) + start - int(self.offsets[first])
+            return self.dataset.shard(self.dataset.doc_shard[first])[shard_start:shard_start + end - start]
+
+        pieces = []
+        for doc in range(first, last + 1):
+            doc_start = int(self.offsets[doc])
+            pieces.append(np.asarray(self.dataset[doc])[max(start - doc_start, 0):end - doc_start])
+        block = np.concatenate(pieces)
+        return block.astype(np.int32) if block.dtype == np.int64 else block
+
+    def __len__(self) -> int:
+        """Возвращает количество блоков."""
+        return self.n_blocks
@@ -0,0 +1,88 @@
+import os
+from typing import Any, Iterator, List, Optional
+import torch
+import torch.distributed as dist
+from torch.utils.data import Dataset
+from torch.utils.data.distributed import DistributedSampler
+
+
+def init_distributed(backend: str = 'gloo') -> bool:
+    """
+    Инициализирует группу процессов torch.distributed, если процесс запущен через torchrun.
+
+    torchrun передаёт процессам переменные окружения RANK, WORLD_SIZE, MASTER_ADDR и MASTER_PORT.
+    Без них (обычный запуск python) ничего не делает.
+
+    Параметры:
+    ----------
+    backend : str, по умолчанию 'gloo'
+        Бэкенд обмена данными между процессами (gloo работает на CPU).
+
+    Возвращает:
+    -----------
+    bool
+        True, если группа процессов инициализирована.
+
+    Пример:
+    ----------
+    >>> # torchrun --standalone --nproc-per-node 4 train.py
+    >>> init_distributed()
+    >>> trainer = Trainer(model, train_dataset, eval_dataset)  # Trainer сам переходит в режим DDP
+    """
+    if dist.is_available() and not dist.is_initialized() and 'RANK' in os.environ:
+        dist.init_process_group(backend)
+    return is_distributed()
+
+
+def is_distributed() -> bool:
+    """Возвращает True, если группа процессов torch.distributed инициализирована."""
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank() -> int:
+    """Возвращает номер текущего процесса (0 без torch.distributed)."""
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    """Возвращает число процессов (1 без torch.distributed)."""
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    """Возвращает True для процесса с номером 0, который пишет логи и чекпоинты."""
+    return get_rank() == 0
+
+
+def all_reduce_sum(tensor: torch.Tensor) -> torch.Tensor:
+    """Суммирует тензор по всем процессам на месте и возвращает его (без torch.distributed ничего не делает)."""
+    if is_distributed():
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor
+
+
+def all_gather_object(obj: Any) -> List[Any]:
+    """Собирает объект со всех процессов в список по номерам процессов (без torch.distributed - [obj])."""
+    if not is_distributed():
+        return [obj]
+    objects = [None] * dist.get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+class UnpaddedDistributedSampler(DistributedSampler):
+    """
+    DistributedSampler для оценки: процесс с номером rank получает элементы rank, rank + world_size, ...
+    без дополнения повторами до одинакового размера.
+
+    Стандартный DistributedSampler с drop_last=False дополняет данные повторами первых элементов, поэтому
+    часть примеров оценивается дважды, а с drop_last=True часть примеров теряется. Здесь каждый пример
+    оценивается ровно одним процессом, а числа элементов у процессов отличаются не больше чем на один.
+    """
+    def __init__(self, dataset: Dataset, num_replicas: Optional[int] = None, rank: Optional[int] = None):
+        super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=False)
+        self.num_samples = len(range(self.rank, len(self.dataset), self.num_replicas))
+        self.total_size = len(self.dataset)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.rank, len(self.dataset), self.num_replicas))
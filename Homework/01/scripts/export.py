@@ -0,0 +1,116 @@
+import copy
+import math
+from typing import List, Optional, Sequence, Tuple
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch import Tensor
+from scripts.collator import Collator
+from scripts.model import Model
+
+
+class InferenceModel(nn.Module):
+    """
+    Модель только для инференса с тем же интерфейсом, что и Model: forward(x, hx) -> (logits, (h_n, c_n)).
+
+    Содержит только слои Model (эмбеддинги, LSTM и выходной линейный слой) без атрибутов конфигурации, поэтому
+    её можно скомпилировать torch.jit.script, в том числе после динамического квантования LSTM и линейного слоя.
+    Экспортированную модель можно передавать в generate, generate_batch, beam_search и PromptCache вместо Model.
+    """
+    def __init__(self, model: Model):
+        super().__init__()
+        self.embeddings = model.embeddings
+        self.lstm = model.lstm
+        self.logits = model.logits
+
+    def forward(self, x: Tensor, hx: Optional[Tuple[Tensor, Tensor]] = None) -> Tuple[Tensor, Tuple[Tensor, Tensor]]:
+        lstm_out, (h_n, c_n) = self.lstm(self.embeddings(x), hx)
+        return self.logits(lstm_out), (h_n, c_n)
+
+
+def export_model(
+        model: Model,
+        quantize: bool = False,
+        backend: str = 'torchscript',
+        path: Optional[str] = None
+) -> nn.Module:
+    """
+    Готовит модель к генерации: при необходимости квантует её и компилирует для уменьшения накладных расходов Python.
+
+    Исходная модель не изменяется.
+
+    Параметры:
+    ----------
+    model : Model
+        Обученная модель.
+    quantize : bool, по умолчанию False
+        Если True, LSTM и выходной линейный слой динамически квантуются в int8 (torch.ao.quantization.quantize_dynamic):
+        веса хранятся в int8, активации квантуются на лету. Эмбеддинги остаются в fp32.
+    backend : str, по умолчанию 'torchscript'
+        'torchscript' - torch.jit.script, 'compile' - torch.compile, 'eager' - без компиляции.
+    path : Optional[str], по умолчанию None
+        Если задан, модель TorchScript сохраняется в этот файл (загрузка - load_exported). Только для 'torchscript'.
+
+    Возвращает:
+    -----------
+    nn.Module
+        Модель с интерфейсом Model.
+
+    Пример:
+    ----------
+    >>> fast_model = export_model(model, quantize=True)
+    >>> text = generate(fast_model, tokenizer, temperature=0.7, max_length=100)
+    """
+    if path is not None and backend != 'torchscript':
+        raise ValueError('only TorchScript models can be saved')
+    model = copy.deepcopy(model).eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    module = InferenceModel(model).eval()
+    if backend == 'torchscript':
+        module = torch.jit.script(module)
+        if path is not None:
+            torch.jit.save(module, path)
+    elif backend == 'compile':
+        module = torch.compile(module, dynamic=True)
+    elif backend != 'eager':
+        raise ValueError(f'unknown backend {backend!r}')
+    return module
+
+
+def load_exported(path: str) -> torch.jit.ScriptModule:
+    """Загружает модель, сохранённую export_model(..., path=path)."""
+    return torch.jit.load(path).eval()
+
+
+def perplexity(model: nn.Module, texts: Sequence[List[int]], batch_size: int = 32) -> float:
+    """
+    Считает перплексию модели на текстах: exp от средних по всем предсказанным токенам потерь.
+
+    Параметры:
+    ----------
+    model : nn.Module
+        Model или экспортированная модель.
+    texts : Sequence[List[int]]
+        Номера токенов текстов (обычно с bos и eos). Каждый токен, кроме первого, предсказывается по предыдущим.
+    batch_size : int, по умолчанию 32
+        Размер батча.
+
+    Возвращает:
+    -----------
+    float
+        Перплексия.
+    """
+    collator = Collator(0, return_mask=True)
+    loss_sum = torch.zeros((), dtype=torch.float64)
+    n_tokens = 0
+    model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            batch = collator(texts[start:start + batch_size])
+            logits, _ = model(batch.input_ids[:, :-1])
+            losses = F.cross_entropy(logits.transpose(1, 2), batch.input_ids[:, 1:], reduction='none')
+            mask = batch.attention_mask[:, 1:]
+            loss_sum += losses[mask].sum()
+            n_tokens += int(mask.sum())
+    return math.exp(loss_sum.item() / n_tokens)
@@ -1,9 +1,156 @@
+import codecs
+import time
 import torch
-import numpy as np
-import torch.nn.functional as F
-from typing import Optional
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
 from scripts.model import Model
 from scripts.tokenizer import ByteTokenizer
+from scripts.prompt_cache import PromptCache, PromptState
+from scripts.sampling import RowParam, apply_penalties, sample_next_token
+
+
+def _stop_prefix_length(text: str, stop: Sequence[str]) -> int:
+    """Возвращает длину самого длинного суффикса text, который является началом одной из стоп-строк."""
+    best = 0
+    for s in stop:
+        for length in range(min(len(s) - 1, len(text)), best, -1):
+            if text.endswith(s[:length]):
+                best = length
+                break
+    return best
+
+
+def encode_prompt(
+        model: Model,
+        tokenizer: ByteTokenizer,
+        prompt: str = '',
+        prompt_cache: Optional[PromptCache] = None
+) -> PromptState:
+    """
+    Пропускает через модель токен начала текста и промпт.
+
+    Параметры:
+    -----------
+    model : Model
+        Модель для генерации текста.
+    tokenizer : ByteTokenizer
+        Токенизатор для кодирования промпта.
+    prompt : str, по умолчанию ''
+        Начало текста, продолжение которого нужно сгенерировать.
+    prompt_cache : Optional[PromptCache], по умолчанию None
+        Кэш состояний модели после промптов (см. PromptCache). Если None, промпт всегда считается заново.
+
+    Возвращает:
+    -----------
+    PromptState
+        Логиты следующего токена размером (1, vocab_size) и состояние (h_n, c_n) модели после промпта.
+    """
+    ids = [tokenizer.bos_token_id] + (tokenizer.encode(prompt) if prompt else [])
+    if prompt_cache is not None:
+        return prompt_cache(ids)
+    model.eval()
+    with torch.no_grad():
+        logits, hx = model(torch.tensor([ids], dtype=torch.long))
+    return logits[:, -1], hx
+
+
+def stream_generate(
+        model: Model,
+        tokenizer: ByteTokenizer,
+        temperature: float = 1.0,
+        top_k: Optional[int] = None,
+        max_length: int = 1024,
+        top_p: Optional[float] = None,
+        min_p: Optional[float] = None,
+        repetition_penalty: float = 1.0,
+        frequency_penalty: float = 0.0,
+        generator: Optional[torch.Generator] = None,
+        stop: Optional[Sequence[str]] = None,
+        max_time: Optional[float] = None,
+        prompt: str = '',
+        prompt_cache: Optional[PromptCache] = None
+) -> Iterator[str]:
+    """
+    Генерирует текст так же, как generate, но возвращает его по частям по мере появления токенов.
+
+    Байты токенов декодируются инкрементальным декодером utf-8: незаконченная многобайтовая
+    последовательность не заменяется на символ замены, а придерживается до прихода следующих байтов.
+    Поэтому первая часть текста доступна уже после первого шага модели, а склеенные части совпадают
+    с tokenizer.decode для всех сгенерированных токенов.
+
+    Параметры:
+    -----------
+    model, tokenizer, temperature, top_k, max_length, top_p, min_p, repetition_penalty, frequency_penalty, generator
+        Как в generate.
+    stop : Optional[Sequence[str]], по умолчанию None
+        Стоп-строки: генерация заканчивается на первом вхождении любой из них, сама стоп-строка
+        в результат не попадает. Текст, который может оказаться началом стоп-строки, придерживается,
+        пока это не выяснится.
+    max_time : Optional[float], по умолчанию None
+        Ограничение времени генерации в секундах. Проверяется перед каждым шагом модели.
+    prompt, prompt_cache
+        Как в generate.
+
+    Возвращает:
+    -----------
+    Iterator[str]
+        Непустые фрагменты сгенерированного текста.
+
+    Пример:
+    --------
+    >>> for chunk in stream_generate(model, tokenizer, temperature=0.7, stop=['\\n\\n'], max_time=1.0):
+    ...     print(chunk, end='', flush=True)
+    """
+    stop = [s for s in stop or [] if s]
+    deadline = None if max_time is None else time.perf_counter() + max_time
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+
+    # Состояние модели после токена начала текста и промпта
+    logits, hx = encode_prompt(model, tokenizer, prompt, prompt_cache)
+    use_penalties = repetition_penalty != 1.0 or frequency_penalty != 0.0
+    token_counts = torch.zeros(1, tokenizer.get_vocab_size(), dtype=torch.long) if use_penalties else None
+
+    model.eval()
+    n_tokens = 0
+    finished = False
+    while not finished:
+        new_token = None
+        if n_tokens < max_length and (deadline is None or time.perf_counter() < deadline):
+            with torch.no_grad():
+                if logits is None:
+                    # Получаем логиты следующего токена и следующее состояние
+                    logits, hx = model(tokens, hx)
+                    logits = logits[:, -1]
+                if use_penalties:
+                    logits = apply_penalties(logits, token_counts, repetition_penalty, frequency_penalty)
+                new_token = sample_next_token(
+                    logits, temperature, top_k=top_k, top_p=top_p, min_p=min_p, generator=generator
+                ).item()
+                logits = None
+
+        if new_token is None or new_token == tokenizer.eos_token_id:
+            # Декодер отдаёт придержанные байты (незаконченная последовательность превращается в символ замены)
+            pending += decoder.decode(b'', final=True)
+            finished = True
+        else:
+            n_tokens += 1
+            if use_penalties:
+                token_counts[0, new_token] += 1
+            tokens = torch.tensor([[new_token]], dtype=torch.long)
+            pending += decoder.decode(tokenizer.vocab[new_token])
+
+        if not pending:
+            continue
+        if stop:
+            positions = [pos for pos in (pending.find(s) for s in stop) if pos != -1]
+            if positions:
+                if min(positions) > 0:
+                    yield pending[:min(positions)]
+                return
+        hold = 0 if finished or not stop else _stop_prefix_length(pending, stop)
+        if len(pending) > hold:
+            yield pending[:len(pending) - hold]
+            pending = pending[len(pending) - hold:]
 
 
 def generate(
@@ -11,7 +158,16 @@ def generate(
         tokenizer: ByteTokenizer,
         temperature: float = 1.0,
         top_k: Optional[int] = None,
-        max_length: int = 1024
+        max_length: int = 1024,
+        top_p: Optional[float] = None,
+        min_p: Optional[float] = None,
+        repetition_penalty: float = 1.0,
+        frequency_penalty: float = 0.0,
+        generator: Optional[torch.Generator] = None,
+        stop: Optional[Sequence[str]] = None,
+        max_time: Optional[float] = None,
+        prompt: str = '',
+        prompt_cache: Optional[PromptCache] = None
 ) -> str:
     """
     Функция для генерации текста с использованием модели и токенизатора.
@@ -34,6 +190,24 @@ def generate(
         Это ограничивает выбор, делая генерацию текста более управляемой.
     max_length : int, по умолчанию 1024
         Максимальное количество токенов, которое будет сгенерировано моделью.
+    top_p : Optional[float], по умолчанию None
+        Если задано, выбор идёт из минимального набора самых вероятных токенов с суммарной вероятностью top_p.
+    min_p : Optional[float], по умолчанию None
+        Если задано, отбрасываются токены с вероятностью меньше min_p от вероятности самого вероятного токена.
+    repetition_penalty : float, по умолчанию 1.0
+        Штраф за повторение уже сгенерированных токенов (см. apply_penalties).
+    frequency_penalty : float, по умолчанию 0.0
+        Штраф, пропорциональный числу появлений токена (см. apply_penalties).
+    generator : Optional[torch.Generator], по умолчанию None
+        Генератор случайных чисел для воспроизводимой генерации.
+    stop : Optional[Sequence[str]], по умолчанию None
+        Стоп-строки, на первом вхождении которых генерация заканчивается (см. stream_generate).
+    max_time : Optional[float], по умолчанию None
+        Ограничение времени генерации в секундах.
+    prompt : str, по умолчанию ''
+        Начало текста. Возвращается только его продолжение.
+    prompt_cache : Optional[PromptCache], по умолчанию None
+        Кэш состояний модели после промптов: повторный или продолженный промпт не пересчитывается целиком.
 
     Возвращает:
     -----------
@@ -53,38 +227,233 @@ def generate(
     - Если температура > 0, производится выбор сэмплированием токенов в зависимости от их
       вероятностей, если же температура = 0, выбирается наиболее вероятный токен.
     - Если указан параметр top_k, модель выбирает следующий токен только из первых k наиболее
-      вероятных токенов.
+      вероятных токенов. Выбор токена целиком выполняется в torch (см. sample_next_token).
     - Процесс генерации завершается при достижении максимальной длины или если встречен токен
       окончания последовательности (eos_token_id).
+    - Текст собирается из фрагментов stream_generate.
     """
-    do_sample = temperature > 0
-    gen_ids = []
-    # Изначально подидим в модель токен начала текста и нулевое состояние
-    hx = None
-    tokens = torch.tensor([tokenizer.bos_token_id], dtype=torch.long)
+    return ''.join(stream_generate(
+        model, tokenizer, temperature=temperature, top_k=top_k, max_length=max_length, top_p=top_p, min_p=min_p,
+        repetition_penalty=repetition_penalty, frequency_penalty=frequency_penalty, generator=generator,
+        stop=stop, max_time=max_time, prompt=prompt, prompt_cache=prompt_cache
+    ))
+
+
+def _per_sample(value: RowParam, num_samples: int, dtype: torch.dtype) -> torch.Tensor:
+    """Превращает общее значение или значения для каждой последовательности в тензор размером (num_samples,)."""
+    value = torch.as_tensor(value, dtype=dtype)
+    if value.dim() == 0:
+        return value.repeat(num_samples)
+    if value.shape != (num_samples,):
+        raise ValueError(f'expected {num_samples} per-sample values, got shape {tuple(value.shape)}')
+    return value
+
+
+def generate_batch(
+        model: Model,
+        tokenizer: ByteTokenizer,
+        num_samples: int,
+        temperature: RowParam = 1.0,
+        top_k: RowParam = None,
+        max_length: int = 1024,
+        top_p: Optional[float] = None,
+        min_p: Optional[float] = None,
+        repetition_penalty: float = 1.0,
+        frequency_penalty: float = 0.0,
+        generator: Optional[torch.Generator] = None,
+        prompt: str = '',
+        prompt_cache: Optional[PromptCache] = None
+) -> List[str]:
+    """
+    Генерирует num_samples текстов одновременно, пропуская все последовательности через модель одним батчем.
+
+    Последовательности идут в ногу: на каждом шаге модель получает батч из последних токенов всех
+    ещё не закончившихся последовательностей и общее скрытое состояние hx. Последовательность, выдавшая
+    eos_token_id, удаляется из активного батча вместе со своей строкой hx, поэтому стоимость шага
+    уменьшается по мере завершения генераций.
+
+    Параметры:
+    -----------
+    model : Model
+        Обученная модель для генерации текста.
+    tokenizer : ByteTokenizer
+        Токенизатор для декодирования сгенерированных токенов.
+    num_samples : int
+        Количество генерируемых текстов (размер батча).
+    temperature : RowParam, по умолчанию 1.0
+        Температура, общая для всех последовательностей или своя для каждой (список, np.ndarray или тензор
+        размером (num_samples,)); 0 - жадный выбор.
+    top_k : RowParam, по умолчанию None
+        Ограничение top-k, общее или своё для каждой последовательности (None или 0 - без ограничения).
+    max_length : int, по умолчанию 1024
+        Максимальное количество токенов, которое будет сгенерировано для каждой последовательности.
+    top_p, min_p, repetition_penalty, frequency_penalty, generator, prompt, prompt_cache
+        Как в generate, общие для всех последовательностей. Промпт пропускается через модель один раз.
+
+    Возвращает:
+    -----------
+    List[str]
+        Сгенерированные тексты в порядке номеров последовательностей.
+
+    Пример:
+    --------
+    >>> texts = generate_batch(model, tokenizer, num_samples=4, temperature=[0, 0.5, 1.0, 1.5], top_k=10)
+    >>> len(texts)
+    4
+    """
+    temperature = _per_sample(temperature, num_samples, torch.float)
+    if isinstance(top_k, (list, tuple)):
+        top_k = [k or 0 for k in top_k]
+    top_k = _per_sample(0 if top_k is None else top_k, num_samples, torch.long)
+
+    gen_ids = [[] for _ in range(num_samples)]
+    # Номера последовательностей, которые ещё генерируются
+    active = torch.arange(num_samples)
+    logits, (h, c) = encode_prompt(model, tokenizer, prompt, prompt_cache)
+    logits = logits.expand(num_samples, -1)
+    hx = (h.repeat(1, num_samples, 1), c.repeat(1, num_samples, 1))
+    use_penalties = repetition_penalty != 1.0 or frequency_penalty != 0.0
+    token_counts = torch.zeros(num_samples, tokenizer.get_vocab_size(), dtype=torch.long) if use_penalties else None
 
     model.eval()
-    while len(gen_ids) < max_length:
-        with torch.no_grad():
-            # Получаем логиты следующего токена и следующее состояние
-            logits, hx = model(tokens, hx)
-            if not do_sample:
-                # Выбираем наиболее вероятный токен
-                new_token = torch.argmax(logits, -1).item()
-            else:
-                logits /= temperature
-                # Получаем вероятностное распределение следующего токена
-                p = F.softmax(logits, -1)[0].numpy()
-                ids = np.arange(len(p))
-                if top_k is not None:
-                    # Выбираем top-k наиболее вероятных токенов. Используйте np.argpartition(...)
-                    ids = np.argpartition(logits, -top_k)[:-top_k]
-                    p = p[ids] / p[ids].sum()
-                new_token = np.random.choice(ids, p=p)
-
-        if new_token == tokenizer.eos_token_id:
-            break
-        gen_ids.append(new_token)
-        tokens = torch.tensor([new_token], dtype=torch.long)
-
-    return tokenizer.decode(gen_ids)
+    with torch.no_grad():
+        for step in range(max_length):
+            if step > 0:
+                logits, hx = model(tokens, hx)
+                logits = logits[:, -1]
+            if use_penalties:
+                logits = apply_penalties(logits, token_counts, repetition_penalty, frequency_penalty)
+            new_tokens = sample_next_token(
+                logits, temperature, top_k=top_k, top_p=top_p, min_p=min_p, generator=generator
+            )
+
+            keep = new_tokens != tokenizer.eos_token_id
+            for idx, token in zip(active[keep].tolist(), new_tokens[keep].tolist()):
+                gen_ids[idx].append(token)
+            if use_penalties:
+                token_counts[torch.arange(len(active)), new_tokens] += 1
+            if not keep.all():
+                active, temperature, top_k = active[keep], temperature[keep], top_k[keep]
+                hx = (hx[0][:, keep], hx[1][:, keep])
+                new_tokens = new_tokens[keep]
+                if use_penalties:
+                    token_counts = token_counts[keep]
+            if len(active) == 0:
+                break
+            tokens = new_tokens[:, None]
+
+    return [tokenizer.decode(ids) for ids in gen_ids]
+
+
+def beam_search(
+        model: Model,
+        tokenizer: ByteTokenizer,
+        num_beams: int = 4,
+        max_length: int = 1024,
+        length_penalty: float = 1.0,
+        early_stopping: bool = True,
+        num_return_sequences: int = 1,
+        prompt: str = '',
+        prompt_cache: Optional[PromptCache] = None,
+        return_scores: bool = False
+) -> Union[List[str], List[Tuple[str, float]]]:
+    """
+    Генерирует текст лучевым поиском (beam search).
+
+    Все лучи расширяются одним батчевым вызовом модели: на каждом шаге модель получает батч из
+    последних токенов лучей размером (num_beams, 1). Из num_beams * vocab_size продолжений выбираются
+    2 * num_beams лучших по сумме логарифмов вероятностей: продолжения с eos_token_id становятся
+    готовыми гипотезами, остальные - лучами следующего шага. Состояние hx переупорядочивается под новые
+    лучи через index_select, без копирования по одному лучу.
+
+    Параметры:
+    -----------
+    model : Model
+        Обученная модель для генерации текста.
+    tokenizer : ByteTokenizer
+        Токенизатор для кодирования промпта и декодирования результата.
+    num_beams : int, по умолчанию 4
+        Количество лучей. При num_beams=1 результат совпадает с жадной генерацией (generate с temperature=0).
+    max_length : int, по умолчанию 1024
+        Максимальное количество генерируемых токенов.
+    length_penalty : float, по умолчанию 1.0
+        Оценка гипотезы - сумма логарифмов вероятностей её токенов, делённая на длину в степени length_penalty.
+        Значения больше 0 поощряют длинные гипотезы, меньше 0 - короткие.
+    early_stopping : bool, по умолчанию True
+        Если True, поиск заканчивается, как только готово num_beams гипотез. Если False - когда ни один
+        из текущих лучей уже не может обогнать худшую из готовых гипотез.
+    num_return_sequences : int, по умолчанию 1
+        Сколько лучших гипотез вернуть (не больше num_beams).
+    prompt, prompt_cache
+        Как в generate.
+    return_scores : bool, по умолчанию False
+        Если True, вместе с текстами возвращаются их оценки.
+
+    Возвращает:
+    -----------
+    Union[List[str], List[Tuple[str, float]]]
+        Лучшие гипотезы по убыванию оценки (или пары (текст, оценка), если return_scores=True).
+
+    Пример:
+    --------
+    >>> texts = beam_search(model, tokenizer, num_beams=8, max_length=100, num_return_sequences=3)
+    >>> len(texts)
+    3
+    """
+    if num_return_sequences > num_beams:
+        raise ValueError('num_return_sequences must not exceed num_beams')
+
+    def normalized(score: float, length: int) -> float:
+        return score / max(length, 1) ** length_penalty
+
+    # Готовые гипотезы: (оценка, номера токенов)
+    finished: List[Tuple[float, List[int]]] = []
+    logits, hx = encode_prompt(model, tokenizer, prompt, prompt_cache)
+    # Вначале есть единственный луч, иначе все лучи на первом шаге совпали бы
+    scores = torch.zeros(1)
+    sequences = torch.empty(1, 0, dtype=torch.long)
+
+    model.eval()
+    with torch.no_grad():
+        for step in range(max_length):
+            if step > 0:
+                logits, hx = model(sequences[:, -1:], hx)
+                logits = logits[:, -1]
+            vocab_size = logits.size(-1)
+            candidates = (scores[:, None] + torch.log_softmax(logits.float(), dim=-1)).view(-1)
+            top_scores, top_ids = candidates.topk(min(2 * num_beams, candidates.numel()))
+
+            beam_idx, beam_tokens, beam_scores = [], [], []
+            for score, idx in zip(top_scores.tolist(), top_ids.tolist()):
+                beam, token = divmod(idx, vocab_size)
+                if token == tokenizer.eos_token_id:
+                    finished.append((normalized(score, step), sequences[beam].tolist()))
+                else:
+                    beam_idx.append(beam)
+                    beam_tokens.append(token)
+                    beam_scores.append(score)
+                    if len(beam_idx) == num_beams:
+                        break
+            finished = sorted(finished, key=lambda hyp: -hyp[0])[:num_beams]
+
+            if len(finished) == num_beams:
+                if early_stopping:
+                    break
+                # Сумма логарифмов вероятностей луча только убывает, поэтому его лучшая возможная оценка
+                # достигается при самой большой длине (length_penalty > 0) или на следующем шаге (иначе)
+                best_running = normalized(max(beam_scores), max_length if length_penalty > 0 else step + 1)
+                if finished[-1][0] >= best_running:
+                    break
+
+            beam_idx = torch.tensor(beam_idx)
+            sequences = torch.cat([sequences.index_select(0, beam_idx), torch.tensor(beam_tokens)[:, None]], dim=1)
+            scores = torch.tensor(beam_scores)
+            hx = (hx[0].index_select(1, beam_idx), hx[1].index_select(1, beam_idx))
+        else:
+            # Лучи, дошедшие до max_length, тоже становятся гипотезами
+            for score, ids in zip(scores.tolist(), sequences.tolist()):
+                finished.append((normalized(score, len(ids)), ids))
+            finished = sorted(finished, key=lambda hyp: -hyp[0])[:num_beams]
+
+    best = [(tokenizer.decode(ids), score) for score, ids in finished[:num_return_sequences]]
+    return best if return_scores else [text for text, _ in best]
@@ -0,0 +1,115 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ('data', 'forward', 'backward', 'optimizer')
+
+T = TypeVar('T')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Возвращает пиковый размер резидентной памяти процесса за всё время его работы в мегабайтах
+    (None, если он недоступен). Значение не уменьшается, поэтому не показывает память отдельного интервала.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def rss_mb() -> Optional[float]:
+    """Возвращает текущий размер резидентной памяти процесса в мегабайтах (None, если нет /proc/self/statm)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * resource.getpagesize() / 2 ** 20
+
+
+class StepTimer:
+    """
+    Считает время, потраченное на фазы шага обучения: ожидание данных, прямой проход, обратный проход
+    и шаг оптимизатора, а также число обработанных примеров и токенов.
+
+    Каждая фаза дополнительно отмечается через torch.profiler.record_function, поэтому в трассировке
+    профайлера операции сгруппированы по фазам.
+
+    Пример:
+    ----------
+    >>> timer = StepTimer()
+    >>> with timer.phase('forward'):
+    ...     logits, _ = model(x)
+    >>> timer.summary()['forward_time']
+    0.0123
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Обнуляет накопленные времена и счётчики."""
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.samples = 0
+        self.tokens = 0
+        self.steps = 0
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Контекст, время выполнения которого добавляется к фазе name."""
+        start = time.perf_counter()
+        with torch.profiler.record_function(name):
+            yield
+        self.times[name] += time.perf_counter() - start
+
+    def iterate(self, iterable: Iterable[T], name: str = 'data') -> Iterator[T]:
+        """Перебирает элементы iterable; время ожидания каждого элемента добавляется к фазе name."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Возвращает статистику с момента последнего reset.
+
+        Возвращает:
+        -----------
+        Dict[str, Any]
+            Суммарное время каждой фазы в секундах (<фаза>_time), общее время (elapsed), число шагов,
+            примеры и токены в секунду, текущий размер памяти процесса в конце интервала (rss_mb) и пиковый
+            размер памяти за всё время работы процесса (peak_rss_mb).
+        """
+        elapsed = time.perf_counter() - self.start
+        # Счётчик токенов может быть тензором, чтобы не синхронизироваться на каждом шаге
+        tokens = float(self.tokens)
+        summary = {f'{name}_time': value for name, value in self.times.items()}
+        summary.update({
+            'elapsed': elapsed,
+            'steps': self.steps,
+            'samples_per_sec': self.samples / elapsed if elapsed > 0 else 0.0,
+            'tokens_per_sec': tokens / elapsed if elapsed > 0 else 0.0,
+            'rss_mb': rss_mb(),
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        return summary
+
+
+def write_jsonl(path: str, record: Dict[str, Any]) -> None:
+    """Дописывает запись в JSONL-файл (одна JSON-строка на запись)."""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
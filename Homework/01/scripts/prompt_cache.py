@@ -0,0 +1,143 @@
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional, Sequence, Tuple
+import torch
+from torch import Tensor
+from scripts.model import Model
+
+PromptCacheInfo = namedtuple(
+    'PromptCacheInfo',
+    ['hits', 'partial_hits', 'misses', 'reused_tokens', 'computed_tokens', 'maxsize', 'currsize', 'nbytes']
+)
+
+PromptState = Tuple[Tensor, Tuple[Tensor, Tensor]]
+
+
+class PromptCache:
+    """
+    LRU-кэш состояний LSTM после прочтения промпта.
+
+    Ключ - кортеж номеров токенов промпта (вместе с bos), значение - логиты следующего токена размером
+    (1, vocab_size) и состояние (h_n, c_n) размером (num_layers, 1, hidden_size). При запросе ищется самый
+    длинный закэшированный префикс промпта: если промпт уже встречался, модель не вызывается вовсе,
+    а если встречалось его начало, через модель пропускается только продолжение.
+
+    Кэш привязан к одной модели: после изменения её весов его нужно очистить (clear).
+
+    Параметры:
+    ----------
+    model : Model
+        Модель, состояния которой кэшируются.
+    maxsize : int, по умолчанию 128
+        Максимальное количество промптов в кэше.
+    max_bytes : Optional[int], по умолчанию None
+        Ограничение на суммарный размер закэшированных тензоров в байтах (None - без ограничения).
+
+    Пример:
+    ----------
+    >>> cache = PromptCache(model, maxsize=32)
+    >>> texts = [generate(model, tokenizer, prompt='Жили-были', prompt_cache=cache) for _ in range(10)]
+    >>> cache.cache_info().hits
+    9
+    """
+    def __init__(self, model: Model, maxsize: int = 128, max_bytes: Optional[int] = None):
+        self.model = model
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._cache: 'OrderedDict[Tuple[int, ...], PromptState]' = OrderedDict()
+        # Сколько ключей каждой длины лежит в кэше: поиск префикса проверяет только эти длины
+        self._lengths: Dict[int, int] = {}
+        self._nbytes = 0
+        self.clear()
+
+    def clear(self) -> None:
+        """Очищает кэш и статистику."""
+        self._cache.clear()
+        self._lengths.clear()
+        self._nbytes = 0
+        self._hits = 0
+        self._partial_hits = 0
+        self._misses = 0
+        self._reused_tokens = 0
+        self._computed_tokens = 0
+
+    def cache_info(self) -> PromptCacheInfo:
+        """
+        Возвращает статистику кэша: число полных попаданий, попаданий по префиксу и промахов,
+        число взятых из кэша и посчитанных моделью токенов, максимальный и текущий размер и занятую память в байтах.
+        """
+        return PromptCacheInfo(
+            self._hits, self._partial_hits, self._misses, self._reused_tokens, self._computed_tokens,
+            self.maxsize, len(self._cache), self._nbytes
+        )
+
+    def _longest_prefix(self, key: Tuple[int, ...]) -> Tuple[int, ...]:
+        for length in sorted(self._lengths, reverse=True):
+            if length <= len(key) and key[:length] in self._cache:
+                return key[:length]
+        return ()
+
+    @staticmethod
+    def _state_nbytes(state: PromptState) -> int:
+        logits, (h, c) = state
+        return sum(t.element_size() * t.nelement() for t in (logits, h, c))
+
+    def _put(self, key: Tuple[int, ...], state: PromptState) -> None:
+        nbytes = self._state_nbytes(state)
+        if self.maxsize <= 0 or (self.max_bytes is not None and nbytes > self.max_bytes):
+            return
+        self._cache[key] = state
+        self._lengths[len(key)] = self._lengths.get(len(key), 0) + 1
+        self._nbytes += nbytes
+        while len(self._cache) > self.maxsize or (self.max_bytes is not None and self._nbytes > self.max_bytes):
+            old_key, old_state = self._cache.popitem(last=False)
+            self._nbytes -= self._state_nbytes(old_state)
+            self._lengths[len(old_key)] -= 1
+            if self._lengths[len(old_key)] == 0:
+                del self._lengths[len(old_key)]
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __call__(self, ids: Sequence[int]) -> PromptState:
+        """
+        Пропускает промпт через модель, используя самый длинный закэшированный префикс.
+
+        Параметры:
+        ----------
+        ids : Sequence[int]
+            Номера токенов промпта, обычно начинающиеся с bos_token_id. Не может быть пустым.
+
+        Возвращает:
+        -----------
+        PromptState
+            Логиты следующего токена размером (1, vocab_size) и состояние (h_n, c_n) модели после промпта.
+            Тензоры общие с кэшем, изменять их на месте нельзя.
+        """
+        key = tuple(ids)
+        if not key:
+            raise ValueError('prompt must contain at least one token')
+        state = self._cache.get(key)
+        if state is not None:
+            self._hits += 1
+            self._reused_tokens += len(key)
+            self._cache.move_to_end(key)
+            return state
+
+        prefix = self._longest_prefix(key)
+        hx = None
+        if prefix:
+            self._partial_hits += 1
+            self._reused_tokens += len(prefix)
+            self._cache.move_to_end(prefix)
+            hx = self._cache[prefix][1]
+        else:
+            self._misses += 1
+        self._computed_tokens += len(key) - len(prefix)
+
+        self.model.eval()
+        with torch.no_grad():
+            logits, hx = self.model(torch.tensor([key[len(prefix):]], dtype=torch.long), hx)
+        # clone, чтобы кэш не держал логиты всех позиций промпта
+        state = (logits[:, -1].clone(), hx)
+        self._put(key, state)
+        return state
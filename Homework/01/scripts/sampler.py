@@ -0,0 +1,155 @@
+from typing import Iterator, List, Optional, Sequence
+import numpy as np
+from torch.utils.data import Dataset, Sampler
+
+
+def get_lengths(dataset: Dataset) -> np.ndarray:
+    """
+    Возвращает длины элементов набора данных.
+
+    Если у набора есть атрибут lengths (MyDataset, ShardedDataset), используется он,
+    иначе длины вычисляются обходом всех элементов.
+    """
+    lengths = getattr(dataset, 'lengths', None)
+    if lengths is None:
+        lengths = [len(dataset[idx]) for idx in range(len(dataset))]
+    return np.asarray(lengths, dtype=np.int64)
+
+
+class BucketBatchSampler(Sampler[List[int]]):
+    """
+    Семплер батчей, группирующий последовательности близкой длины, чтобы уменьшить долю паддинга.
+
+    Последовательности раскладываются по корзинам по границам длин boundaries. Внутри каждой корзины
+    индексы перемешиваются и нарезаются на батчи: либо по batch_size штук, либо так, чтобы число
+    токенов в батче с учётом паддинга (размер батча * максимальная длина в нём) не превышало max_tokens.
+    Затем батчи всех корзин перемешиваются между собой. Перемешивание детерминировано
+    и зависит от seed и номера эпохи (см. set_epoch).
+
+    Параметры:
+    ----------
+    lengths : Sequence[int]
+        Длины последовательностей (см. get_lengths).
+    batch_size : Optional[int], по умолчанию None
+        Количество последовательностей в батче. Нужно задать ровно один из batch_size и max_tokens.
+    max_tokens : Optional[int], по умолчанию None
+        Максимальное количество токенов в батче с учётом паддинга.
+    boundaries : Optional[Sequence[int]], по умолчанию None
+        Возрастающие границы длин корзин: последовательность длины l попадает в корзину с номером
+        np.searchsorted(boundaries, l, side='right'). Если None, границы - квантили длин (num_buckets корзин).
+    num_buckets : int, по умолчанию 8
+        Количество корзин, если boundaries не заданы.
+    shuffle : bool, по умолчанию True
+        Перемешивать ли индексы внутри корзин и батчи между корзинами. Если False, батчи идут
+        по возрастанию длины (удобно для оценки).
+    drop_last : bool, по умолчанию False
+        Отбрасывать ли неполный последний батч каждой корзины (только вместе с batch_size).
+    seed : int, по умолчанию 0
+        Зерно генератора случайных чисел.
+
+    Пример:
+    ----------
+    >>> sampler = BucketBatchSampler(get_lengths(dataset), max_tokens=4096, boundaries=[32, 64, 128])
+    >>> loader = DataLoader(dataset, batch_sampler=sampler, collate_fn=Collator(tokenizer.pad_token_id))
+    """
+    def __init__(
+            self,
+            lengths: Sequence[int],
+            batch_size: Optional[int] = None,
+            max_tokens: Optional[int] = None,
+            boundaries: Optional[Sequence[int]] = None,
+            num_buckets: int = 8,
+            shuffle: bool = True,
+            drop_last: bool = False,
+            seed: int = 0
+    ):
+        if (batch_size is None) == (max_tokens is None):
+            raise ValueError('exactly one of batch_size and max_tokens must be set')
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        if boundaries is None:
+            quantiles = np.linspace(0, 1, num_buckets + 1)[1:-1]
+            boundaries = np.unique(np.quantile(self.lengths, quantiles).astype(np.int64)) if len(self.lengths) else []
+        self.boundaries = np.asarray(boundaries, dtype=np.int64)
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self.buckets = np.searchsorted(self.boundaries, self.lengths, side='right')
+
+    def set_epoch(self, epoch: int) -> None:
+        """Задаёт номер эпохи, от которого зависит перемешивание."""
+        self.epoch = epoch
+
+    def _split(self, indices: np.ndarray) -> List[List[int]]:
+        if self.batch_size is not None:
+            batches = [indices[i:i + self.batch_size].tolist() for i in range(0, len(indices), self.batch_size)]
+            if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+                batches.pop()
+            return batches
+
+        batches, batch, max_len = [], [], 0
+        for idx, length in zip(indices.tolist(), self.lengths[indices].tolist()):
+            new_max_len = max(max_len, length)
+            if batch and (len(batch) + 1) * new_max_len > self.max_tokens:
+                batches.append(batch)
+                batch, new_max_len = [], length
+            batch.append(idx)
+            max_len = new_max_len
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _batches(self) -> List[List[int]]:
+        rng = np.random.default_rng([self.seed, self.epoch])
+        batches = []
+        for bucket in np.unique(self.buckets):
+            indices = np.flatnonzero(self.buckets == bucket)
+            if self.shuffle:
+                indices = rng.permutation(indices)
+            else:
+                indices = indices[np.argsort(self.lengths[indices], kind='stable')]
+            batches += self._split(indices)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        return iter(self._batches())
+
+    def __len__(self) -> int:
+        if self.batch_size is not None:
+            counts = np.bincount(self.buckets)
+            counts = counts[counts > 0]
+            if self.drop_last:
+                return int(np.sum(counts // self.batch_size))
+            return int(np.sum(-(-counts // self.batch_size)))
+        return len(self._batches())
+
+
+class SkipBatchSampler(Sampler[List[int]]):
+    """
+    Семплер батчей, пропускающий первые skip батчей другого семплера батчей.
+
+    Используется для продолжения эпохи с середины после загрузки чекпоинта: пропускаются только
+    номера элементов, сами данные уже обработанных батчей не загружаются.
+
+    Параметры:
+    ----------
+    batch_sampler : Sampler[List[int]]
+        Исходный семплер батчей (например, DataLoader.batch_sampler или BucketBatchSampler).
+    skip : int
+        Сколько первых батчей пропустить.
+    """
+    def __init__(self, batch_sampler: Sampler[List[int]], skip: int):
+        self.batch_sampler = batch_sampler
+        self.skip = skip
+
+    def __iter__(self) -> Iterator[List[int]]:
+        for i, batch in enumerate(self.batch_sampler):
+            if i >= self.skip:
+                yield batch
+
+    def __len__(self) -> int:
+        return max(len(self.batch_sampler) - self.skip, 0)
@@ -0,0 +1,200 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from typing import Optional, Sequence, Tuple, Union
+from torch import Tensor
+
+RowParam = Union[None, int, float, Sequence[float], np.ndarray, Tensor]
+
+
+def _as_row_param(value: RowParam) -> Union[None, int, float, Tensor]:
+    """Оставляет общее значение числом, а значения для каждой строки (список, np.ndarray, Tensor) превращает в тензор."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    value = torch.as_tensor(value)
+    return value.item() if value.dim() == 0 else value
+
+
+def apply_penalties(
+        logits: Tensor,
+        token_counts: Tensor,
+        repetition_penalty: float = 1.0,
+        frequency_penalty: float = 0.0
+) -> Tensor:
+    """
+    Штрафует логиты уже сгенерированных токенов.
+
+    Параметры:
+    -----------
+    logits : Tensor
+        Логиты следующего токена размером (batch_size, vocab_size).
+    token_counts : Tensor
+        Сколько раз каждый токен уже встречался в каждой последовательности, размер (batch_size, vocab_size).
+    repetition_penalty : float, по умолчанию 1.0
+        Штраф за повторение (как в CTRL): положительные логиты встречавшихся токенов делятся на него,
+        отрицательные - умножаются. 1.0 - без штрафа.
+    frequency_penalty : float, по умолчанию 0.0
+        Из логита вычитается frequency_penalty, умноженный на число появлений токена.
+
+    Возвращает:
+    -----------
+    Tensor
+        Логиты со штрафами (исходный тензор не изменяется).
+    """
+    if repetition_penalty != 1.0:
+        penalized = torch.where(logits > 0, logits / repetition_penalty, logits * repetition_penalty)
+        logits = torch.where(token_counts > 0, penalized, logits)
+    if frequency_penalty != 0.0:
+        logits = logits - frequency_penalty * token_counts.to(logits.dtype)
+    return logits
+
+
+def sample_next_token(
+        logits: Tensor,
+        temperature: RowParam = 1.0,
+        top_k: RowParam = None,
+        top_p: RowParam = None,
+        min_p: RowParam = None,
+        generator: Optional[torch.Generator] = None
+) -> Tensor:
+    """
+    Выбирает следующий токен для каждой строки батча логитов, не покидая torch.
+
+    Каждый параметр может быть общим числом или значениями для каждой строки размером (batch_size,)
+    (тензор, np.ndarray или список).
+    Строки с температурой 0 выбираются жадно. При заданном top_k все дальнейшие вычисления (softmax,
+    top-p, min-p, семплирование) выполняются только над k лучшими логитами, без softmax по всему словарю
+    (top_k не меньше размера словаря ничего не ограничивает, и topk не вызывается). Если все параметры - числа,
+    выбор идёт без масок и индексации по строкам: это основной случай генерации по одному тексту.
+
+    Параметры:
+    -----------
+    logits : Tensor
+        Логиты следующего токена размером (batch_size, vocab_size).
+    temperature : RowParam, по умолчанию 1.0
+        Температура (0 - жадный выбор).
+    top_k : RowParam, по умолчанию None
+        Выбор только из top_k наиболее вероятных токенов (None или значения <= 0 - без ограничения).
+    top_p : RowParam, по умолчанию None
+        Nucleus sampling: выбор из минимального набора самых вероятных токенов с суммарной вероятностью не меньше top_p.
+    min_p : RowParam, по умолчанию None
+        Отбрасываются токены с вероятностью меньше min_p, умноженного на вероятность самого вероятного токена.
+    generator : Optional[torch.Generator], по умолчанию None
+        Генератор случайных чисел для воспроизводимости (None - глобальный генератор torch).
+
+    Возвращает:
+    -----------
+    Tensor
+        Номера выбранных токенов размером (batch_size,).
+
+    Пример:
+    --------
+    >>> generator = torch.Generator().manual_seed(0)
+    >>> logits = torch.randn(4, 259, generator=generator)
+    >>> sample_next_token(logits, temperature=0.8, top_k=50, top_p=0.9, generator=generator)
+    tensor([ 14,   6,  55, 106])
+    """
+    params = (temperature, top_k, top_p, min_p)
+    if not all(value is None or isinstance(value, (int, float)) for value in params):
+        temperature, top_k, top_p, min_p = params = tuple(_as_row_param(value) for value in params)
+        if any(isinstance(value, Tensor) for value in params):
+            return _sample_rows(logits, temperature, top_k, top_p, min_p, generator)
+
+    # Общие для всех строк параметры: без масок и индексации по строкам
+    if temperature <= 0:
+        return logits.argmax(-1)
+    values, indices = logits / temperature, None
+    if top_k is not None and 0 < top_k < logits.size(-1):
+        values, indices = values.topk(top_k, dim=-1)
+    if top_p is not None or min_p is not None:
+        values, indices = _filter_probs(values, indices, top_p, min_p)
+    choice = _draw(values, generator)
+    return choice if indices is None else indices.gather(-1, choice[:, None])[:, 0]
+
+
+def _sample_rows(
+        logits: Tensor,
+        temperature: Union[int, float, Tensor],
+        top_k: Union[None, int, float, Tensor],
+        top_p: Union[None, int, float, Tensor],
+        min_p: Union[None, int, float, Tensor],
+        generator: Optional[torch.Generator]
+) -> Tensor:
+    """sample_next_token, когда хотя бы один параметр задан для каждой строки тензором (batch_size,)."""
+    vocab_size = logits.size(-1)
+    if not isinstance(temperature, Tensor):
+        if temperature <= 0:
+            return logits.argmax(-1)
+        sample = None
+        values = logits / temperature
+    else:
+        tokens = logits.argmax(-1)
+        sample = temperature.to(logits.dtype) > 0
+        if not sample.any():
+            return tokens
+        values = logits[sample] / temperature.to(logits.dtype)[sample, None]
+
+    def rows(value: Union[None, int, float, Tensor], dtype: torch.dtype) -> Union[None, int, float, Tensor]:
+        if not isinstance(value, Tensor):
+            return value
+        value = value.to(dtype)
+        return (value if sample is None else value[sample])[:, None]
+
+    indices = None
+    if top_k is not None:
+        k = rows(top_k, torch.long)
+        if isinstance(k, Tensor):
+            k = torch.where(k > 0, k, vocab_size).clamp(max=vocab_size)
+            if bool((k < vocab_size).any()):
+                # topk возвращает значения по убыванию, поэтому лишние для строки позиции - это хвост после k-й
+                values, indices = values.topk(int(k.max()), dim=-1)
+                values = values.masked_fill(torch.arange(values.size(-1)) >= k, float('-inf'))
+        elif 0 < k < vocab_size:
+            values, indices = values.topk(k, dim=-1)
+
+    if top_p is not None or min_p is not None:
+        values, indices = _filter_probs(values, indices, rows(top_p, values.dtype), rows(min_p, values.dtype))
+
+    choice = _draw(values, generator)
+    if indices is not None:
+        choice = indices.gather(-1, choice[:, None])[:, 0]
+    if sample is None:
+        return choice
+    tokens[sample] = choice
+    return tokens
+
+
+def _filter_probs(
+        values: Tensor,
+        indices: Optional[Tensor],
+        top_p: Union[None, float, Tensor],
+        min_p: Union[None, float, Tensor]
+) -> Tuple[Tensor, Optional[Tensor]]:
+    """
+    Отбрасывает (заменяет на -inf) логиты вне top_p и min_p. top_p и min_p - числа или столбцы (n, 1).
+    Если indices is None, логиты сначала сортируются по убыванию, и возвращаются номера токенов после сортировки.
+    """
+    if top_p is not None and indices is None:
+        values, indices = values.sort(dim=-1, descending=True)
+    probs = F.softmax(values, dim=-1)
+    if min_p is not None:
+        threshold = min_p * probs.max(dim=-1, keepdim=True).values
+        values = values.masked_fill(probs < threshold, float('-inf'))
+    if top_p is not None:
+        # Токен остаётся, если вероятность более вероятных токенов ещё не набрала top_p (первый остаётся всегда)
+        mass_before = probs.cumsum(dim=-1) - probs
+        values = values.masked_fill(mass_before >= top_p, float('-inf'))
+    return values, indices
+
+
+def _draw(values: Tensor, generator: Optional[torch.Generator]) -> Tensor:
+    """
+    Выбирает по одной позиции в каждой строке с вероятностями softmax(values).
+
+    Вместо torch.multinomial используется "экспоненциальная гонка": argmax(p_i / q_i) при q_i ~ Exp(1)
+    выпадает с вероятностью p_i, а для одной строки это заметно быстрее multinomial.
+    """
+    probs = F.softmax(values, dim=-1)
+    noise = torch.empty_like(probs).exponential_(generator=generator)
+    # q = 0 дало бы 0 / 0 = nan у отброшенных токенов
+    return (probs / noise.clamp_(min=torch.finfo(noise.dtype).tiny)).argmax(-1)
@@ -0,0 +1,86 @@
+import json
+from typing import Any, Dict, Tuple
+import numpy as np
+
+MAGIC = b'VKNLPARR'
+VERSION = 1
+ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_arrays(path: str, header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Записывает JSON-заголовок и набор numpy-массивов в один бинарный файл.
+
+    Формат файла: MAGIC, версия и длина заголовка (uint32, little-endian), JSON-заголовок,
+    затем данные массивов, каждый с выравниванием на ALIGNMENT байт. Смещения, типы и формы
+    массивов сохраняются в заголовке, поэтому при чтении массивы можно отобразить в память (np.memmap).
+
+    Параметры:
+    ----------
+    path : str
+        Путь к файлу.
+    header : Dict[str, Any]
+        Произвольные метаданные, сериализуемые в JSON.
+    arrays : Dict[str, np.ndarray]
+        Массивы для записи.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        dtype = array.dtype.newbyteorder('<')
+        layout[name] = {'dtype': dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    meta = json.dumps({'header': header, 'arrays': layout}).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(meta))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([VERSION, len(meta)], dtype='<u4').tobytes())
+        f.write(meta)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(array, dtype=layout[name]['dtype']).tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_arrays(path: str, mmap: bool = True) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Читает файл, записанный write_arrays.
+
+    Параметры:
+    ----------
+    path : str
+        Путь к файлу.
+    mmap : bool, по умолчанию True
+        Если True, массивы отображаются в память в режиме только для чтения и не копируются.
+
+    Возвращает:
+    -----------
+    Tuple[Dict[str, Any], Dict[str, np.ndarray]]
+        Заголовок и словарь массивов.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an array file')
+        version, meta_len = np.frombuffer(f.read(8), dtype='<u4')
+        if version != VERSION:
+            raise ValueError(f'unsupported file version {version}')
+        meta = json.loads(f.read(int(meta_len)).decode('utf-8'))
+        data_start = _align(len(MAGIC) + 8 + int(meta_len))
+
+        arrays = {}
+        for name, spec in meta['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            offset = data_start + spec['offset']
+            if mmap and int(np.prod(shape)) > 0:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+            else:
+                f.seek(offset)
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+    return meta['header'], arrays
@@ -1,5 +1,13 @@
-from typing import List, Tuple, Dict
+import os
+import re
+import random
+from multiprocessing import Pool
+from collections import Counter, OrderedDict, namedtuple
+from typing import Any, List, Tuple, Dict, Optional, Iterable
+import numpy as np
 from tqdm import tqdm
+from scripts.bpe import iter_merges, apply_merges
+from scripts.serialization import read_arrays, write_arrays
 
 
 class ByteTokenizer:
@@ -37,10 +45,16 @@ class ByteTokenizer:
         Переинициализирует словарь (переопределяется в потомках).
     encode(text: str) -> List[int]
         Преобразует строку в список идентификаторов (байтов) с использованием кодировки UTF-8.
+    encode_batch(texts: List[str], num_workers: Optional[int] = None) -> List[List[int]]
+        Кодирует список строк параллельно в пуле процессов, сохраняя порядок.
     decode(ids: List[int]) -> str
         Преобразует список идентификаторов (байтов) обратно в строку.
     get_vocab_size() -> int
         Возвращает размер словаря (количество уникальных символов и токенов).
+    save(path: str) -> None
+        Сохраняет токенизатор в компактный бинарный файл.
+    load(path: str, mmap: bool = True) -> ByteTokenizer
+        Загружает токенизатор, сохранённый методом save (classmethod).
 
     Пример использования:
     ---------------------
@@ -98,6 +112,46 @@ class ByteTokenizer:
         """
         return list(text.encode('utf-8'))
 
+    def encode_batch(
+            self,
+            texts: List[str],
+            num_workers: Optional[int] = None,
+            chunk_size: Optional[int] = None,
+            progress: bool = False
+    ) -> List[List[int]]:
+        """Кодирует список строк, распределяя их по пулу процессов.
+
+        Токенизатор (с таблицей склеиваний, но без кэша кодирования) передаётся каждому процессу один раз при запуске,
+        а тексты отправляются пачками по chunk_size штук. Результаты возвращаются в исходном порядке.
+
+        Параметры:
+        ----------
+        texts : List[str]
+            Список строк для кодирования.
+        num_workers : Optional[int], по умолчанию None
+            Количество процессов (None - по числу ядер). При значении 0 или 1 кодирование идёт в текущем процессе.
+        chunk_size : Optional[int], по умолчанию None
+            Количество текстов, отправляемых процессу за раз (None - подбирается по числу текстов и процессов).
+        progress : bool, по умолчанию False
+            Показывать ли прогресс с помощью tqdm.
+
+        Возвращает:
+        -----------
+        List[List[int]]
+            Списки идентификаторов для каждого текста в том же порядке, что и texts.
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(texts))
+        if num_workers <= 1:
+            return [self.encode(text) for text in tqdm(texts, disable=not progress)]
+
+        if chunk_size is None:
+            chunk_size = max(1, min(1024, len(texts) // (num_workers * 4)))
+        with Pool(num_workers, initializer=_init_encode_worker, initargs=(self,)) as pool:
+            results = pool.imap(_encode_in_worker, texts, chunksize=chunk_size)
+            return list(tqdm(results, total=len(texts), disable=not progress))
+
     def decode(self, ids: List[int]) -> str:
         """Преобразует список идентификаторов обратно в строку.
 
@@ -124,6 +178,72 @@ class ByteTokenizer:
         """
         return len(self.vocab)
 
+    def save(self, path: str) -> None:
+        """Сохраняет токенизатор в бинарный файл (см. scripts.serialization.write_arrays).
+
+        Байтовые представления токенов хранятся одним массивом байт (vocab_blob) и массивом смещений
+        (vocab_offsets), наследники добавляют свои массивы (например, таблицу склеиваний).
+
+        Параметры:
+        ----------
+        path : str
+            Путь к файлу.
+        """
+        write_arrays(path, {'class': type(self).__name__, 'config': self._config()}, self._arrays())
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ByteTokenizer':
+        """Загружает токенизатор, сохранённый методом save.
+
+        Параметры:
+        ----------
+        path : str
+            Путь к файлу.
+        mmap : bool, по умолчанию True
+            Отображать ли массивы файла в память вместо чтения.
+
+        Возвращает:
+        -----------
+        ByteTokenizer
+            Токенизатор того же класса, что и cls.
+        """
+        header, arrays = read_arrays(path, mmap=mmap)
+        if header['class'] != cls.__name__:
+            raise ValueError(f'{path} contains {header["class"]}, not {cls.__name__}')
+        tokenizer = cls(**header['config'])
+        tokenizer._load_arrays(arrays)
+        return tokenizer
+
+    def _config(self) -> Dict[str, Any]:
+        """Аргументы конструктора, которые нужно сохранить вместе с токенизатором."""
+        return {}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        """Массивы, из которых восстанавливается состояние токенизатора."""
+        tokens = [self.vocab[idx] for idx in range(len(self.vocab))]
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(token) for token in tokens])
+        return {
+            'vocab_offsets': offsets,
+            'vocab_blob': np.frombuffer(b''.join(tokens), dtype=np.uint8)
+        }
+
+    def _load_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """Восстанавливает состояние токенизатора из массивов, полученных из _arrays."""
+        blob = arrays['vocab_blob'].tobytes()
+        offsets = arrays['vocab_offsets'].tolist()
+        self.vocab = {idx: blob[offsets[idx]:offsets[idx + 1]] for idx in range(len(offsets) - 1)}
+
+_worker_tokenizer = None
+
+def _init_encode_worker(tokenizer: ByteTokenizer) -> None:
+    """Сохраняет токенизатор в глобальной переменной процесса пула (вызывается один раз при запуске процесса)."""
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+def _encode_in_worker(text: str) -> List[int]:
+    return _worker_tokenizer.encode(text)
+
 def count_pairs(data: List[List[int]]) -> Dict[Tuple[int, int], int]:
     """
     Считает, сколько раз встречается каждая пара последовательных элементов (стоящих на соседних позициях) во всех списках чисел.
@@ -196,6 +316,49 @@ def merge(numbers: List[int], pair: Tuple[int, int], idx: int) -> List[int]:
             i += 1
     return numbers
 
+def apply_merges_naive(ids: List[int], merges: Dict[Tuple[int, int], int]) -> List[int]:
+    """
+    Применяет таблицу склеиваний BPE, на каждом шаге заново пересчитывая пары и перебирая таблицу по порядку.
+
+    Эталонная реализация за O(len(ids) * len(merges)), с которой сверяется apply_merges.
+
+    Параметры:
+    ----------
+    ids : List[int]
+        Исходная последовательность токенов.
+    merges : Dict[Tuple[int, int], int]
+        Таблица склеиваний в порядке добавления токенов в словарь.
+
+    Возвращает:
+    -----------
+    List[int]
+        Последовательность токенов после применения всех склеиваний.
+    """
+    ids = list(ids)
+    # Последовательно применяем таблицу склеиваний в том порядке, в котором добавлялись токены в словарь
+    while len(ids) > 1:
+        cnt = count_pairs([ids])
+        pair = None
+        for p in merges:
+            if p in cnt.keys():
+                pair = p
+                break
+        if pair is None:
+            break
+        idx = merges[pair]
+        ids = merge(ids, pair, idx)
+    return ids
+
+# Шаблоны предварительного разбиения текста на куски, внутри которых работает BPE.
+# 'gpt2' повторяет шаблон GPT-2 средствами стандартного модуля re (без \p{L} и \p{N}),
+# 'whitespace' отделяет слова вместе с предшествующими им пробелами.
+PRETOKENIZE_PATTERNS = {
+    'gpt2': r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+""",
+    'whitespace': r'\s*\S+|\s+',
+}
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
 class BpeTokenizer(ByteTokenizer):
     """
     Класс для токенизации текста с использованием байтового представления и BPE (Byte Pair Encoding) алгоритма.
@@ -208,14 +371,27 @@ class BpeTokenizer(ByteTokenizer):
     ----------
     merges : dict
         Словарь, в котором хранятся пары токенов и их новые индексы после склеивания (BPE).
+    pattern : Optional[str]
+        Регулярное выражение для предварительного разбиения текста на куски (или None, если текст не разбивается).
+        Склеивания не пересекают границы кусков ни при обучении, ни при кодировании.
+    cache_size : int
+        Максимальное число кусков в LRU-кэше кодирования (0 - кэш отключён). Кэш используется только вместе с pattern.
 
     Методы:
     -------
     init_vocab() -> None
         Переинициализирует словарь, добавляя таблицу склеиваний BPE.
-    train(texts: List[str], max_vocab: int) -> None
+    pretokenize(text: str) -> List[str]
+        Разбивает текст на куски согласно pattern.
+    cache_info() -> CacheInfo
+        Возвращает статистику кэша кодирования: число попаданий, промахов, максимальный и текущий размер.
+    train(texts: List[str], max_vocab: int, incremental: bool = True) -> None
         Тренирует BPE-токенизатор, находя наиболее частотные пары токенов и склеивая их,
         пока не будет достигнут заданный размер словаря.
+    train_from_iterator(texts: Iterable[str], max_vocab: int, sample_rate: float = 1.0, seed: int = 0) -> None
+        Тренирует BPE-токенизатор на потоке текстов, храня только частоты кусков текста.
+    train_from_files(paths: Iterable[str], max_vocab: int, ...) -> None
+        Тренирует BPE-токенизатор на строках текстовых файлов.
     encode(text: str) -> List[int]
         Преобразует строку в список байтов с применением BPE для наиболее частотных пар токенов.
 
@@ -235,23 +411,80 @@ class BpeTokenizer(ByteTokenizer):
     >>> print(vocab_size)
     263
     """
-    def __init__(self):
+    def __init__(self, pattern: Optional[str] = None, cache_size: int = 100000):
         """
         Инициализирует BpeTokenizer, добавляя словарь для хранения склеиваний пар токенов (merges).
+
+        Параметры:
+        ----------
+        pattern : Optional[str], по умолчанию None
+            Имя шаблона из PRETOKENIZE_PATTERNS ('gpt2', 'whitespace') или произвольное регулярное выражение
+            для предварительного разбиения текста. Если None, текст не разбивается.
+        cache_size : int, по умолчанию 100000
+            Максимальное число кусков в LRU-кэше кодирования.
         """
         self.merges = {}
+        self.pattern = PRETOKENIZE_PATTERNS.get(pattern, pattern)
+        self.cache_size = cache_size
+        self._regex = re.compile(self.pattern) if self.pattern is not None else None
+        self._cache = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
         super().__init__()
 
+    @property
+    def merges(self) -> Dict[Tuple[int, int], int]:
+        """
+        Таблица склеиваний. После load хранится массивом пар и превращается в словарь при первом обращении.
+        """
+        if self._merges is None:
+            first_idx = len(self.vocab) - len(self._merges_array)
+            self._merges = {
+                (left, right): first_idx + rank
+                for rank, (left, right) in enumerate(self._merges_array.tolist())
+            }
+        return self._merges
+
+    @merges.setter
+    def merges(self, merges: Dict[Tuple[int, int], int]) -> None:
+        self._merges = merges
+        self._merges_array = None
+
     def init_vocab(self) -> None:
         """
-        Инициализирует словарь для токенизации и обнуляет таблицу склеиваний пар токенов.
+        Инициализирует словарь для токенизации и обнуляет таблицу склеиваний пар токенов и кэш кодирования.
 
         Вызывает родительский метод для создания исходного словаря с байтами и специальными токенами.
         """
         super().init_vocab()
         self.merges = {}
+        self._cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
 
-    def train(self, texts: List[str], max_vocab: int) -> None:
+    def pretokenize(self, text: str) -> List[str]:
+        """
+        Разбивает текст на куски согласно pattern. Конкатенация кусков совпадает с исходным текстом.
+
+        Параметры:
+        ----------
+        text : str
+            Входная строка.
+
+        Возвращает:
+        -----------
+        List[str]
+            Список кусков (один кусок - весь текст, если pattern не задан).
+        """
+        if self._regex is None:
+            return [text]
+        return self._regex.findall(text)
+
+    def cache_info(self) -> CacheInfo:
+        """Возвращает статистику LRU-кэша кодирования в том же виде, что и functools.lru_cache."""
+        return CacheInfo(self._cache_hits, self._cache_misses, self.cache_size, len(self._cache))
+
+    def train(self, texts: List[str], max_vocab: int, incremental: bool = True) -> None:
         """
         Тренирует BPE-токенизатор на предоставленных текстах, последовательно склеивая
         наиболее частотные пары токенов до достижения заданного размера словаря.
@@ -262,23 +495,32 @@ class BpeTokenizer(ByteTokenizer):
             Список текстов для тренировки токенизатора.
         max_vocab : int
             Максимальный размер словаря, после достижения которого процесс тренировки остановится.
+        incremental : bool, по умолчанию True
+            Если True, используется инкрементальный алгоритм по частотам кусков (см. train_from_iterator и iter_merges),
+            который обновляет частоты пар только в окрестностях склеенных позиций. Если False, на каждом шаге
+            частоты пересчитываются по всему корпусу. Оба режима строят одинаковую таблицу склеиваний.
 
         Возвращает:
         -----------
         None
         """
+        if incremental:
+            self.train_from_iterator(texts, max_vocab)
+            return
+
         self.init_vocab()
 
         if max_vocab <= len(self.vocab):
             return
         progress_bar = tqdm(range(max_vocab - len(self.vocab)))
 
-        # Формируем исходный список номеров токенов для каждого текста (изначально это байты в кодировке utf-8)
-        list_of_ids = [list(text.encode('utf-8')) for text in texts]
-        print(list_of_ids)
+        # Формируем исходный список номеров токенов для каждого куска текста (изначально это байты в кодировке utf-8)
+        list_of_ids = [list(chunk.encode('utf-8')) for text in texts for chunk in self.pretokenize(text)]
         for _ in progress_bar:
             # Находим наиболее частотную пару токенов для склеивания в один токен
             cnt = count_pairs(list_of_ids)
+            if not cnt:
+                break
             pair = max(cnt, key=cnt.get)
             freq = cnt[pair]
             progress_bar.set_description(f'pair={pair}, freq={freq}')
@@ -295,6 +537,115 @@ class BpeTokenizer(ByteTokenizer):
             for i, ids in enumerate(list_of_ids):
                 list_of_ids[i] = merge(ids, pair, new_idx)
 
+    def count_chunks(self, texts: Iterable[str], sample_rate: float = 1.0, seed: int = 0) -> Dict[str, int]:
+        """
+        За один проход по текстам считает, сколько раз встречается каждый кусок (см. pretokenize).
+
+        Параметры:
+        ----------
+        texts : Iterable[str]
+            Тексты или строки файлов; читаются по одному, целиком в памяти не хранятся.
+        sample_rate : float, по умолчанию 1.0
+            Доля текстов, которые попадут в подсчёт. Выборка детерминирована и зависит только от seed и порядка текстов.
+        seed : int, по умолчанию 0
+            Зерно генератора для выборки.
+
+        Возвращает:
+        -----------
+        Dict[str, int]
+            Частоты кусков в порядке их первого появления.
+        """
+        rng = random.Random(seed)
+        counts = Counter()
+        for text in tqdm(texts, desc='counting chunks'):
+            if sample_rate < 1.0 and rng.random() >= sample_rate:
+                continue
+            counts.update(self.pretokenize(text))
+        return counts
+
+    def train_from_iterator(
+            self,
+            texts: Iterable[str],
+            max_vocab: int,
+            sample_rate: float = 1.0,
+            seed: int = 0
+    ) -> None:
+        """
+        Тренирует BPE-токенизатор на потоке текстов, не загружая корпус в память.
+
+        Сначала за один проход считаются частоты кусков (count_chunks), затем склеивания обучаются
+        по уникальным кускам с учётом их частот, поэтому память ограничена размером словаря кусков,
+        а не размером корпуса. Таблица склеиваний совпадает с train на тех же текстах.
+        Без pattern кусками являются сами тексты (строки), и совпадающие строки тоже обрабатываются один раз.
+
+        Параметры:
+        ----------
+        texts : Iterable[str]
+            Итератор по текстам или строкам.
+        max_vocab : int
+            Максимальный размер словаря, после достижения которого процесс тренировки остановится.
+        sample_rate : float, по умолчанию 1.0
+            Доля текстов, на которых обучается токенизатор (детерминированная выборка).
+        seed : int, по умолчанию 0
+            Зерно генератора для выборки.
+
+        Возвращает:
+        -----------
+        None
+        """
+        self.init_vocab()
+
+        if max_vocab <= len(self.vocab):
+            return
+        counts = self.count_chunks(texts, sample_rate=sample_rate, seed=seed)
+        list_of_ids = [list(chunk.encode('utf-8')) for chunk in counts]
+        weights = list(counts.values())
+        del counts
+
+        progress_bar = tqdm(range(max_vocab - len(self.vocab)))
+        for _, (pair, freq) in zip(progress_bar, iter_merges(list_of_ids, len(self.vocab), weights)):
+            progress_bar.set_description(f'pair={pair}, freq={freq}')
+            if freq == 1:
+                break
+            new_idx = len(self.vocab)
+            self.merges[pair] = new_idx
+            self.vocab[new_idx] = self.vocab[pair[0]] + self.vocab[pair[1]]
+
+    def train_from_files(
+            self,
+            paths: Iterable[str],
+            max_vocab: int,
+            sample_rate: float = 1.0,
+            seed: int = 0,
+            encoding: str = 'utf-8'
+    ) -> None:
+        """
+        Тренирует BPE-токенизатор на строках текстовых файлов (см. train_from_iterator).
+
+        Параметры:
+        ----------
+        paths : Iterable[str]
+            Пути к текстовым файлам. Каждая строка файла (вместе с символом перевода строки) считается отдельным текстом.
+        max_vocab : int
+            Максимальный размер словаря.
+        sample_rate : float, по умолчанию 1.0
+            Доля строк, на которых обучается токенизатор.
+        seed : int, по умолчанию 0
+            Зерно генератора для выборки.
+        encoding : str, по умолчанию 'utf-8'
+            Кодировка файлов.
+
+        Возвращает:
+        -----------
+        None
+        """
+        def read_lines():
+            for path in paths:
+                with open(path, encoding=encoding) as f:
+                    yield from f
+
+        self.train_from_iterator(read_lines(), max_vocab, sample_rate=sample_rate, seed=seed)
+
     def encode(self, text: str) -> List[int]:
         """
         Преобразует строку в последовательность идентификаторов с применением BPE.
@@ -309,19 +660,50 @@ class BpeTokenizer(ByteTokenizer):
         List[int]
             Список идентификаторов с учётом частотных пар токенов, объединённых алгоритмом BPE.
         """
-        # Формируем исходный список номеров токенов для данного текста (изначально это байты в кодировке utf-8)
-        ids = list(text.encode('utf-8'))
-
-        # Последовательно применяем таблицу склеиваний в том порядке, в котором добавлялись токены в словарь
-        while len(ids) > 1:
-            cnt = count_pairs([ids])
-            pair = None
-            for p in self.merges:
-                if p in cnt.keys():
-                    pair = p
-                    break
-            if pair is None:
-                break
-            idx = self.merges[pair]
-            ids = merge(ids, pair, idx)
+        if self._regex is None:
+            # Формируем исходный список номеров токенов для данного текста (изначально это байты в кодировке utf-8)
+            ids = list(text.encode('utf-8'))
+            # Применяем склеивания в порядке их рангов (номер нового токена и есть ранг склеивания)
+            return apply_merges(ids, self.merges)
+
+        ids = []
+        for chunk in self._regex.findall(text):
+            ids.extend(self._encode_chunk(chunk.encode('utf-8')))
         return ids
+
+    def _encode_chunk(self, chunk: bytes) -> Tuple[int, ...]:
+        """Кодирует один кусок текста, используя LRU-кэш."""
+        ids = self._cache.get(chunk)
+        if ids is not None:
+            self._cache_hits += 1
+            self._cache.move_to_end(chunk)
+            return ids
+        self._cache_misses += 1
+        ids = tuple(apply_merges(list(chunk), self.merges))
+        if self.cache_size > 0:
+            self._cache[chunk] = ids
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return ids
+
+    def __getstate__(self):
+        # Кэш кодирования не передаётся в процессы encode_batch (и в pickle): каждый процесс заполняет свой
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        state['_cache_hits'] = state['_cache_misses'] = 0
+        return state
+
+    def _config(self) -> Dict[str, Any]:
+        return {'pattern': self.pattern, 'cache_size': self.cache_size}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        # Склеивания записываются в порядке рангов: номер нового токена восстанавливается по позиции в массиве
+        merges = sorted(self.merges.items(), key=lambda item: item[1])
+        arrays = super()._arrays()
+        arrays['merges'] = np.array([pair for pair, _ in merges], dtype=np.int32).reshape(-1, 2)
+        return arrays
+
+    def _load_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        super()._load_arrays(arrays)
+        self._merges = None
+        self._merges_array = arrays['merges']
@@ -1,16 +1,38 @@
+import math
+import random
+import time
+from contextlib import nullcontext
+import numpy as np
 import torch
 import torch.nn as nn
-from typing import List, Optional, Callable, Union
+import torch.nn.functional as F
+from typing import Any, Dict, List, Optional, Callable, Tuple, Union
 from torch import Tensor
-from torch.utils.data import DataLoader, Dataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, Dataset, Sampler
+from torch.utils.data.distributed import DistributedSampler
 from tqdm import tqdm
 from scripts.model import Model
+from scripts.checkpoint import CheckpointManager
+from scripts.collator import Batch, Collator
+from scripts.distributed import (
+    UnpaddedDistributedSampler, all_gather_object, all_reduce_sum, get_rank, get_world_size, is_distributed,
+    is_main_process
+)
+from scripts.monitor import StepTimer, write_jsonl
+from scripts.sampler import BucketBatchSampler, SkipBatchSampler, get_lengths
 
 
 class Trainer:
     """
     Класс для обучения и оценки модели.
 
+    Если группа процессов torch.distributed инициализирована (например, init_distributed при запуске через torchrun),
+    обучение идёт в режиме data parallel: модель оборачивается в DistributedDataParallel, обучающие данные делятся
+    между процессами DistributedSampler, градиенты усредняются all-reduce, а evaluate собирает потери со всех
+    процессов. train_batch_size - размер батча одного процесса, общий батч в world_size раз больше.
+    Логи, прогресс и чекпоинты пишет только процесс с номером 0.
+
     Параметры:
         model (Model): Модель, которую необходимо обучить.
         train_dataset (Union[Dataset, List[Tensor]]): Датасет для обучения.
@@ -18,10 +40,34 @@ class Trainer:
         n_epochs (int, по умолчанию 3): Количество эпох для обучения.
         lr (float, по умолчанию 1e-5): Скорость обучения.
         train_batch_size (int, по умолчанию 1): Размер батча для обучения.
-        eval_batch_size (int, по умолчанию 1): Размер батча для оценки.
+        eval_batch_size (Union[int, str], по умолчанию 1): Размер батча для оценки. Если 'auto', батчи оценки
+            собираются из примеров, отсортированных по длине, так, чтобы в батче с учётом паддинга было не больше
+            eval_max_tokens токенов. Батчи оценки больше одного примера дополняются паддингом, поэтому collator
+            должен возвращать Batch с маской (Collator(return_mask=True)); Collator без маски допускается, только
+            если его padding_value равен ignore_index, иначе паддинг попал бы в потери и число токенов (ValueError).
         eval_steps (Optional[int], по умолчанию None): Шаги между оценками.
-        collator (Optional[Callable[[List[List[int]]], Tensor]], по умолчанию None): Функция для подготовки батча.
+        collator (Optional[Callable[[List[List[int]]], Union[Tensor, Batch]]], по умолчанию None): Функция для подготовки батча.
+            Если она возвращает Batch (Collator(return_mask=True)), паддинговые позиции не учитываются в функции потерь.
         ignore_index (int, по умолчанию -100): Индекс для игнорирования в функции потерь.
+        eval_max_tokens (int, по умолчанию 65536): Ограничение на число токенов в батче оценки при eval_batch_size='auto'.
+        train_batch_sampler (Optional[Sampler[List[int]]], по умолчанию None): Семплер батчей для обучения
+            (например, BucketBatchSampler). Если задан, train_batch_size не используется.
+        bf16 (bool, по умолчанию False): Считать прямой проход в bfloat16 (torch.autocast на CPU). Веса,
+            градиенты и шаг оптимизатора остаются в fp32.
+        gradient_accumulation_steps (int, по умолчанию 1): Сколько батчей накапливать градиенты перед шагом
+            оптимизатора. Эффективный размер батча - train_batch_size * gradient_accumulation_steps.
+        max_grad_norm (Optional[float], по умолчанию None): Если задано, норма градиентов обрезается до этого значения.
+        logging_steps (int, по умолчанию 50): Через сколько шагов оптимизатора выводить средние потери
+            и статистику производительности (см. StepTimer).
+        log_file (Optional[str], по умолчанию None): JSONL-файл, в который дописываются записи log_history.
+        profile_steps (Optional[Tuple[int, int]], по умолчанию None): Пара (K, N): шаги оптимизатора с K-го
+            по (K + N - 1)-й включительно записываются профайлером torch.profiler (см. атрибут profiler).
+        profile_trace (Optional[str], по умолчанию None): Путь для трассировки профайлера в формате Chrome trace.
+        seed (int, по умолчанию 0): Зерно перемешивания обучающих данных; в эпоху epoch используется seed + epoch.
+            В распределённом режиме зерно DistributedSampler.
+        checkpoint_dir (Optional[str], по умолчанию None): Папка для чекпоинтов (см. CheckpointManager).
+        save_steps (Optional[int], по умолчанию None): Через сколько шагов оптимизатора сохранять чекпоинт.
+        keep_last (Optional[int], по умолчанию 3): Сколько последних чекпоинтов хранить.
 
     Атрибуты:
         model (Model): Модель, которая обучается.
@@ -30,17 +76,34 @@ class Trainer:
         train_loader (DataLoader): Загрузчик данных для обучения.
         eval_loader (DataLoader): Загрузчик данных для оценки.
         n_epochs (int): Количество эпох.
-        eval_steps (Optional[int]): Шаги между оценками.
+        eval_steps (Optional[int]): Шаги между оценками (в шагах оптимизатора).
+        log_history (List[Dict[str, Any]]): Записи с номером шага, эпохой, средними потерями, временем фаз шага
+            (ожидание данных, прямой и обратный проход, шаг оптимизатора), примерами и непаддинговыми токенами
+            в секунду за последние logging_steps шагов, текущей памятью процесса в конце окна (rss_mb) и пиковой
+            памятью за всё время работы процесса (peak_rss_mb), а также записи оценки (eval_loss).
+        profiler (Optional[torch.profiler.profile]): Профайлер после окна profile_steps (например, для key_averages()).
 
     Методы:
+        prepare_batch(batch: Union[Tensor, Batch]) -> Tuple[Tensor, Tensor]:
+            Готовит входы модели и целевые метки из батча.
+
         calc_loss(logits: Tensor, y: Tensor) -> Tensor:
             Вычисляет потери по логитам и целевым меткам.
 
-        train() -> None:
-            Запускает процесс обучения модели.
+        train(resume_from: Optional[str] = None) -> None:
+            Запускает процесс обучения модели (или продолжает его с чекпоинта).
+
+        state_dict() -> Dict[str, Any]:
+            Возвращает состояние обучения для чекпоинта.
+
+        load_state_dict(state: Dict[str, Any]) -> None:
+            Восстанавливает состояние обучения из чекпоинта.
 
         evaluate() -> float:
-            Оценивает модель на наборе данных для оценки и возвращает среднее значение потерь.
+            Оценивает модель на наборе данных для оценки и возвращает среднее по токенам значение потерь.
+
+        evaluate_metrics() -> Dict[str, float]:
+            Оценивает модель и возвращает потери, перплексию, число токенов и примеров.
 
     Пример использования:
     --------------
@@ -60,30 +123,122 @@ class Trainer:
             n_epochs: int = 3,
             lr: float = 1e-5,
             train_batch_size: int = 1,
-            eval_batch_size: int = 1,
+            eval_batch_size: Union[int, str] = 1,
             eval_steps: Optional[int] = None,
-            collator: Optional[Callable[[List[List[int]]], Tensor]] = None,
-            ignore_index: int = -100
+            collator: Optional[Callable[[List[List[int]]], Union[Tensor, Batch]]] = None,
+            ignore_index: int = -100,
+            train_batch_sampler: Optional[Sampler[List[int]]] = None,
+            eval_max_tokens: int = 65536,
+            bf16: bool = False,
+            gradient_accumulation_steps: int = 1,
+            max_grad_norm: Optional[float] = None,
+            logging_steps: int = 50,
+            log_file: Optional[str] = None,
+            profile_steps: Optional[Tuple[int, int]] = None,
+            profile_trace: Optional[str] = None,
+            seed: int = 0,
+            checkpoint_dir: Optional[str] = None,
+            save_steps: Optional[int] = None,
+            keep_last: Optional[int] = 3
     ):
         self.model = model
         self.loss_func = nn.CrossEntropyLoss(ignore_index=ignore_index)
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
-        self.train_loader = DataLoader(
-            train_dataset,
-            batch_size=train_batch_size,
-            shuffle=True,
-            drop_last=True,
-            collate_fn=collator
-        )
-        self.eval_loader = DataLoader(
-            eval_dataset,
-            batch_size=eval_batch_size,
-            shuffle=False,
-            drop_last=True,
-            collate_fn=collator
-        )
+        # Собственный генератор загрузчика: порядок батчей зависит только от seed и эпохи,
+        # а глобальный генератор torch (dropout) не расходуется на перемешивание
+        self.seed = seed
+        self.generator = torch.Generator()
+        self.distributed = is_distributed()
+        self.ddp_model = DistributedDataParallel(self.model) if self.distributed else self.model
+        if train_batch_sampler is not None:
+            if self.distributed:
+                raise ValueError('train_batch_sampler is not supported in distributed mode')
+            self.train_loader = DataLoader(
+                train_dataset,
+                batch_sampler=train_batch_sampler,
+                collate_fn=collator,
+                generator=self.generator
+            )
+        else:
+            self.train_loader = DataLoader(
+                train_dataset,
+                batch_size=train_batch_size,
+                shuffle=not self.distributed,
+                sampler=DistributedSampler(train_dataset, seed=seed, drop_last=True) if self.distributed else None,
+                drop_last=True,
+                collate_fn=collator,
+                generator=self.generator
+            )
+        if eval_batch_size != 'auto' and (not isinstance(eval_batch_size, int) or isinstance(eval_batch_size, bool)
+                                          or eval_batch_size < 1):
+            raise ValueError(f"eval_batch_size must be a positive int or 'auto', got {eval_batch_size!r}")
+        padded_eval = eval_batch_size == 'auto' or eval_batch_size > 1
+        if (padded_eval and isinstance(collator, Collator) and not collator.return_mask
+                and collator.padding_value != ignore_index):
+            raise ValueError(
+                'padded eval batches need Collator(return_mask=True) or ignore_index equal to the padding value'
+            )
+        # Значение паддинга батчей-тензоров (Collator без маски): такие позиции не входят в число токенов
+        self._pad_id = collator.padding_value if isinstance(collator, Collator) and not collator.return_mask else None
+        eval_sampler = UnpaddedDistributedSampler(eval_dataset) if self.distributed else None
+        if eval_batch_size == 'auto':
+            # Индексы своей части данных (всех данных без torch.distributed), упакованные в батчи по длине
+            indices = np.fromiter(eval_sampler, dtype=np.int64) if eval_sampler is not None else np.arange(len(eval_dataset))
+            lengths = get_lengths(eval_dataset)[indices]
+            batches = BucketBatchSampler(lengths, max_tokens=eval_max_tokens, boundaries=[], shuffle=False)
+            self.eval_loader = DataLoader(
+                eval_dataset,
+                batch_sampler=[indices[batch].tolist() for batch in batches],
+                collate_fn=collator
+            )
+        else:
+            self.eval_loader = DataLoader(
+                eval_dataset,
+                batch_size=eval_batch_size,
+                shuffle=False,
+                sampler=eval_sampler,
+                collate_fn=collator
+            )
         self.n_epochs = n_epochs
         self.eval_steps = eval_steps
+        self.bf16 = bf16
+        self.gradient_accumulation_steps = gradient_accumulation_steps
+        self.max_grad_norm = max_grad_norm
+        self.logging_steps = logging_steps
+        self.log_history: List[Dict[str, Any]] = []
+        self.log_file = log_file
+        self.profile_steps = profile_steps
+        self.profile_trace = profile_trace
+        self.profiler: Optional[torch.profiler.profile] = None
+        self._profiling = False
+        # Сохранение чекпоинта - коллективная операция (состояния генераторов собираются со всех процессов),
+        # поэтому save_steps известен всем процессам, а файлы пишет только главный
+        self.save_steps = save_steps if checkpoint_dir is not None else None
+        self.checkpoints = (
+            CheckpointManager(checkpoint_dir, keep_last) if checkpoint_dir is not None and is_main_process() else None
+        )
+        # Позиция обучения: число шагов оптимизатора, эпоха и число обработанных батчей в ней
+        self.iterations = 0
+        self.epoch = 0
+        self.epoch_step = 0
+
+    def prepare_batch(self, batch: Union[Tensor, Batch]) -> Tuple[Tensor, Tensor]:
+        """
+        Готовит входы (текущие токены) и выходы (следующие токены) из батча.
+
+        Параметры:
+            batch (Union[Tensor, Batch]): Тензор номеров токенов или Batch с маской паддинга.
+
+        Возвращает:
+            Tuple[Tensor, Tensor]: Входы модели и целевые метки; метки паддинговых позиций заменены на ignore_index.
+        """
+        if isinstance(batch, Batch):
+            ids = batch.input_ids
+            y = ids[:, 1:].masked_fill(~batch.attention_mask[:, 1:], self.loss_func.ignore_index)
+        else:
+            ids = batch
+            y = ids[:, 1:]
+        return ids[:, :-1], y
 
     def calc_loss(self, logits: Tensor, y: Tensor) -> Tensor:
         """
@@ -100,48 +255,272 @@ class Trainer:
         y = y.reshape(-1)
         return self.loss_func(logits, y)
 
-    def train(self) -> None:
+    def autocast(self) -> torch.autocast:
+        """Возвращает контекст autocast для прямого прохода (выключенный, если bf16=False)."""
+        return torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.bf16)
+
+    def log(self, record: Dict[str, Any]) -> None:
+        """Добавляет запись в log_history и, если задан log_file, дописывает её в JSONL-файл (только процесс 0)."""
+        self.log_history.append(record)
+        if self.log_file is not None and is_main_process():
+            write_jsonl(self.log_file, record)
+
+    def _update_profiler(self, iterations: int, stop: bool = False) -> None:
+        """
+        Запускает и останавливает профайлер на границах окна profile_steps.
+
+        Параметры:
+            iterations (int): Число сделанных шагов оптимизатора.
+            stop (bool): Остановить профайлер, даже если окно ещё не закончилось.
+        """
+        if self.profile_steps is None:
+            return
+        start, n_steps = self.profile_steps
+        if iterations == start - 1 and not stop:
+            self.profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self.profiler.start()
+            self._profiling = True
+        elif self._profiling and (stop or iterations == start + n_steps - 1):
+            self.profiler.stop()
+            self._profiling = False
+            if self.profile_trace is not None:
+                self.profiler.export_chrome_trace(self.profile_trace)
+
+    def state_dict(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние обучения: веса модели, состояние оптимизатора, позицию в обучении
+        (шаг оптимизатора, эпоха, число обработанных батчей эпохи), состояния генераторов случайных чисел
+        и log_history. Чекпоинты сохраняются только между шагами оптимизатора, когда градиенты обнулены.
+
+        Состояния генераторов хранятся списком по номерам процессов: у каждого процесса свои маски dropout.
+        В распределённом режиме метод должны вызвать все процессы.
+        """
+        rng = {'torch': torch.get_rng_state(), 'numpy': np.random.get_state(), 'python': random.getstate()}
+        return {
+            'model': self.model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'iterations': self.iterations,
+            'epoch': self.epoch,
+            'epoch_step': self.epoch_step,
+            'rng': all_gather_object(rng),
+            'log_history': self.log_history,
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        """Восстанавливает состояние, возвращённое state_dict (например, загруженное из чекпоинта)."""
+        self.model.load_state_dict(state['model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.iterations = state['iterations']
+        self.epoch = state['epoch']
+        self.epoch_step = state['epoch_step']
+        rank = get_rank()
+        # Чекпоинты прежнего формата хранят состояние генераторов одного процесса
+        rng_states = state['rng'] if isinstance(state['rng'], list) else [state['rng']]
+        if rank < len(rng_states):
+            rng = rng_states[rank]
+            torch.set_rng_state(rng['torch'])
+            np.random.set_state(rng['numpy'])
+            random.setstate(rng['python'])
+        else:
+            # Процессов больше, чем при сохранении: у новых процессов генераторы зависят от seed и номера процесса
+            torch.manual_seed(self.seed + rank)
+            np.random.seed(self.seed + rank)
+            random.seed(self.seed + rank)
+        self.log_history = list(state['log_history'])
+
+    def _set_epoch(self, epoch: int) -> int:
         """
-        Запускает процесс обучения модели. После каждой эпохи выводит значение потерь.
-        Если задан eval_steps, проводит оценку через каждые eval_steps итераций.
+        Готовит семплеры и генератор загрузчика к эпохе epoch.
+
+        Возвращает:
+            int: Число батчей в эпохе epoch (у BucketBatchSampler с max_tokens оно меняется от эпохи к эпохе).
+        """
+        self.generator.manual_seed(self.seed + epoch)
+        # Семплеры с детерминированным перемешиванием (BucketBatchSampler, DistributedSampler) перемешивают данные заново каждую эпоху
+        for sampler in (self.train_loader.batch_sampler, self.train_loader.sampler):
+            if hasattr(sampler, 'set_epoch'):
+                sampler.set_epoch(epoch)
+        return len(self.train_loader)
+
+    def _epoch_loader(self, epoch: int, skip: int) -> DataLoader:
+        """Готовит загрузчик к эпохе epoch, пропуская первые skip батчей без загрузки их данных."""
+        self._set_epoch(epoch)
+        if skip == 0:
+            return self.train_loader
+        loader = self.train_loader
+        return DataLoader(
+            loader.dataset,
+            batch_sampler=SkipBatchSampler(loader.batch_sampler, skip),
+            collate_fn=loader.collate_fn,
+            num_workers=loader.num_workers,
+            generator=self.generator
+        )
+
+    def train(self, resume_from: Optional[str] = None) -> None:
+        """
+        Запускает процесс обучения модели. Каждые logging_steps шагов оптимизатора выводит средние потери
+        и добавляет в log_history запись со статистикой производительности (шаги неполного последнего окна
+        записываются после обучения). Если задан eval_steps, проводит оценку через каждые eval_steps шагов оптимизатора.
+
+        Если задан checkpoint_dir и save_steps, каждые save_steps шагов оптимизатора сохраняется чекпоинт
+        (запись идёт в фоновом потоке). С resume_from обучение продолжается с чекпоинта ровно с того места,
+        где он был сохранён, включая позицию внутри эпохи: результат совпадает с обучением без перерыва.
+
+        Параметры:
+            resume_from (Optional[str]): Путь к чекпоинту, с которого нужно продолжить обучение.
+
+        Потери копятся в тензоре без синхронизации на каждом шаге (loss.item() вызывается только при выводе).
+        При накоплении градиентов потери каждого батча делятся на число батчей в группе, поэтому шаг оптимизатора
+        совпадает с шагом на объединённом батче (для батчей одинакового размера без паддинга). Последняя группа эпохи
+        может быть неполной.
         """
-        progress_bar = tqdm(total=self.n_epochs * len(self.train_loader))
-        iterations = 0
-        for _ in range(self.n_epochs):
-            for ids in self.train_loader:
-                iterations += 1
+        if resume_from is not None:
+            self.load_state_dict(CheckpointManager.load(resume_from))
+        # Число батчей каждой эпохи (позиция в эпохе и её доля в логах считаются по длине своей эпохи)
+        epoch_lengths = [self._set_epoch(epoch) for epoch in range(self.n_epochs)]
+        start_epoch, start_step = self.epoch, self.epoch_step
+        if start_epoch < self.n_epochs and start_step >= epoch_lengths[start_epoch]:
+            start_epoch, start_step = start_epoch + 1, 0
+        accumulation = self.gradient_accumulation_steps
+        progress_bar = tqdm(
+            total=sum(epoch_lengths), initial=sum(epoch_lengths[:start_epoch]) + start_step,
+            disable=not is_main_process()
+        )
+        running_loss = torch.zeros(())
+        running_batches = 0
+        timer = StepTimer()
+        self._update_profiler(self.iterations)
+        self.optimizer.zero_grad()
+        for epoch in range(start_epoch, self.n_epochs):
+            skip = start_step if epoch == start_epoch else 0
+            # Загрузчик своей эпохи: число батчей может меняться от эпохи к эпохе (BucketBatchSampler с max_tokens)
+            loader = self._epoch_loader(epoch, skip)
+            epoch_batches = epoch_lengths[epoch]
+            for step, batch in enumerate(timer.iterate(loader), start=skip):
                 self.model.train()
-                # Готовим входы (текущие токены) и выходы (следующие токены)
-                x = ids[:, :-1] 
-                y = ids[:, 1:]
-                # Получаем логиты и считаем лосс
-                logits, _ = self.model(x)
-                loss = self.calc_loss(logits, y)
+                with timer.phase('forward'):
+                    # Готовим входы (текущие токены) и выходы (следующие токены)
+                    x, y = self.prepare_batch(batch)
+                    # Получаем логиты и считаем лосс
+                    sync = (step + 1) % accumulation == 0 or step + 1 == epoch_batches
+                    # Внутри группы накопления градиенты не синхронизируются между процессами: all-reduce
+                    # выполняется один раз, на обратном проходе последнего батча группы
+                    no_sync = self.ddp_model.no_sync() if self.distributed and not sync else nullcontext()
+                    with self.autocast(), no_sync:
+                        logits, _ = self.ddp_model(x)
+                    loss = self.calc_loss(logits.float(), y)
+                with timer.phase('backward'):
+                    group_size = min(accumulation, epoch_batches - (step - step % accumulation))
+                    (loss / group_size).backward()
+                running_loss += loss.detach()
+                running_batches += 1
+                timer.samples += x.size(0)
+                tokens = y != self.loss_func.ignore_index
+                if self._pad_id is not None:
+                    tokens &= y != self._pad_id
+                timer.tokens += tokens.sum()
                 progress_bar.update()
-                progress_bar.set_description(f'epoch={iterations / len(self.train_loader)}, loss={loss.item()}')
-                self.optimizer.zero_grad()
-                loss.backward()
-                self.optimizer.step()
-                if self.eval_steps is not None and iterations % self.eval_steps == 0:
-                    print(f'epoch={iterations / len(self.train_loader)}, eval_loss={self.evaluate()}')
+                if not sync:
+                    continue
 
-    def evaluate(self) -> float:
+                with timer.phase('optimizer'):
+                    if self.max_grad_norm is not None:
+                        nn.utils.clip_grad_norm_(self.model.parameters(), self.max_grad_norm)
+                    self.optimizer.step()
+                    self.optimizer.zero_grad()
+                self.iterations += 1
+                self.epoch, self.epoch_step = epoch, step + 1
+                timer.steps += 1
+                self._update_profiler(self.iterations)
+                if self.iterations % self.logging_steps == 0:
+                    self._log_train(epoch + (step + 1) / epoch_batches, running_loss, running_batches, timer, progress_bar)
+                    running_loss.zero_()
+                    running_batches = 0
+                    timer.reset()
+                if self.eval_steps is not None and self.iterations % self.eval_steps == 0:
+                    eval_start = time.perf_counter()
+                    eval_loss = self.evaluate()
+                    self.log({'step': self.iterations, 'epoch': epoch + (step + 1) / epoch_batches, 'eval_loss': eval_loss})
+                    if is_main_process():
+                        print(f'epoch={epoch + (step + 1) / epoch_batches}, eval_loss={eval_loss}')
+                    # Время оценки не входит в статистику производительности обучения
+                    timer.start += time.perf_counter() - eval_start
+                # Чекпоинт сохраняется после оценки, чтобы состояние генераторов случайных чисел учитывало и её
+                if self.save_steps is not None and self.iterations % self.save_steps == 0:
+                    state = self.state_dict()
+                    if self.checkpoints is not None:
+                        self.checkpoints.save(state, self.iterations)
+        # Шаги после последней записи (число шагов не кратно logging_steps) тоже попадают в лог
+        if timer.steps > 0:
+            self._log_train(self.epoch + self.epoch_step / epoch_lengths[self.epoch], running_loss, running_batches,
+                            timer, progress_bar)
+        if self.checkpoints is not None:
+            self.checkpoints.wait()
+        # Обучение закончилось раньше конца окна профилирования
+        self._update_profiler(self.iterations, stop=True)
+
+    def _log_train(self, epoch: float, running_loss: torch.Tensor, running_batches: int, timer: StepTimer,
+                   progress_bar: tqdm) -> None:
+        """
+        Добавляет в log_history запись о последнем окне обучения: средние потери и статистику производительности.
+
+        Параметры:
+            epoch (float): Номер эпохи с долей пройденных батчей.
+            running_loss (torch.Tensor): Сумма потерь батчей окна.
+            running_batches (int): Число батчей окна.
+            timer (StepTimer): Статистика производительности окна.
+            progress_bar (tqdm): Прогресс-бар, в описание которого выводятся потери.
+        """
+        # Средние потери по всем процессам: одна синхронизация на окно
+        loss_sum = all_reduce_sum(torch.stack([running_loss, torch.tensor(float(running_batches))]))
+        record = {'step': self.iterations, 'epoch': epoch, 'loss': (loss_sum[0] / loss_sum[1]).item(),
+                  'world_size': get_world_size()}
+        record.update(timer.summary())
+        self.log(record)
+        progress_bar.set_description(
+            f'epoch={record["epoch"]:.2f}, loss={record["loss"]:.4f}, tokens/s={record["tokens_per_sec"]:.0f}'
+        )
+
+    def evaluate_metrics(self) -> Dict[str, float]:
         """
-        Оценивает модель на наборе данных для оценки, вычисляя среднее значение потерь.
+        Оценивает модель на всех примерах набора данных для оценки.
+
+        Потери суммируются по всем непаддинговым токенам и делятся на их число, поэтому результат не зависит
+        от размера батчей оценки, а перплексия считается точно: exp(сумма потерь / число токенов). Суммы копятся
+        в тензоре без синхронизации на каждом батче. В распределённом режиме каждый процесс оценивает свою часть
+        данных, а суммы складываются по всем процессам.
 
         Возвращает:
-            float: Среднее значение потерь на наборе данных для оценки.
+            Dict[str, float]: Средние по токенам потери (loss), перплексия (perplexity), число токенов (tokens)
+            и примеров (samples).
         """
         self.model.eval()
-        total_loss = 0.0
-        for ids in self.eval_loader:
-            # Готовим входы (текущие номера токенов) и выходы (следующие номера токенов)
-            x = ids[:, :-1] 
-            y = ids[:, 1:]
-            with (torch.no_grad()):
-                # Получаем логиты и считаем лосс
+        # Сумма потерь, число токенов и число примеров
+        totals = torch.zeros(3, dtype=torch.float64)
+        with torch.inference_mode():
+            for batch in self.eval_loader:
+                # Готовим входы (текущие номера токенов) и выходы (следующие номера токенов)
+                x, y = self.prepare_batch(batch)
+                # Получаем логиты и считаем сумму потерь по токенам
                 logits, _ = self.model(x)
-                loss = self.calc_loss(logits, y)
-                total_loss += loss.item() / len(self.eval_loader)
-        return total_loss
+                loss = F.cross_entropy(
+                    logits.reshape(-1, logits.size(-1)), y.reshape(-1),
+                    ignore_index=self.loss_func.ignore_index, reduction='sum'
+                )
+                totals[0] += loss
+                totals[1] += (y != self.loss_func.ignore_index).sum()
+                totals[2] += x.size(0)
+        all_reduce_sum(totals)
+        loss_sum, n_tokens, n_samples = totals.tolist()
+        loss = loss_sum / n_tokens if n_tokens > 0 else float('nan')
+        perplexity = math.exp(loss) if loss < 700 else float('inf')
+        return {'loss': loss, 'perplexity': perplexity, 'tokens': int(n_tokens), 'samples': int(n_samples)}
 
+    def evaluate(self) -> float:
+        """
+        Оценивает модель на наборе данных для оценки (см. evaluate_metrics).
+
+        Возвращает:
+            float: Среднее по токенам значение потерь на наборе данных для оценки.
+        """
+        return self.evaluate_metrics()['loss']
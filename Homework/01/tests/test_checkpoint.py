@@ -0,0 +1,35 @@
+import os
+import tempfile
+import torch
+from unittest import TestCase
+from scripts.checkpoint import CheckpointManager
+
+
+class TestCheckpointManager(TestCase):
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = CheckpointManager(tmp, keep_last=2)
+            self.assertIsNone(manager.latest())
+            weights = torch.zeros(4)
+            for step in range(1, 5):
+                weights += 1
+                manager.save({'weights': weights, 'step': step}, step)
+            # Снимок делается при вызове save, поэтому дальнейшие изменения тензора не попадают в чекпоинт
+            weights += 100
+            manager.wait()
+
+            self.assertEqual([os.path.basename(path) for path in manager.checkpoints()],
+                             ['checkpoint-00000003.pt', 'checkpoint-00000004.pt'])
+            self.assertEqual(sorted(os.listdir(tmp)), ['checkpoint-00000003.pt', 'checkpoint-00000004.pt'])
+            state = manager.load(manager.latest())
+            self.assertEqual(state['step'], 4)
+            self.assertTrue(torch.equal(state['weights'], torch.full((4,), 4.0)))
+
+    def test_error(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = CheckpointManager(tmp)
+            manager.save({'fn': lambda: None}, 1)
+            with self.assertRaises(Exception):
+                manager.wait()
+            manager.wait()
+            self.assertEqual(os.listdir(tmp), [])
@@ -1,6 +1,7 @@
+import numpy as np
 import torch
 from unittest import TestCase
-from scripts.collator import Collator
+from scripts.collator import Batch, Collator
 
 
 class TestCollator(TestCase):
@@ -12,3 +13,14 @@ class TestCollator(TestCase):
         actual = collator(data)
         self.assertEqual(expected.shape, actual.shape)
         self.assertTrue(torch.all(expected == actual))
+
+    def test_collator_mask(self):
+        data = [np.array([1, 2], dtype=np.uint16), np.array([3, 4, 5], dtype=np.uint32), [1]]
+        collator = Collator(7, pin_memory=True, return_mask=True)
+
+        batch = collator(data)
+        self.assertIsInstance(batch, Batch)
+        self.assertEqual(batch.input_ids.dtype, torch.long)
+        self.assertTrue(torch.equal(batch.input_ids, torch.tensor([[1, 2, 7], [3, 4, 5], [1, 7, 7]])))
+        self.assertTrue(torch.equal(batch.attention_mask, batch.input_ids != 7))
+        self.assertEqual(batch.lengths.tolist(), [2, 3, 1])
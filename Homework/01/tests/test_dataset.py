@@ -1,6 +1,13 @@
+import os
+import pickle
+import tempfile
 from unittest import TestCase
-from scripts.tokenizer import ByteTokenizer
-from scripts.dataset import MyDataset
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+from scripts.tokenizer import ByteTokenizer, BpeTokenizer
+from scripts.dataset import MyDataset, ShardedDataset, PackedDataset, write_token_shards
+from scripts.collator import Collator
 
 
 class TestDataset(TestCase):
@@ -35,3 +42,132 @@ class TestDataset(TestCase):
             dataset[1],
             [257, 97, 98]
         )
+
+    def test_dataset_num_workers(self):
+        data = ['aaaaa', 'abababc', 'Мама мыла раму'] * 20
+        tokenizer = BpeTokenizer()
+        tokenizer.train(data, max_vocab=300)
+
+        serial = MyDataset(data, tokenizer)
+        parallel = MyDataset(data, tokenizer, num_workers=2)
+        self.assertEqual(parallel.data, serial.data)
+
+    def test_sharded_dataset(self):
+        data = ['aaaaa', 'abababc', '', 'Мама мыла раму'] * 5
+        tokenizer = ByteTokenizer()
+        expected = MyDataset(data, tokenizer)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            write_token_shards(iter(data), tokenizer, tmp, shard_size=32, batch_size=3)
+            dataset = ShardedDataset(tmp)
+            self.assertGreater(dataset.n_shards, 1)
+            self.assertEqual(dataset.dtype, np.uint16)
+            self.assertEqual(len(dataset), len(expected))
+            for idx in range(len(dataset)):
+                self.assertIsInstance(dataset[idx], np.memmap)
+                self.assertEqual(dataset[idx].tolist(), expected[idx])
+
+            dataset = ShardedDataset(tmp, max_length=3)
+            self.assertEqual(dataset[0].tolist(), [257, 97, 97])
+            self.assertEqual(dataset.lengths.tolist(), [3, 3, 2, 3] * 5)
+            self.assertEqual(pickle.loads(pickle.dumps(dataset))[1].tolist(), [257, 97, 98])
+
+            loader = DataLoader(dataset, batch_size=4, num_workers=2, collate_fn=Collator(tokenizer.pad_token_id))
+            batch = next(iter(loader))
+            self.assertTrue(torch.equal(batch, torch.tensor([[257, 97, 97], [257, 97, 98], [257, 258, 256], [257, 208, 156]])))
+
+    def test_write_token_shards_failure(self):
+        def texts():
+            yield from ['aaaaa', 'abababc'] * 10
+            raise RuntimeError('broken input')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(RuntimeError):
+                write_token_shards(texts(), ByteTokenizer(), tmp, shard_size=32, batch_size=3)
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_write_token_shards_reused_dir(self):
+        def broken():
+            yield 'ab'
+            raise RuntimeError('broken input')
+
+        tokenizer = ByteTokenizer()
+        with tempfile.TemporaryDirectory() as tmp:
+            write_token_shards(['aaaaa', 'abababc'] * 10, tokenizer, tmp, shard_size=32)
+            with open(os.path.join(tmp, 'notes.txt'), 'w') as f:
+                f.write('not a shard')
+            write_token_shards(['ab'], tokenizer, tmp, shard_size=32)
+            # Шарды прошлой записи с большими номерами удалены, чужие файлы остались
+            self.assertEqual(sorted(os.listdir(tmp)), ['index.bin', 'notes.txt', 'shard_00000.bin'])
+            self.assertEqual(ShardedDataset(tmp)[0].tolist(), [257, 97, 98, 258])
+
+            with self.assertRaises(RuntimeError):
+                write_token_shards(broken(), tokenizer, tmp)
+            # Старый индекс тоже удалён: он ссылался бы на удалённые шарды
+            self.assertEqual(os.listdir(tmp), ['notes.txt'])
+
+    def test_packed_dataset(self):
+        data = ['aaaaa', 'abababc', 'Мама']
+        tokenizer = ByteTokenizer()
+        docs = MyDataset(data, tokenizer)
+        stream = sum(docs.data, [])
+
+        dataset = PackedDataset(docs, block_size=5)
+        self.assertEqual(len(dataset), (len(stream) - 1) // 5)
+        self.assertEqual(dataset.utilization, 1.0)
+        for idx in range(len(dataset)):
+            self.assertEqual(dataset[idx].tolist(), stream[idx * 5:idx * 5 + 6])
+
+        batch = Collator(tokenizer.pad_token_id)([dataset[0], dataset[1]])
+        self.assertEqual(batch.shape, (2, 6))
+        self.assertFalse(torch.any(batch == tokenizer.pad_token_id))
+        self.assertEqual(batch[0, -1], batch[1, 0])
+
+        dataset = PackedDataset(docs, block_size=6, drop_last=False)
+        self.assertEqual(len(dataset), 5)
+        self.assertEqual(dataset[4].tolist(), stream[24:])
+        self.assertAlmostEqual(dataset.utilization, (len(stream) - 1) / 30)
+
+    def test_packed_dataset_is_lazy(self):
+        data = ['aaaaa', 'abababc', '', 'Мама мыла раму'] * 5
+        tokenizer = ByteTokenizer()
+        docs = MyDataset(data, tokenizer)
+        stream = sum(docs.data, [])
+        expected = PackedDataset(docs, block_size=7, drop_last=False)
+        self.assertEqual([expected[idx].tolist() for idx in range(len(expected))],
+                         [stream[start:start + 8] for start in range(0, len(stream) - 1, 7)])
+        with self.assertRaises(IndexError):
+            expected[len(expected)]
+
+        class CountingDataset(MyDataset):
+            calls = 0
+
+            def __getitem__(self, idx):
+                CountingDataset.calls += 1
+                return super().__getitem__(idx)
+
+        # Документы не читаются при создании, блок читает только задетые им документы
+        counting = PackedDataset(CountingDataset(data, tokenizer), block_size=7)
+        self.assertEqual(CountingDataset.calls, 0)
+        self.assertEqual(counting[0].tolist(), expected[0].tolist())
+        # Первый документ занимает 7 токенов, последний токен блока - bos второго документа
+        self.assertEqual(CountingDataset.calls, 2)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            write_token_shards(iter(data), tokenizer, tmp, shard_size=32, batch_size=3)
+            sharded = ShardedDataset(tmp)
+            packed = PackedDataset(sharded, block_size=7, drop_last=False)
+            self.assertEqual(len(packed), len(expected))
+            in_shard = 0
+            for idx in range(len(packed)):
+                self.assertEqual(packed[idx].tolist(), expected[idx].tolist())
+                if isinstance(packed[idx], np.memmap):
+                    in_shard += 1
+            # Блоки внутри одного шарда - срезы шарда без копирования, остальные склеиваются из двух шардов
+            self.assertGreater(in_shard, 0)
+            self.assertLess(in_shard, len(packed))
+            self.assertEqual(pickle.loads(pickle.dumps(packed))[3].tolist(), expected[3].tolist())
+
+            truncated = PackedDataset(ShardedDataset(tmp, max_length=4), block_size=5)
+            truncated_stream = sum((ids[:4] for ids in docs.data), [])
+            self.assertEqual(truncated[2].tolist(), truncated_stream[10:16])
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from unittest import TestCase
+from scripts.model import Model
+from scripts.trainer import Trainer
+
+
+def run_worker(rank, world_size, tmp, batch_size):
+    dist.init_process_group(
+        'gloo', init_method=f'file://{os.path.join(tmp, f"init_{world_size}")}', rank=rank, world_size=world_size
+    )
+    try:
+        torch.manual_seed(0)
+        train_dataset = [torch.randint(0, 6, (8,), generator=torch.Generator().manual_seed(i)) for i in range(16)]
+        eval_dataset = train_dataset[:7]
+        model = Model(vocab_size=6, emb_size=8, num_layers=1, hidden_size=16)
+        trainer = Trainer(
+            model=model, train_dataset=train_dataset, eval_dataset=eval_dataset, n_epochs=2, lr=1e-2,
+            train_batch_size=batch_size, gradient_accumulation_steps=2, logging_steps=1
+        )
+        trainer.train()
+        if rank == 0:
+            torch.save(
+                {'model': model.state_dict(), 'eval_loss': trainer.evaluate(), 'log_history': trainer.log_history},
+                os.path.join(tmp, f'result_{world_size}.pt')
+            )
+        else:
+            trainer.evaluate()
+    finally:
+        dist.destroy_process_group()
+
+
+def run_resume_worker(rank, world_size, tmp, name, resume_from):
+    dist.init_process_group(
+        'gloo', init_method=f'file://{os.path.join(tmp, f"init_{name}")}', rank=rank, world_size=world_size
+    )
+    try:
+        torch.manual_seed(0)
+        dataset = [torch.randint(0, 6, (8,), generator=torch.Generator().manual_seed(i)) for i in range(16)]
+        model = Model(vocab_size=6, emb_size=8, num_layers=2, hidden_size=16, dropout=0.5)
+        # Разные генераторы процессов - разные маски dropout; после продолжения они должны остаться разными
+        torch.manual_seed(rank)
+        trainer = Trainer(
+            model=model, train_dataset=dataset, eval_dataset=dataset, n_epochs=2, lr=1e-2, train_batch_size=2,
+            checkpoint_dir=os.path.join(tmp, name), save_steps=1, keep_last=None
+        )
+        trainer.train(resume_from=resume_from)
+        if rank == 0:
+            torch.save(model.state_dict(), os.path.join(tmp, f'{name}.pt'))
+    finally:
+        dist.destroy_process_group()
+
+
+class TestDistributed(TestCase):
+    def test_data_parallel(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Общий батч одинаков: 4 примера на одном процессе и по 2 на каждом из двух
+            mp.spawn(run_worker, args=(1, tmp, 4), nprocs=1)
+            mp.spawn(run_worker, args=(2, tmp, 2), nprocs=2)
+            single = torch.load(os.path.join(tmp, 'result_1.pt'))
+            parallel = torch.load(os.path.join(tmp, 'result_2.pt'))
+
+        for name, value in single['model'].items():
+            self.assertTrue(torch.allclose(value, parallel['model'][name], atol=1e-5), name)
+        self.assertAlmostEqual(single['eval_loss'], parallel['eval_loss'], places=5)
+        self.assertEqual(len(single['log_history']), len(parallel['log_history']))
+        for a, b in zip(single['log_history'], parallel['log_history']):
+            self.assertAlmostEqual(a['loss'], b['loss'], places=5)
+        self.assertEqual(parallel['log_history'][0]['world_size'], 2)
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            mp.spawn(run_resume_worker, args=(2, tmp, 'full', None), nprocs=2)
+            # 4 шага оптимизатора за эпоху: чекпоинт посередине первой эпохи
+            checkpoint = sorted(os.listdir(os.path.join(tmp, 'full')))[1]
+            mp.spawn(run_resume_worker, args=(2, tmp, 'resumed', os.path.join(tmp, 'full', checkpoint)), nprocs=2)
+            full = torch.load(os.path.join(tmp, 'full.pt'))
+            resumed = torch.load(os.path.join(tmp, 'resumed.pt'))
+
+        for name, value in full.items():
+            self.assertTrue(torch.equal(value, resumed[name]), name)
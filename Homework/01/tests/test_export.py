@@ -0,0 +1,57 @@
+import os
+import tempfile
+import torch
+from unittest import TestCase
+from scripts.export import export_model, load_exported, perplexity
+from scripts.generation import beam_search, generate, generate_batch
+from scripts.model import Model
+from scripts.prompt_cache import PromptCache
+from scripts.tokenizer import ByteTokenizer
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tokenizer = ByteTokenizer()
+        self.model = Model(self.tokenizer.get_vocab_size(), emb_size=16, hidden_size=64, num_layers=2).eval()
+        self.x = torch.randint(0, self.tokenizer.get_vocab_size(), (3, 12))
+
+    def test_torchscript(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'model.pt')
+            exported = export_model(self.model, path=path)
+            loaded = load_exported(path)
+        with torch.no_grad():
+            expected, (h, c) = self.model(self.x)
+            for module in [exported, loaded]:
+                logits, (h_n, c_n) = module(self.x)
+                self.assertTrue(torch.allclose(logits, expected, atol=1e-5))
+                self.assertTrue(torch.allclose(h_n, h, atol=1e-5) and torch.allclose(c_n, c, atol=1e-5))
+
+        greedy = generate(self.model, self.tokenizer, temperature=0, max_length=32, prompt='abc')
+        self.assertEqual(generate(loaded, self.tokenizer, temperature=0, max_length=32, prompt='abc'), greedy)
+        self.assertEqual(
+            generate_batch(loaded, self.tokenizer, num_samples=2, temperature=0, max_length=32, prompt='abc'),
+            [greedy] * 2
+        )
+        self.assertEqual(
+            beam_search(exported, self.tokenizer, num_beams=1, max_length=32, prompt='abc',
+                        prompt_cache=PromptCache(exported)),
+            [greedy]
+        )
+
+    def test_quantized(self):
+        quantized = export_model(self.model, quantize=True)
+        with torch.no_grad():
+            expected, _ = self.model(self.x)
+            logits, _ = quantized(self.x)
+        self.assertEqual(logits.shape, expected.shape)
+        self.assertLess((logits - expected).abs().max().item(), 0.1)
+        # Исходная модель не квантуется
+        self.assertIsInstance(self.model.lstm, torch.nn.LSTM)
+
+        texts = [[self.tokenizer.bos_token_id] + self.tokenizer.encode(text) + [self.tokenizer.eos_token_id]
+                 for text in ['Привет, мир!', 'hello', 'abc abc abc']]
+        fp32, int8 = perplexity(self.model, texts), perplexity(quantized, texts)
+        self.assertLess(abs(int8 - fp32) / fp32, 0.01)
+        self.assertTrue(generate(quantized, self.tokenizer, temperature=0, max_length=8) is not None)
@@ -1,7 +1,9 @@
+import numpy as np
+import torch
 from unittest import TestCase
 from scripts.model import Model
 from scripts.tokenizer import ByteTokenizer
-from scripts.generation import generate
+from scripts.generation import beam_search, generate, generate_batch, stream_generate
 
 
 class TestGeneration(TestCase):
@@ -14,3 +16,129 @@ class TestGeneration(TestCase):
 
         random_gens = [generate(model, tokenizer, temperature=50, max_length=32) for _ in range(10)]
         self.assertTrue(len(set(random_gens)) > 1)
+
+    def test_generate_batch(self):
+        tokenizer = ByteTokenizer()
+        model = Model(tokenizer.get_vocab_size(), emb_size=8, hidden_size=32)
+
+        greedy = generate(model, tokenizer, temperature=0, max_length=32)
+        greedy_gens = generate_batch(model, tokenizer, num_samples=5, temperature=0, max_length=32)
+        self.assertEqual(greedy_gens, [greedy] * 5)
+
+        gens = generate_batch(
+            model, tokenizer, num_samples=6, temperature=[0, 0, 50, 50, 50, 50], top_k=[None, 1, None, 1, 300, 5],
+            max_length=32
+        )
+        self.assertEqual(len(gens), 6)
+        # top_k=1 эквивалентно жадному выбору при любой температуре
+        self.assertEqual(gens[:2], [greedy, greedy])
+        self.assertEqual(gens[3], greedy)
+
+        # Значения для каждой последовательности можно передать тензором или np.ndarray
+        for temperature, top_k in [(torch.tensor([0.0, 50.0]), torch.tensor([0, 1])), (np.array([0, 50]), np.array([0, 1]))]:
+            self.assertEqual(
+                generate_batch(model, tokenizer, num_samples=2, temperature=temperature, top_k=top_k, max_length=32),
+                [greedy, greedy]
+            )
+        with self.assertRaises(ValueError):
+            generate_batch(model, tokenizer, num_samples=3, temperature=[1.0, 1.0], max_length=32)
+        self.assertTrue(len(set(generate_batch(model, tokenizer, num_samples=10, temperature=50, max_length=32))) > 1)
+
+    def test_generate_generator(self):
+        tokenizer = ByteTokenizer()
+        model = Model(tokenizer.get_vocab_size(), emb_size=8, hidden_size=32)
+
+        kwargs = dict(temperature=2.0, top_k=50, top_p=0.9, repetition_penalty=1.3, max_length=32)
+        first = generate(model, tokenizer, generator=torch.Generator().manual_seed(0), **kwargs)
+        second = generate(model, tokenizer, generator=torch.Generator().manual_seed(0), **kwargs)
+        self.assertEqual(first, second)
+
+
+class ScriptedModel(torch.nn.Module):
+    """Модель, которая жадно выдаёт заранее заданную последовательность токенов, а затем eos."""
+    def __init__(self, ids, vocab_size, eos_token_id):
+        super().__init__()
+        self.ids = list(ids) + [eos_token_id]
+        self.vocab_size = vocab_size
+
+    def forward(self, tokens, hx=None):
+        step = 0 if hx is None else hx
+        logits = torch.zeros(*tokens.shape, self.vocab_size)
+        logits[..., self.ids[min(step, len(self.ids) - 1)]] = 1.0
+        return logits, step + 1
+
+
+class TestStreamGenerate(TestCase):
+    def setUp(self):
+        self.tokenizer = ByteTokenizer()
+        self.text = 'Привет, мир!\n\nКонец'
+
+    def scripted(self, text):
+        return ScriptedModel(self.tokenizer.encode(text), self.tokenizer.get_vocab_size(), self.tokenizer.eos_token_id)
+
+    def test_matches_generate(self):
+        model = Model(self.tokenizer.get_vocab_size(), emb_size=8, hidden_size=32)
+        chunks = list(stream_generate(model, self.tokenizer, temperature=0, max_length=64))
+        self.assertTrue(all(chunks))
+        self.assertEqual(''.join(chunks), generate(model, self.tokenizer, temperature=0, max_length=64))
+
+    def test_incremental_utf8(self):
+        chunks = list(stream_generate(self.scripted(self.text), self.tokenizer, temperature=0))
+        self.assertEqual(''.join(chunks), self.text)
+        # Двухбайтовые символы не разрываются и не заменяются на символ замены
+        self.assertEqual(chunks[:3], ['П', 'р', 'и'])
+        self.assertNotIn('�', ''.join(chunks))
+
+    def test_stop(self):
+        model = self.scripted(self.text)
+        self.assertEqual(''.join(stream_generate(model, self.tokenizer, temperature=0, stop=['\n\n'])), 'Привет, мир!')
+        self.assertEqual(''.join(stream_generate(model, self.tokenizer, temperature=0, stop=['мир', 'П'])), '')
+        self.assertEqual(''.join(stream_generate(model, self.tokenizer, temperature=0, stop=['мирный'])), self.text)
+        self.assertEqual(generate(model, self.tokenizer, temperature=0, stop=['Кон', ', ']), 'Привет')
+
+    def test_max_time(self):
+        model = self.scripted(self.text)
+        self.assertEqual(list(stream_generate(model, self.tokenizer, temperature=0, max_time=0)), [])
+        self.assertEqual(generate(model, self.tokenizer, temperature=0, max_length=6), 'При')
+
+
+class TestBeamSearch(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tokenizer = ByteTokenizer()
+        self.model = Model(self.tokenizer.get_vocab_size(), emb_size=8, hidden_size=32)
+
+    def sequence_log_prob(self, text):
+        ids = [self.tokenizer.bos_token_id] + self.tokenizer.encode(text) + [self.tokenizer.eos_token_id]
+        with torch.no_grad():
+            logits, _ = self.model(torch.tensor([ids[:-1]]))
+        log_probs = torch.log_softmax(logits[0], dim=-1)
+        return log_probs[torch.arange(len(ids) - 1), torch.tensor(ids[1:])].sum().item()
+
+    def test_greedy(self):
+        greedy = generate(self.model, self.tokenizer, temperature=0, max_length=32)
+        self.assertEqual(beam_search(self.model, self.tokenizer, num_beams=1, max_length=32), [greedy])
+
+    def test_n_best(self):
+        results = beam_search(
+            self.model, self.tokenizer, num_beams=8, max_length=4, num_return_sequences=8, return_scores=True
+        )
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(text for text, _ in results)), 8)
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_scores(self):
+        # Только ASCII, чтобы текст однозначно кодировался обратно, и eos, который модель выдаёт почти сразу,
+        # чтобы гипотезы заканчивались до max_length
+        self.model.logits.bias.data[128:] = -100.0
+        self.model.logits.bias.data[self.tokenizer.eos_token_id] = 5.0
+        results = beam_search(
+            self.model, self.tokenizer, num_beams=4, max_length=32, length_penalty=0.0, early_stopping=False,
+            num_return_sequences=4, return_scores=True
+        )
+        for text, score in results:
+            self.assertAlmostEqual(score, self.sequence_log_prob(text), places=4)
+        # Лучевой поиск находит гипотезу не хуже жадной
+        greedy = generate(self.model, self.tokenizer, temperature=0, max_length=32)
+        self.assertGreaterEqual(results[0][1], self.sequence_log_prob(greedy) - 1e-4)
@@ -0,0 +1,64 @@
+import torch
+from unittest import TestCase
+from scripts.model import Model
+from scripts.tokenizer import ByteTokenizer
+from scripts.generation import encode_prompt, generate, generate_batch
+from scripts.prompt_cache import PromptCache
+
+
+class TestPromptCache(TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.tokenizer = ByteTokenizer()
+        self.model = Model(self.tokenizer.get_vocab_size(), emb_size=8, hidden_size=32, num_layers=2)
+
+    def assertStateEqual(self, first, second):
+        self.assertTrue(torch.allclose(first[0], second[0], atol=1e-6))
+        self.assertTrue(torch.allclose(first[1][0], second[1][0], atol=1e-6))
+        self.assertTrue(torch.allclose(first[1][1], second[1][1], atol=1e-6))
+
+    def test_prefix_reuse(self):
+        cache = PromptCache(self.model)
+        short = encode_prompt(self.model, self.tokenizer, 'Жили-были', cache)
+        self.assertStateEqual(short, encode_prompt(self.model, self.tokenizer, 'Жили-были'))
+        self.assertEqual(cache.cache_info()[:5], (0, 0, 1, 0, 1 + len('Жили-были'.encode())))
+
+        long = encode_prompt(self.model, self.tokenizer, 'Жили-были дед', cache)
+        self.assertStateEqual(long, encode_prompt(self.model, self.tokenizer, 'Жили-были дед'))
+        info = cache.cache_info()
+        self.assertEqual((info.partial_hits, info.reused_tokens, info.computed_tokens), (1, 18, 18 + len(' дед'.encode())))
+
+        self.assertIs(encode_prompt(self.model, self.tokenizer, 'Жили-были дед', cache), long)
+        self.assertEqual(cache.cache_info().hits, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_eviction(self):
+        cache = PromptCache(self.model, maxsize=2)
+        for prompt in ['a', 'b', 'a', 'c']:
+            cache(self.tokenizer.encode(prompt))
+        self.assertEqual(set(cache._cache), {tuple(self.tokenizer.encode('a')), tuple(self.tokenizer.encode('c'))})
+        state_nbytes = cache.cache_info().nbytes // 2
+        self.assertEqual(state_nbytes, 4 * (self.tokenizer.get_vocab_size() + 2 * 2 * 32))
+
+        cache = PromptCache(self.model, max_bytes=state_nbytes)
+        cache([1, 2])
+        cache([1, 2, 3])
+        self.assertEqual(list(cache._cache), [(1, 2, 3)])
+        self.assertEqual(cache.cache_info().nbytes, state_nbytes)
+
+    def test_generate_with_prompt(self):
+        cache = PromptCache(self.model)
+        expected = generate(self.model, self.tokenizer, temperature=0, max_length=16, prompt='Привет')
+        for _ in range(3):
+            self.assertEqual(
+                generate(self.model, self.tokenizer, temperature=0, max_length=16, prompt='Привет', prompt_cache=cache),
+                expected
+            )
+        self.assertEqual(
+            generate_batch(
+                self.model, self.tokenizer, num_samples=3, temperature=0, max_length=16,
+                prompt='Привет', prompt_cache=cache
+            ),
+            [expected] * 3
+        )
+        self.assertEqual(cache.cache_info()[:3], (3, 0, 1))
@@ -0,0 +1,67 @@
+import numpy as np
+from unittest import TestCase
+from scripts.sampler import BucketBatchSampler, SkipBatchSampler, get_lengths
+from scripts.dataset import MyDataset
+from scripts.tokenizer import ByteTokenizer
+from scripts.collator import Collator
+from scripts.model import Model
+from scripts.trainer import Trainer
+
+
+class TestSampler(TestCase):
+    def test_bucket_batch_sampler(self):
+        rng = np.random.default_rng(0)
+        lengths = rng.integers(1, 100, size=200)
+        sampler = BucketBatchSampler(lengths, batch_size=8, boundaries=[10, 30, 60])
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(sorted(sum(batches, [])), list(range(200)))
+        for batch in batches:
+            self.assertLessEqual(len(batch), 8)
+            self.assertEqual(len(set(np.searchsorted([10, 30, 60], lengths[batch], side='right'))), 1)
+
+        self.assertEqual(list(sampler), batches)
+        sampler.set_epoch(1)
+        self.assertNotEqual(list(sampler), batches)
+
+        sampler = BucketBatchSampler(lengths, batch_size=8, boundaries=[10, 30, 60], drop_last=True)
+        self.assertEqual(len(list(sampler)), len(sampler))
+        self.assertTrue(all(len(batch) == 8 for batch in sampler))
+
+    def test_max_tokens(self):
+        rng = np.random.default_rng(0)
+        lengths = rng.integers(1, 100, size=200)
+        sampler = BucketBatchSampler(lengths, max_tokens=256)
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(sorted(sum(batches, [])), list(range(200)))
+        for batch in batches:
+            self.assertLessEqual(len(batch) * lengths[batch].max(), 256)
+
+        sampler = BucketBatchSampler(lengths, max_tokens=256, shuffle=False)
+        maxima = [lengths[batch].max() for batch in sampler]
+        self.assertEqual(maxima, sorted(maxima))
+
+    def test_trainer_batch_sampler(self):
+        tokenizer = ByteTokenizer()
+        dataset = MyDataset(['a' * n for n in range(1, 20)], tokenizer)
+        self.assertEqual(get_lengths(dataset).tolist(), list(range(3, 22)))
+
+        sampler = BucketBatchSampler(get_lengths(dataset), batch_size=4, boundaries=[8, 16])
+        trainer = Trainer(
+            model=Model(tokenizer.get_vocab_size(), emb_size=8, hidden_size=16),
+            train_dataset=dataset,
+            eval_dataset=dataset,
+            n_epochs=2,
+            collator=Collator(tokenizer.pad_token_id),
+            train_batch_sampler=sampler
+        )
+        self.assertEqual(len(trainer.train_loader), len(sampler))
+        trainer.train()
+        self.assertEqual(sampler.epoch, 1)
+
+    def test_skip_batch_sampler(self):
+        sampler = BucketBatchSampler(np.arange(1, 41), batch_size=4, seed=1)
+        skipped = SkipBatchSampler(sampler, 3)
+        self.assertEqual(list(skipped), list(sampler)[3:])
+        self.assertEqual(len(skipped), len(sampler) - 3)
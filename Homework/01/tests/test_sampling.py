@@ -0,0 +1,82 @@
+import numpy as np
+import torch
+from unittest import TestCase
+from scripts.sampling import apply_penalties, sample_next_token
+
+
+class TestSampling(TestCase):
+    def setUp(self):
+        self.logits = torch.randn(8, 259, generator=torch.Generator().manual_seed(0))
+
+    def test_greedy(self):
+        greedy = self.logits.argmax(-1)
+        self.assertTrue(torch.equal(sample_next_token(self.logits, temperature=0), greedy))
+        self.assertTrue(torch.equal(sample_next_token(self.logits, temperature=10, top_k=1), greedy))
+        self.assertTrue(torch.equal(sample_next_token(self.logits, temperature=10, top_p=1e-6), greedy))
+        self.assertTrue(torch.equal(sample_next_token(self.logits, temperature=10, min_p=1.0), greedy))
+
+    def test_top_k_support(self):
+        allowed = self.logits.topk(5, dim=-1).indices
+        generator = torch.Generator().manual_seed(0)
+        for _ in range(50):
+            tokens = sample_next_token(self.logits, temperature=100, top_k=5, generator=generator)
+            self.assertTrue((allowed == tokens[:, None]).any(-1).all())
+
+    def test_top_p_support(self):
+        logits = torch.tensor([[3.0, 2.0, 1.0, -10.0, -10.0]]).log_softmax(-1)
+        generator = torch.Generator().manual_seed(0)
+        tokens = {sample_next_token(logits, top_p=0.95, generator=generator).item() for _ in range(200)}
+        # Вероятности первых двух токенов в сумме ~0.91 < 0.95, поэтому третий тоже допустим, а остальные - нет
+        self.assertEqual(tokens, {0, 1, 2})
+
+    def test_generator(self):
+        kwargs = dict(temperature=1.5, top_k=50, top_p=0.95, min_p=0.01)
+        first = sample_next_token(self.logits, generator=torch.Generator().manual_seed(42), **kwargs)
+        second = sample_next_token(self.logits, generator=torch.Generator().manual_seed(42), **kwargs)
+        self.assertTrue(torch.equal(first, second))
+
+    def test_distribution(self):
+        logits = torch.tensor([[0.0, 1.0, 2.0, -1.0]]).expand(20000, 4)
+        tokens = sample_next_token(logits, generator=torch.Generator().manual_seed(0))
+        frequencies = torch.bincount(tokens, minlength=4) / len(tokens)
+        self.assertTrue(torch.allclose(frequencies, logits[0].softmax(-1), atol=0.01))
+
+    def test_top_k_whole_vocab(self):
+        # top_k не меньше размера словаря ничего не ограничивает
+        for top_k in (259, 1000, torch.full((8,), 259)):
+            tokens = sample_next_token(self.logits, top_k=top_k, generator=torch.Generator().manual_seed(0))
+            expected = sample_next_token(self.logits, generator=torch.Generator().manual_seed(0))
+            self.assertTrue(torch.equal(tokens, expected))
+
+    def test_per_row_params(self):
+        greedy = self.logits.argmax(-1)
+        temperature = torch.tensor([0, 10, 10, 10, 10, 10, 10, 10])
+        top_k = torch.tensor([0, 1, 0, 0, 0, 0, 0, 1])
+        tokens = sample_next_token(self.logits, temperature=temperature, top_k=top_k)
+        self.assertEqual(tokens[[0, 1, 7]].tolist(), greedy[[0, 1, 7]].tolist())
+
+        # Значения для строк можно передать списком или np.ndarray, общие - 0-мерным тензором или числом NumPy
+        expected = sample_next_token(
+            self.logits, temperature=temperature, top_k=top_k, top_p=torch.full((8,), 0.9),
+            generator=torch.Generator().manual_seed(0)
+        )
+        for container in (list, np.array):
+            tokens = sample_next_token(
+                self.logits, temperature=container(temperature.tolist()), top_k=container(top_k.tolist()),
+                top_p=container([0.9] * 8), generator=torch.Generator().manual_seed(0)
+            )
+            self.assertTrue(torch.equal(tokens, expected))
+        scalar = sample_next_token(self.logits, temperature=1.5, top_k=5, generator=torch.Generator().manual_seed(0))
+        tokens = sample_next_token(
+            self.logits, temperature=torch.tensor(1.5), top_k=np.int64(5), generator=torch.Generator().manual_seed(0)
+        )
+        self.assertTrue(torch.equal(tokens, scalar))
+
+    def test_penalties(self):
+        logits = torch.tensor([[2.0, -1.0, 1.9]])
+        counts = torch.tensor([[1, 1, 0]])
+        penalized = apply_penalties(logits, counts, repetition_penalty=2.0)
+        self.assertTrue(torch.allclose(penalized, torch.tensor([[1.0, -2.0, 1.9]])))
+        self.assertEqual(sample_next_token(penalized, temperature=0).item(), 2)
+        penalized = apply_penalties(logits, torch.tensor([[3, 0, 0]]), frequency_penalty=0.5)
+        self.assertTrue(torch.allclose(penalized, torch.tensor([[0.5, -1.0, 1.9]])))
@@ -1,5 +1,10 @@
+import os
+import pickle
+import random
+import tempfile
 from unittest import TestCase
-from scripts.tokenizer import count_pairs, merge, BpeTokenizer
+from scripts.tokenizer import count_pairs, merge, apply_merges_naive, ByteTokenizer, BpeTokenizer
+from scripts.bpe import apply_merges
 
 
 class TestTokenizer(TestCase):
@@ -62,3 +67,110 @@ class TestTokenizer(TestCase):
             tokenizer.encode('aaaaababcd'),
             [259, 259, 261, 99, 100]
         )
+
+    def test_train_incremental(self):
+        data = ['aaaaa', 'abababc', 'Мама мыла раму', '', 'b', 'abcabcabc aaa bbb']
+        for max_vocab in [259, 262, 270, 300]:
+            naive = BpeTokenizer()
+            naive.train(data, max_vocab=max_vocab, incremental=False)
+            fast = BpeTokenizer()
+            fast.train(data, max_vocab=max_vocab)
+            self.assertEqual(list(fast.merges.items()), list(naive.merges.items()))
+            self.assertEqual(fast.vocab, naive.vocab)
+
+    def test_apply_merges(self):
+        data = ['aaaaa', 'abababc', 'Мама мыла раму', 'abcabcabc aaa bbb']
+        tokenizer = BpeTokenizer()
+        tokenizer.train(data, max_vocab=300)
+
+        rng = random.Random(0)
+        for _ in range(200):
+            text = ''.join(rng.choice('abc мыларуМ') for _ in range(rng.randint(0, 40)))
+            ids = list(text.encode('utf-8'))
+            self.assertEqual(
+                apply_merges(ids, tokenizer.merges),
+                apply_merges_naive(ids, tokenizer.merges)
+            )
+
+    def test_pretokenize_cache(self):
+        data = ['aaaaa aaaaa', 'abababc abab', 'Мама мыла раму']
+        tokenizer = BpeTokenizer(pattern='whitespace', cache_size=2)
+        tokenizer.train(data, max_vocab=300)
+        # Склеивания не пересекают границы слов
+        for pair in tokenizer.merges:
+            self.assertNotIn(b' ', (tokenizer.vocab[pair[0]] + tokenizer.vocab[pair[1]]).strip(b' '))
+
+        text = 'aaaaa abab aaaaa abab раму'
+        expected = []
+        for chunk in tokenizer.pretokenize(text):
+            expected += apply_merges(list(chunk.encode('utf-8')), tokenizer.merges)
+        encoded = tokenizer.encode(text)
+        self.assertEqual(encoded, expected)
+        self.assertEqual(tokenizer.decode(encoded), text)
+        # Кэш вмещает два куска: повторный ' abab' попадает в кэш, ' aaaaa' вытесняется
+        self.assertEqual(tokenizer.cache_info().hits, 1)
+        self.assertEqual(tokenizer.cache_info().misses, 4)
+        self.assertEqual(tokenizer.cache_info().currsize, 2)
+
+        tokenizer.encode(' раму aaaaa')
+        self.assertEqual(tokenizer.cache_info().hits, 2)
+        self.assertEqual(tokenizer.cache_info().misses, 5)
+
+        # Кэш не копируется вместе с токенизатором (например, в процессы encode_batch)
+        copy = pickle.loads(pickle.dumps(tokenizer))
+        self.assertEqual(copy.cache_info(), (0, 0, 2, 0))
+        self.assertEqual(copy.encode(text), encoded)
+        self.assertEqual(tokenizer.cache_info().currsize, 2)
+
+    def test_encode_batch(self):
+        data = ['aaaaa', 'abababc', 'Мама мыла раму', 'abcabcabc aaa bbb']
+        tokenizer = BpeTokenizer(pattern='gpt2')
+        tokenizer.train(data, max_vocab=300)
+
+        texts = [f'{text} {i}' for i in range(50) for text in data]
+        expected = [tokenizer.encode(text) for text in texts]
+        self.assertEqual(tokenizer.encode_batch(texts, num_workers=0), expected)
+        self.assertEqual(tokenizer.encode_batch(texts, num_workers=3, chunk_size=7), expected)
+
+    def test_train_from_files(self):
+        lines = ['aaaaa aaaaa\n', 'abababc abab\n', 'Мама мыла раму\n', 'abcabcabc aaa bbb\n'] * 3
+        for pattern in [None, 'whitespace', 'gpt2']:
+            naive = BpeTokenizer(pattern=pattern)
+            naive.train(lines, max_vocab=300, incremental=False)
+
+            with tempfile.TemporaryDirectory() as tmp:
+                paths = [os.path.join(tmp, f'{i}.txt') for i in range(2)]
+                for i, path in enumerate(paths):
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.writelines(lines[i * 6:(i + 1) * 6])
+                streamed = BpeTokenizer(pattern=pattern)
+                streamed.train_from_files(paths, max_vocab=300)
+            self.assertEqual(list(streamed.merges.items()), list(naive.merges.items()))
+
+        tokenizer = BpeTokenizer(pattern='whitespace')
+        sampled = tokenizer.count_chunks(iter(lines * 10), sample_rate=0.3, seed=1)
+        self.assertEqual(sampled, tokenizer.count_chunks(iter(lines * 10), sample_rate=0.3, seed=1))
+        self.assertLess(sum(sampled.values()), sum(tokenizer.count_chunks(lines * 10).values()))
+
+    def test_save_load(self):
+        data = ['aaaaa aaaaa', 'abababc abab', 'Мама мыла раму', 'abcabcabc aaa bbb']
+        tokenizer = BpeTokenizer(pattern='gpt2', cache_size=10)
+        tokenizer.train(data, max_vocab=300)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tokenizer.bin')
+            tokenizer.save(path)
+            for mmap in [True, False]:
+                loaded = BpeTokenizer.load(path, mmap=mmap)
+                self.assertEqual(loaded.pattern, tokenizer.pattern)
+                self.assertEqual(loaded.cache_size, 10)
+                self.assertEqual(loaded.vocab, tokenizer.vocab)
+                self.assertEqual(loaded.merges, tokenizer.merges)
+                self.assertEqual(loaded.eos_token_id, tokenizer.eos_token_id)
+                self.assertEqual(loaded.encode('Мама мыла abab'), tokenizer.encode('Мама мыла abab'))
+
+            path = os.path.join(tmp, 'bytes.bin')
+            ByteTokenizer().save(path)
+            self.assertEqual(ByteTokenizer.load(path).vocab, ByteTokenizer().vocab)
+            with self.assertRaises(ValueError):
+                BpeTokenizer.load(path)
@@ -1,7 +1,13 @@
+import json
+import math
+import os
+import tempfile
 import torch
 from unittest import TestCase
 from scripts.model import Model
 from scripts.trainer import Trainer
+from scripts.collator import Collator
+from scripts.sampler import BucketBatchSampler
 
 
 class TestTrainer(TestCase):
@@ -34,3 +40,246 @@ class TestTrainer(TestCase):
             logits.argmax(-1)[0].cpu().tolist(),
             [1, 2, 3, 4, 5]
         )
+
+    def test_prepare_batch(self):
+        model = Model(vocab_size=6, emb_size=8, num_layers=1, hidden_size=8)
+        dataset = [[0, 1, 2], [3, 4]]
+        collator = Collator(5, return_mask=True)
+        trainer = Trainer(model=model, train_dataset=dataset, eval_dataset=dataset, collator=collator)
+
+        x, y = trainer.prepare_batch(collator(dataset))
+        self.assertEqual(x.tolist(), [[0, 1], [3, 4]])
+        self.assertEqual(y.tolist(), [[1, 2], [4, -100]])
+
+        x, y = trainer.prepare_batch(Collator(5)(dataset))
+        self.assertEqual(y.tolist(), [[1, 2], [4, 5]])
+
+    def make_trainer(self, seed, **kwargs):
+        torch.manual_seed(seed)
+        dataset = [torch.randint(0, 6, (8,), generator=torch.Generator().manual_seed(i)) for i in range(8)]
+        model = Model(vocab_size=6, emb_size=8, num_layers=1, hidden_size=16)
+        return Trainer(model=model, train_dataset=dataset, eval_dataset=dataset, n_epochs=2, lr=1e-2, **kwargs)
+
+    def test_gradient_accumulation(self):
+        full = self.make_trainer(0, train_batch_size=4)
+        accumulated = self.make_trainer(0, train_batch_size=2, gradient_accumulation_steps=2)
+        # Одинаковое перемешивание в обоих запусках
+        torch.manual_seed(1)
+        full.train()
+        torch.manual_seed(1)
+        accumulated.train()
+        for p, q in zip(full.model.parameters(), accumulated.model.parameters()):
+            self.assertTrue(torch.allclose(p, q, atol=1e-5))
+
+    def make_bucket_trainer(self, **kwargs):
+        torch.manual_seed(0)
+        generator = torch.Generator().manual_seed(0)
+        dataset = [torch.randint(1, 6, (int(n),), generator=generator).tolist()
+                   for n in torch.randint(2, 30, (120,), generator=generator)]
+        # С max_tokens число батчей зависит от перемешивания, то есть от эпохи
+        sampler = BucketBatchSampler([len(ids) for ids in dataset], max_tokens=120, boundaries=[16])
+        model = Model(vocab_size=6, emb_size=8, num_layers=1, hidden_size=8)
+        collator = Collator(0, return_mask=True)
+        seen = []
+
+        def collate(batch):
+            seen.append(len(batch))
+            return collator(batch)
+
+        trainer = Trainer(
+            model=model, train_dataset=dataset, eval_dataset=dataset, collator=collate, train_batch_sampler=sampler,
+            lr=1e-2, **kwargs
+        )
+        return trainer, sampler, seen
+
+    def epoch_lengths(self, sampler, n_epochs):
+        lengths = []
+        for epoch in range(n_epochs):
+            sampler.set_epoch(epoch)
+            lengths.append(len(sampler))
+        sampler.set_epoch(0)
+        return lengths
+
+    def test_variable_epoch_length(self):
+        trainer, sampler, seen = self.make_bucket_trainer(n_epochs=6, gradient_accumulation_steps=4)
+        lengths = self.epoch_lengths(sampler, 6)
+        self.assertGreater(len(set(lengths)), 1)
+        trainer.train()
+        # Каждая эпоха проходит ровно по своим батчам: все примеры, ни одного лишнего батча
+        self.assertEqual(len(seen), sum(lengths))
+        self.assertEqual(sum(seen), 6 * 120)
+        # Неполная последняя группа каждой эпохи завершается шагом оптимизатора, градиенты не переходят в следующую эпоху
+        self.assertEqual(trainer.iterations, sum(math.ceil(length / 4) for length in lengths))
+        self.assertTrue(all(p.grad is None for p in trainer.model.parameters()))
+
+    def test_resume_variable_epoch_length(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            kwargs = dict(n_epochs=3, gradient_accumulation_steps=2, logging_steps=1, save_steps=1,
+                          checkpoint_dir=tmp, keep_last=None)
+            full, sampler, _ = self.make_bucket_trainer(**kwargs)
+            lengths = self.epoch_lengths(sampler, 3)
+            # Вторая эпоха длиннее первой
+            self.assertGreater(lengths[1], lengths[0])
+            full.train()
+            # Доля эпохи в логах считается по длине своей эпохи: конец каждой эпохи - целое число
+            epochs = [record['epoch'] for record in full.log_history]
+            self.assertEqual([epoch for epoch in epochs if epoch == int(epoch)], [1, 2, 3])
+
+            # Чекпоинт второй эпохи, сохранённый после lengths[0] батчей
+            for path in full.checkpoints.checkpoints():
+                state = torch.load(path)
+                if (state['epoch'], state['epoch_step']) == (1, lengths[0] + 1):
+                    break
+            resumed, _, seen = self.make_bucket_trainer(**kwargs)
+            resumed.train(resume_from=path)
+            self.assertEqual(len(seen), lengths[1] - lengths[0] - 1 + lengths[2])
+            for p, q in zip(full.model.parameters(), resumed.model.parameters()):
+                self.assertTrue(torch.equal(p, q))
+            # Время фаз у запусков разное, сравниваются шаги, эпохи и потери
+            keys = ('step', 'epoch', 'loss')
+            self.assertEqual(
+                [[record[key] for key in keys] for record in resumed.log_history],
+                [[record[key] for key in keys] for record in full.log_history]
+            )
+
+    def test_logging(self):
+        trainer = self.make_trainer(0, train_batch_size=1, gradient_accumulation_steps=3, logging_steps=2)
+        trainer.train()
+        # 8 батчей в эпохе: группы по 3, 3 и 2 батча, всего 6 шагов оптимизатора за 2 эпохи
+        self.assertEqual([log['step'] for log in trainer.log_history], [2, 4, 6])
+        self.assertEqual([log['epoch'] for log in trainer.log_history], [0.75, 1.375, 2.0])
+
+    def test_logging_last_window(self):
+        trainer = self.make_trainer(0, train_batch_size=1, gradient_accumulation_steps=3, logging_steps=4)
+        trainer.train()
+        # Последние 2 шага из 6 не образуют полного окна, но записываются после обучения
+        self.assertEqual([log['step'] for log in trainer.log_history], [4, 6])
+        self.assertEqual([log['epoch'] for log in trainer.log_history], [1.375, 2.0])
+        self.assertEqual(trainer.log_history[-1]['steps'], 2)
+
+    def test_bf16_and_clipping(self):
+        trainer = self.make_trainer(0, train_batch_size=2, bf16=True, max_grad_norm=1.0, logging_steps=1)
+        before = trainer.evaluate()
+        trainer.n_epochs = 20
+        trainer.train()
+        self.assertTrue(all(torch.isfinite(p).all() for p in trainer.model.parameters()))
+        self.assertLess(trainer.evaluate(), before)
+
+    def test_instrumentation(self):
+        dataset = [[0, 1, 2, 3], [3, 4], [1, 2, 3], [5, 4, 3, 2]]
+        model = Model(vocab_size=6, emb_size=8, num_layers=1, hidden_size=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            log_file = os.path.join(tmp, 'log.jsonl')
+            trace = os.path.join(tmp, 'trace.json')
+            trainer = Trainer(
+                model=model, train_dataset=dataset, eval_dataset=dataset, n_epochs=3, train_batch_size=4,
+                collator=Collator(5, return_mask=True), logging_steps=1, eval_steps=2, log_file=log_file,
+                profile_steps=(2, 1), profile_trace=trace
+            )
+            trainer.train()
+            with open(log_file) as f:
+                records = [json.loads(line) for line in f]
+            self.assertTrue(os.path.exists(trace))
+
+        self.assertEqual(records, trainer.log_history)
+        self.assertEqual([record['step'] for record in records], [1, 2, 2, 3])
+        self.assertIn('eval_loss', records[2])
+        train_record = records[0]
+        for key in ['loss', 'data_time', 'forward_time', 'backward_time', 'optimizer_time', 'rss_mb', 'peak_rss_mb']:
+            self.assertIn(key, train_record)
+        if os.path.exists('/proc/self/statm'):
+            self.assertGreater(train_record['rss_mb'], 0)
+        # Токены без паддинга: по одной целевой метке на каждый токен, кроме первого в тексте
+        self.assertAlmostEqual(train_record['tokens_per_sec'] / train_record['samples_per_sec'], (3 + 1 + 2 + 3) / 4)
+        self.assertIn('forward', {event.key for event in trainer.profiler.key_averages()})
+
+    def test_token_count_without_mask(self):
+        dataset = [[0, 1, 2, 3], [3, 4], [1, 2, 3], [5, 4, 3, 2]]
+        model = Model(vocab_size=7, emb_size=8, num_layers=1, hidden_size=8)
+        # Паддинг 6 попадает в потери (ignore_index другой), но не в число токенов
+        trainer = Trainer(
+            model=model, train_dataset=dataset, eval_dataset=dataset, n_epochs=2, train_batch_size=4,
+            collator=Collator(6), logging_steps=1
+        )
+        trainer.train()
+        for record in trainer.log_history:
+            self.assertAlmostEqual(record['tokens_per_sec'] / record['samples_per_sec'], (3 + 1 + 2 + 3) / 4)
+
+    def test_resume(self):
+        def make():
+            torch.manual_seed(0)
+            dataset = [torch.randint(0, 6, (8,), generator=torch.Generator().manual_seed(i)) for i in range(10)]
+            # Dropout проверяет, что восстанавливается и состояние глобального генератора
+            model = Model(vocab_size=6, emb_size=8, num_layers=2, hidden_size=16, dropout=0.5)
+            return Trainer(
+                model=model, train_dataset=dataset, eval_dataset=dataset, n_epochs=3, lr=1e-2, train_batch_size=2,
+                gradient_accumulation_steps=2, logging_steps=1, eval_steps=2, save_steps=1, checkpoint_dir=tmp,
+                keep_last=None, seed=3
+            )
+
+        def losses(trainer):
+            # Время шагов отличается от запуска к запуску, сравниваются только потери
+            return [{key: log[key] for key in ('step', 'epoch', 'loss', 'eval_loss') if key in log}
+                    for log in trainer.log_history]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            full = make()
+            full.train()
+            checkpoints = full.checkpoints.checkpoints()
+            # 5 батчей в эпохе: группы по 2, 2 и 1 батчу, 3 шага оптимизатора за эпоху
+            self.assertEqual(len(checkpoints), 9)
+
+            # Чекпоинт посередине второй эпохи и чекпоинт на границе эпох
+            for path in [checkpoints[4], checkpoints[2]]:
+                torch.manual_seed(123)
+                resumed = make()
+                resumed.train(resume_from=path)
+                for p, q in zip(full.model.parameters(), resumed.model.parameters()):
+                    self.assertTrue(torch.equal(p, q))
+                self.assertEqual(losses(resumed), losses(full))
+
+    def test_evaluate(self):
+        dataset = [[0, 1, 2, 3, 4, 5], [3, 4], [1, 2, 3], [5, 4, 3, 2, 1], [2, 2]]
+        model = Model(vocab_size=7, emb_size=8, num_layers=1, hidden_size=8)  # 6 - паддинг Collator(6) ниже
+        collator = Collator(0, return_mask=True)
+
+        # Средние потери по всем токенам, посчитанные по одному примеру
+        loss_sum, n_tokens = 0.0, 0
+        with torch.no_grad():
+            for ids in dataset:
+                logits, _ = model(torch.tensor([ids[:-1]]))
+                loss_sum += torch.nn.functional.cross_entropy(logits[0], torch.tensor(ids[1:]), reduction='sum').item()
+                n_tokens += len(ids) - 1
+
+        for eval_batch_size in [1, 2, 4, 'auto']:
+            trainer = Trainer(
+                model=model, train_dataset=dataset, eval_dataset=dataset, collator=collator,
+                eval_batch_size=eval_batch_size, eval_max_tokens=12
+            )
+            metrics = trainer.evaluate_metrics()
+            self.assertEqual((metrics['samples'], metrics['tokens']), (5, n_tokens))
+            self.assertAlmostEqual(metrics['loss'], loss_sum / n_tokens, places=5)
+            self.assertAlmostEqual(metrics['perplexity'], math.exp(loss_sum / n_tokens), places=4)
+
+        # Collator без маски: паддинг не отличить от токенов, если он не совпадает с ignore_index
+        for eval_batch_size in [2, 'auto']:
+            with self.assertRaises(ValueError):
+                Trainer(model=model, train_dataset=dataset, eval_dataset=dataset, collator=Collator(0),
+                        eval_batch_size=eval_batch_size)
+        for eval_batch_size in ['max', '2', 0, 1.5]:
+            with self.assertRaisesRegex(ValueError, 'eval_batch_size'):
+                Trainer(model=model, train_dataset=dataset, eval_dataset=dataset, collator=collator,
+                        eval_batch_size=eval_batch_size)
+        for eval_batch_size, ignore_index in [(1, -100), (2, 6), ('auto', 6)]:
+            metrics = Trainer(
+                model=model, train_dataset=dataset, eval_dataset=dataset, collator=Collator(6),
+                eval_batch_size=eval_batch_size, ignore_index=ignore_index, eval_max_tokens=12
+            ).evaluate_metrics()
+            self.assertEqual(metrics['tokens'], n_tokens)
+            self.assertAlmostEqual(metrics['loss'], loss_sum / n_tokens, places=5)
+
+        # В батче не больше eval_max_tokens токенов с учётом паддинга
+        batches = list(trainer.eval_loader.batch_sampler)
+        self.assertEqual(sorted(sum(batches, [])), list(range(5)))
+        for batch in batches:
+            self.assertLessEqual(len(batch) * max(len(dataset[idx]) for idx in batch), 12)
@@ -0,0 +1,82 @@
+"""
+Время и пиковая память compute_attention и compute_attention_tiled при разной длине последовательности.
+
+Каждый замер выполняется в отдельном процессе, поэтому пиковый размер памяти процесса (ru_maxrss)
+относится только к одному вызову. Из него вычитается память процесса после создания входов,
+так что в таблице - память, выделенная самим вниманием.
+
+Запуск (из папки Homework/02):
+    python benchmarks/bench_attention.py --lengths 1024 2048 4096 8192 16384
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solution import compute_attention, compute_attention_tiled  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def run_worker(args):
+    torch.manual_seed(0)
+    q, k, v = (torch.randn(args.batch_size, args.length, args.dim) for _ in range(3))
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    with torch.no_grad():
+        if args.method == 'full':
+            compute_attention(q, k, v)
+        else:
+            compute_attention_tiled(q, k, v, causal=args.method == 'tiled-causal', block_size=args.block_size)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'time': elapsed, 'memory': peak_rss_mb() - base}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1024, 2048, 4096, 8192, 16384])
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--max-full-length', type=int, default=8192,
+                        help='compute_attention is skipped for longer sequences (it needs 8 * L^2 bytes)')
+    parser.add_argument('--method', choices=['full', 'tiled', 'tiled-causal'], help=argparse.SUPPRESS)
+    parser.add_argument('--length', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if resource is None:
+        raise SystemExit('resource module is required to measure peak memory')
+    if args.method is not None:
+        run_worker(args)
+        return
+
+    print(f'{"length":>7} {"method":>13} {"time, s":>8} {"peak memory, MB":>16}')
+    for length in args.lengths:
+        for method in ('full', 'tiled', 'tiled-causal'):
+            if method == 'full' and length > args.max_full_length:
+                print(f'{length:>7} {method:>13} {"skipped":>8} {"":>16}')
+                continue
+            output = subprocess.run(
+                [sys.executable, __file__, '--method', method, '--length', str(length),
+                 '--batch-size', str(args.batch_size), '--dim', str(args.dim), '--block-size', str(args.block_size)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output)
+            print(f'{length:>7} {method:>13} {result["time"]:8.3f} {result["memory"]:16.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Время compute_multihead_attention (цикл по головам и concat) и compute_multihead_attention_batched
+(все головы одним батчевым matmul или через F.scaled_dot_product_attention) при разном числе голов.
+
+Выводится время одного вызова в миллисекундах и максимальное отличие от compute_multihead_attention.
+
+Запуск (из папки Homework/02):
+    python benchmarks/bench_multihead.py --heads 1 2 4 8 16 32 64
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solution import compute_multihead_attention, compute_multihead_attention_batched  # noqa: E402
+
+
+def measure(function, repeats):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--heads', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--seq-length', type=int, default=128)
+    parser.add_argument('--dim-per-head', type=int, default=32)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print(f'{"heads":>5} {"loop, ms":>9} {"matmul, ms":>11} {"sdpa, ms":>9} {"speedup":>8} {"max diff":>9}')
+    for n_heads in args.heads:
+        q, k, v = (torch.randn(args.batch_size, n_heads, args.seq_length, args.dim_per_head) for _ in range(3))
+        hidden_dim = n_heads * args.dim_per_head
+        projection = torch.randn(hidden_dim, hidden_dim) / hidden_dim ** 0.5
+        with torch.no_grad():
+            reference = compute_multihead_attention(q, k, v, projection)
+            diff = max(
+                (compute_multihead_attention_batched(q, k, v, projection, use_sdpa=use_sdpa) - reference).abs().max()
+                for use_sdpa in (False, True)
+            )
+            loop_time = measure(lambda: compute_multihead_attention(q, k, v, projection), args.repeats)
+            matmul_time = measure(
+                lambda: compute_multihead_attention_batched(q, k, v, projection, use_sdpa=False), args.repeats
+            )
+            sdpa_time = measure(lambda: compute_multihead_attention_batched(q, k, v, projection), args.repeats)
+        print(f'{n_heads:>5} {loop_time:9.2f} {matmul_time:11.2f} {sdpa_time:9.2f} '
+              f'{loop_time / min(matmul_time, sdpa_time):7.2f}x {diff:9.1e}')
+
+
+if __name__ == '__main__':
+    main()
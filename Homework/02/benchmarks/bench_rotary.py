@@ -0,0 +1,59 @@
+"""
+Время compute_rotary_embeddings (матрицы поворота для каждой позиции) и RotaryEmbedding
+(закэшированные таблицы cos/sin и поэлементный поворот) при разной длине последовательности.
+
+Для RotaryEmbedding выводится время первого вызова (с построением таблиц) и последующих вызовов
+(таблицы берутся из кэша), а также максимальное отличие от compute_rotary_embeddings.
+
+Запуск (из папки Homework/02):
+    python benchmarks/bench_rotary.py --lengths 32 128 512
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solution import RotaryEmbedding, compute_rotary_embeddings  # noqa: E402
+
+
+def measure(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', type=int, nargs='+', default=[32, 128, 512])
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--n-heads', type=int, default=4)
+    parser.add_argument('--dim-per-head', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print(f'{"length":>6} {"matrices, ms":>13} {"cached first, ms":>17} {"cached, ms":>11} '
+          f'{"speedup":>9} {"max diff":>9}')
+    for length in args.lengths:
+        x = torch.rand(args.batch_size, length, args.n_heads, args.dim_per_head)
+        start = time.perf_counter()
+        reference = compute_rotary_embeddings(x)
+        matrices_time = (time.perf_counter() - start) * 1000
+
+        rope = RotaryEmbedding(args.dim_per_head, max_seq_len=length)
+        start = time.perf_counter()
+        output = rope(x)
+        first_time = (time.perf_counter() - start) * 1000
+        cached_time = measure(lambda: rope(x), args.repeats)
+        diff = (output - reference).abs().max()
+        print(f'{length:>6} {matrices_time:13.1f} {first_time:17.3f} {cached_time:11.3f} '
+              f'{matrices_time / cached_time:8.0f}x {diff:9.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Стоимость одного шага декодирования с KV-кэшем для поворота RotaryEmbedding.
+
+Сравниваются два способа получить повёрнутые запрос и ключ нового токена: повернуть весь префикс
+заново (prefix) и повернуть только новый токен с offset, равным длине кэша (offset). Для батча
+с разной длиной строк (ragged) offset передаётся тензором с длиной кэша каждой строки.
+
+Запуск (из папки Homework/02):
+    python benchmarks/bench_rotary_decode.py --lengths 128 1024 8192
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from solution import RotaryEmbedding  # noqa: E402
+
+
+def measure(function, repeats):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lengths', type=int, nargs='+', default=[128, 1024, 8192])
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--n-heads', type=int, default=8)
+    parser.add_argument('--dim-per-head', type=int, default=64)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    rope = RotaryEmbedding(args.dim_per_head)
+    print(f'{"cache length":>12} {"prefix, us":>11} {"offset, us":>11} {"ragged, us":>11} {"max diff":>9}')
+    for length in args.lengths:
+        x = torch.rand(args.batch_size, length + 1, args.n_heads, args.dim_per_head)
+        new_token = x[:, -1:]
+        offsets = torch.randint(0, length + 1, (args.batch_size,))
+        offsets[0] = length
+
+        prefix_time = measure(lambda: rope(x)[:, -1:], args.repeats)
+        offset_time = measure(lambda: rope(new_token, offset=length), args.repeats)
+        ragged_time = measure(lambda: rope(new_token, offset=offsets), args.repeats)
+        diff = (rope(new_token, offset=length) - rope(x)[:, -1:]).abs().max()
+        print(f'{length:>12} {prefix_time:11.1f} {offset_time:11.1f} {ragged_time:11.1f} {diff:9.1e}')
+
+
+if __name__ == '__main__':
+    main()
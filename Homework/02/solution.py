@@ -13,6 +13,57 @@ def compute_attention(queries, keys, values) -> torch.Tensor:
     return attention_scores @ values
 
 
+def compute_attention_tiled(queries, keys, values, causal=False, bias=None, block_size=256) -> torch.Tensor:
+    """
+    queries- (..., SEQ_LENGTH, HIDDEN_DIM)
+    keys- (..., KV_LENGTH, HIDDEN_DIM)
+    values- (..., KV_LENGTH, VALUE_DIM)
+    bias- additive bias broadcastable to (..., SEQ_LENGTH, KV_LENGTH) or None
+    causal- query i attends only to keys 0..i (as is_causal in F.scaled_dot_product_attention)
+
+    Same result as compute_attention, but queries and keys are processed in blocks of block_size
+    with an online softmax (running max and sum per query), so at most (..., block_size, block_size)
+    scores exist at a time instead of the full (..., SEQ_LENGTH, KV_LENGTH) matrix.
+    With causal=True key blocks above the diagonal are skipped.
+    """
+    seq_length, kv_length = queries.shape[-2], keys.shape[-2]
+    scale = np.sqrt(keys.shape[-1])
+    if bias is not None:
+        # Broadcast dims of size 1 in the last two axes so that they can be sliced by blocks (a view, no copy)
+        bias = bias.expand(*bias.shape[:-2], seq_length, kv_length)
+
+    outputs = []
+    for q_start in range(0, seq_length, block_size):
+        q_end = min(q_start + block_size, seq_length)
+        q_block = queries[..., q_start:q_end, :]
+        running_max = torch.full((*q_block.shape[:-1], 1), -torch.inf, dtype=q_block.dtype, device=q_block.device)
+        running_sum = torch.zeros_like(running_max)
+        accumulator = torch.zeros((*q_block.shape[:-1], values.shape[-1]), dtype=values.dtype, device=values.device)
+
+        kv_end = min(q_end, kv_length) if causal else kv_length
+        for k_start in range(0, kv_end, block_size):
+            k_end = min(k_start + block_size, kv_length)
+            scores = (q_block @ keys[..., k_start:k_end, :].mT) / scale
+            if bias is not None:
+                scores = scores + bias[..., q_start:q_end, k_start:k_end]
+            if causal and k_end - 1 > q_start:
+                future = (torch.arange(k_start, k_end, device=scores.device)
+                          > torch.arange(q_start, q_end, device=scores.device)[:, None])
+                scores = scores.masked_fill(future, -torch.inf)
+
+            new_max = torch.maximum(running_max, scores.amax(dim=-1, keepdim=True))
+            # Rows where every score so far is -inf: subtract 0 instead of -inf to avoid nan
+            shift = torch.where(new_max == -torch.inf, 0, new_max)
+            probs = torch.exp(scores - shift)
+            correction = torch.exp(running_max - shift)
+            running_sum = running_sum * correction + probs.sum(dim=-1, keepdim=True)
+            accumulator = accumulator * correction + probs @ values[..., k_start:k_end, :]
+            running_max = new_max
+
+        outputs.append(accumulator / running_sum)
+    return torch.cat(outputs, dim=-2)
+
+
 def compute_multihead_attention(queries, keys, values, projection_matrix) -> torch.Tensor:
     """
     queries- (BATCH_SIZE, N_HEADS, SEQ_LENGTH, DIM_PER_HEAD)
@@ -28,6 +79,27 @@ def compute_multihead_attention(queries, keys, values, projection_matrix) -> tor
     return attention @ projection_matrix.T
 
 
+def compute_multihead_attention_batched(queries, keys, values, projection_matrix, use_sdpa=True) -> torch.Tensor:
+    """
+    queries- (BATCH_SIZE, N_HEADS, SEQ_LENGTH, DIM_PER_HEAD)
+    keys- (BATCH_SIZE, N_HEADS, SEQ_LENGTH, DIM_PER_HEAD)
+    values- (BATCH_SIZE, N_HEADS, SEQ_LENGTH, DIM_PER_HEAD)
+    projection_matrix- (N_HEADS*DIM_PER_HEAD, N_HEADS*DIM_PER_HEAD)
+
+    Same result as compute_multihead_attention, but all heads are computed by one batched matmul
+    (or F.scaled_dot_product_attention if use_sdpa and it is available), and the output projection
+    contracts over (head, dim) with projection_matrix reshaped to (OUT_DIM, N_HEADS, DIM_PER_HEAD),
+    so the heads are never concatenated.
+    """
+    n_heads, dim_per_head = keys.shape[1], keys.shape[3]
+    if use_sdpa and hasattr(F, 'scaled_dot_product_attention'):
+        attention = F.scaled_dot_product_attention(queries, keys, values)
+    else:
+        attention = F.softmax((queries @ keys.mT) / np.sqrt(dim_per_head), dim=-1) @ values
+    projection = projection_matrix.reshape(projection_matrix.shape[0], n_heads, dim_per_head)
+    return torch.tensordot(attention, projection, dims=([1, 3], [1, 2]))
+
+
 def generate_rotation_matrices(frequencies, i):
     matrices = []
     for freq in frequencies:
@@ -56,3 +128,69 @@ def compute_rotary_embeddings(x)-> torch.Tensor:
     
     result = transformed_x.reshape(batch_size, n_heads, seq_length, dim_per_head).permute(0, 2, 1, 3)
     return result
+
+
+class RotaryEmbedding:
+    """
+    Rotary embeddings with precomputed cos/sin tables.
+
+    Same result as compute_rotary_embeddings (pairs (2i, 2i+1) are rotated by the angle position * theta_i,
+    theta_i = base ** (-2i / dim)), but the rotation is applied with elementwise ops on the even and odd
+    elements instead of a (DIM_PER_HEAD, DIM_PER_HEAD) matrix per position.
+    Tables of shape (max_seq_len, dim // 2) are computed once per (dtype, device) and grown
+    (at least doubled) when a longer sequence arrives.
+    """
+    def __init__(self, dim, base=10000, max_seq_len=2048):
+        self.dim = dim
+        self.base = base
+        self.max_seq_len = max_seq_len
+        # Angles are computed in float32 as in compute_rotary_embeddings
+        self.theta = (base ** (-2 * torch.arange(dim // 2, dtype=torch.float64) / dim)).float()
+        self._tables = {}
+
+    def tables(self, seq_length, dtype=torch.float32, device=None):
+        """
+        returns cos, sin- (seq_length, dim // 2)
+        """
+        key = (dtype, torch.device(device) if device is not None else torch.device('cpu'))
+        cached = self._tables.get(key)
+        if cached is None or cached[0].shape[0] < seq_length:
+            max_seq_len = max(seq_length, self.max_seq_len, 2 * cached[0].shape[0] if cached is not None else 0)
+            angles = torch.arange(max_seq_len, dtype=torch.float32)[:, None] * self.theta
+            cached = (angles.cos().to(dtype=dtype, device=key[1]), angles.sin().to(dtype=dtype, device=key[1]))
+            self._tables[key] = cached
+            self.max_seq_len = max_seq_len
+        return cached[0][:seq_length], cached[1][:seq_length]
+
+    def __call__(self, x, position_ids=None, offset=0) -> torch.Tensor:
+        """
+        x- (BATCH_SIZE, SEQ_LENGTH, N_HEADS, DIM_PER_HEAD)
+        position_ids- (SEQ_LENGTH,) or (BATCH_SIZE, SEQ_LENGTH) positions of the tokens or None
+        offset- scalar (int, 0-d tensor, numpy integer) or (BATCH_SIZE,) tensor, position of the first token
+                if position_ids is None
+
+        For incremental decoding with a KV cache only the new tokens are rotated: pass offset equal to
+        the number of cached tokens (per batch row for ragged batches) instead of rotating the whole prefix.
+        """
+        seq_length = x.shape[1]
+        offset = torch.as_tensor(offset)
+        if position_ids is None and offset.dim() == 0:
+            offset = int(offset)
+            cos, sin = self.tables(offset + seq_length, x.dtype, x.device)
+            return apply_rotation(x, cos[offset:, None], sin[offset:, None])
+
+        if position_ids is None:
+            position_ids = offset[:, None] + torch.arange(seq_length, device=offset.device)
+        cos, sin = self.tables(int(position_ids.max()) + 1, x.dtype, x.device)
+        position_ids = position_ids.to(cos.device)
+        return apply_rotation(x, cos[position_ids].unsqueeze(-2), sin[position_ids].unsqueeze(-2))
+
+
+def apply_rotation(x, cos, sin) -> torch.Tensor:
+    """
+    x- (..., DIM_PER_HEAD)
+    cos, sin- broadcastable to (..., DIM_PER_HEAD // 2)
+    """
+    x_even, x_odd = x[..., 0::2], x[..., 1::2]
+    rotated = torch.stack((x_even * cos - x_odd * sin, x_even * sin + x_odd * cos), dim=-1)
+    return rotated.flatten(-2)
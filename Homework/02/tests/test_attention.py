@@ -6,7 +6,9 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
-from solution import compute_attention, compute_multihead_attention
+from solution import (
+    compute_attention, compute_attention_tiled, compute_multihead_attention, compute_multihead_attention_batched
+)
 
 
 N_HEADS = 3
@@ -58,3 +60,97 @@ class TestAttention(unittest.TestCase):
         self.assertTrue(
             torch.allclose(default_mha, custom_mha, atol=1e-7)
         )
+
+        for use_sdpa in (True, False):
+            batched_mha = compute_multihead_attention_batched(
+                queries=q_, keys=k_, values=v_, projection_matrix=mha.out_proj.weight, use_sdpa=use_sdpa
+            )
+            self.assertTrue(
+                torch.allclose(default_mha, batched_mha, atol=1e-7)
+            )
+
+
+class TestTiledAttention(unittest.TestCase):
+
+    def test_matches_full_attention(self):
+        for block_size in (1, 7, 32, SEQ_LENGTH, 1000):
+            with self.subTest(block_size=block_size):
+                tiled_out = compute_attention_tiled(q, k, v, block_size=block_size)
+                self.assertTrue(
+                    torch.allclose(tiled_out, compute_attention(q, k, v), atol=1e-6)
+                )
+
+    def test_causal(self):
+        for block_size in (16, 50):
+            with self.subTest(block_size=block_size):
+                tiled_out = compute_attention_tiled(q, k, v, causal=True, block_size=block_size)
+                default_out = F.scaled_dot_product_attention(q, k, v, is_causal=True)
+                self.assertTrue(torch.allclose(tiled_out, default_out, atol=1e-6))
+
+    def test_different_kv_length(self):
+        k_long, v_long = torch.randn(2, 45, 16), torch.randn(2, 45, 8)
+        q_short = torch.randn(2, 20, 16)
+        for causal in (False, True):
+            with self.subTest(causal=causal):
+                tiled_out = compute_attention_tiled(q_short, k_long, v_long, causal=causal, block_size=8)
+                default_out = F.scaled_dot_product_attention(q_short, k_long, v_long, is_causal=causal)
+                self.assertEqual(tiled_out.shape, (2, 20, 8))
+                self.assertTrue(torch.allclose(tiled_out, default_out, atol=1e-6))
+
+    def test_bias(self):
+        bias = torch.randn(BATCH_SIZE, SEQ_LENGTH, SEQ_LENGTH)
+        tiled_out = compute_attention_tiled(q, k, v, bias=bias, block_size=48)
+        default_out = F.scaled_dot_product_attention(q, k, v, attn_mask=bias)
+        self.assertTrue(torch.allclose(tiled_out, default_out, atol=1e-6))
+
+    def test_broadcast_padding_bias(self):
+        # Key padding mask of shape (BATCH_SIZE, 1, SEQ_LENGTH): the last 28 keys are masked out
+        bias = torch.zeros(BATCH_SIZE, 1, SEQ_LENGTH)
+        bias[:, :, 100:] = -torch.inf
+        tiled_out = compute_attention_tiled(q, k, v, causal=True, bias=bias, block_size=32)
+        causal_mask = torch.ones(SEQ_LENGTH, SEQ_LENGTH, dtype=torch.bool).tril()
+        default_out = F.scaled_dot_product_attention(q, k, v, attn_mask=causal_mask & (bias == 0))
+        self.assertTrue(torch.allclose(tiled_out, default_out, atol=1e-6))
+        self.assertFalse(tiled_out.isnan().any())
+
+    def test_multihead_shapes_and_gradients(self):
+        q_, k_, v_ = (torch.randn(2, 4, 33, 16, requires_grad=True) for _ in range(3))
+        tiled_out = compute_attention_tiled(q_, k_, v_, causal=True, block_size=8)
+        default_out = F.scaled_dot_product_attention(q_, k_, v_, is_causal=True)
+        self.assertTrue(torch.allclose(tiled_out, default_out, atol=1e-6))
+
+        tiled_grads = torch.autograd.grad(tiled_out.sum(), (q_, k_, v_))
+        default_grads = torch.autograd.grad(default_out.sum(), (q_, k_, v_))
+        for tiled_grad, default_grad in zip(tiled_grads, default_grads):
+            self.assertTrue(torch.allclose(tiled_grad, default_grad, atol=1e-5))
+
+
+class TestBatchedMultiheadAttention(unittest.TestCase):
+
+    def test_matches_per_head_loop(self):
+        for n_heads in (1, 2, 8):
+            q_, k_, v_ = (torch.randn(4, n_heads, 40, 16) for _ in range(3))
+            projection = torch.randn(n_heads * 16, n_heads * 16) / 8
+            loop_out = compute_multihead_attention(q_, k_, v_, projection)
+            for use_sdpa in (True, False):
+                with self.subTest(n_heads=n_heads, use_sdpa=use_sdpa):
+                    batched_out = compute_multihead_attention_batched(q_, k_, v_, projection, use_sdpa=use_sdpa)
+                    self.assertEqual(batched_out.shape, (4, 40, n_heads * 16))
+                    self.assertTrue(torch.allclose(batched_out, loop_out, atol=1e-6))
+
+    def test_rectangular_projection(self):
+        q_, k_, v_ = (torch.randn(2, 3, 10, 8) for _ in range(3))
+        projection = torch.randn(5, 24)
+        loop_out = compute_multihead_attention(q_, k_, v_, projection)
+        batched_out = compute_multihead_attention_batched(q_, k_, v_, projection)
+        self.assertEqual(batched_out.shape, (2, 10, 5))
+        self.assertTrue(torch.allclose(batched_out, loop_out, atol=1e-5))
+
+    def test_non_contiguous_projection(self):
+        q_, k_, v_ = (torch.randn(2, 4, 10, 8) for _ in range(3))
+        # e.g. a transposed weight (x @ W instead of x @ W.T)
+        projection = torch.randn(32, 32).T
+        self.assertFalse(projection.is_contiguous())
+        loop_out = compute_multihead_attention(q_, k_, v_, projection)
+        batched_out = compute_multihead_attention_batched(q_, k_, v_, projection)
+        self.assertTrue(torch.allclose(batched_out, loop_out, atol=1e-5))
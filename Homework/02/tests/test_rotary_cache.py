@@ -0,0 +1,104 @@
+import sys
+sys.path.append("Homework/02")
+import unittest
+
+import numpy as np
+import torch
+
+from solution import RotaryEmbedding, compute_rotary_embeddings
+
+
+N_HEADS = 3
+DIM_PER_HEAD = 64
+BATCH_SIZE = 32
+SEQ_LENGTH = 128
+
+x = torch.rand(BATCH_SIZE, SEQ_LENGTH, N_HEADS, DIM_PER_HEAD)
+
+
+class TestRotaryEmbedding(unittest.TestCase):
+
+    def test_matches_rotation_matrices(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD)
+        self.assertTrue(
+            torch.allclose(rope(x), compute_rotary_embeddings(x), atol=1e-6)
+        )
+
+    def test_tables_are_cached_and_grown(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD, max_seq_len=16)
+        cos, sin = rope.tables(10)
+        self.assertEqual(cos.shape, (10, DIM_PER_HEAD // 2))
+        self.assertEqual(rope.max_seq_len, 16)
+
+        cached_cos, _ = rope.tables(16)
+        self.assertEqual(cached_cos.data_ptr(), cos.data_ptr())
+
+        rope(x[:, :40])
+        self.assertEqual(rope.max_seq_len, 40)
+        rope(x[:, :41])
+        self.assertEqual(rope.max_seq_len, 80)
+        long_cos, long_sin = rope.tables(40)
+        self.assertTrue(torch.equal(long_cos[:10], cos))
+        self.assertTrue(torch.equal(long_sin[:10], sin))
+
+    def test_dtype(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD)
+        out = rope(x.double())
+        self.assertEqual(out.dtype, torch.float64)
+        self.assertTrue(torch.allclose(out.float(), rope(x), atol=1e-6))
+        self.assertEqual(len(rope._tables), 2)
+
+    def test_base(self):
+        y = x[:2, :8]
+        rope = RotaryEmbedding(DIM_PER_HEAD, base=10)
+        cos, sin = rope.tables(8)
+        self.assertTrue(torch.allclose(cos[3, 1], torch.cos(torch.tensor(3 * 10 ** (-2 / DIM_PER_HEAD)))))
+        self.assertFalse(torch.allclose(rope(y), RotaryEmbedding(DIM_PER_HEAD)(y)))
+
+
+class TestRotaryPositions(unittest.TestCase):
+
+    def test_offset_decoding(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD, max_seq_len=8)
+        full = rope(x)
+        steps = [rope(x[:, i:i + 1], offset=i) for i in range(SEQ_LENGTH)]
+        self.assertTrue(torch.allclose(torch.cat(steps, dim=1), full, atol=1e-6))
+
+        chunk = rope(x[:, 100:], offset=100)
+        self.assertTrue(torch.equal(chunk, full[:, 100:]))
+        for offset in (torch.tensor(100), np.int64(100), torch.tensor([100] * BATCH_SIZE), np.full(BATCH_SIZE, 100)):
+            with self.subTest(offset=type(offset)):
+                self.assertTrue(torch.allclose(rope(x[:, 100:], offset=offset), chunk, atol=1e-6))
+
+    def test_position_ids(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD)
+        full = rope(x)
+        positions = torch.tensor([5, 0, 17])
+        self.assertTrue(torch.allclose(rope(x[:, positions], position_ids=positions), full[:, positions], atol=1e-6))
+
+        batch_positions = torch.randint(0, SEQ_LENGTH, (BATCH_SIZE, 10))
+        rows = torch.arange(BATCH_SIZE)[:, None]
+        out = rope(x[rows, batch_positions], position_ids=batch_positions)
+        self.assertTrue(torch.allclose(out, full[rows, batch_positions], atol=1e-6))
+
+    def test_per_row_offsets(self):
+        # Ragged batch: row b has lengths[b] cached tokens, the new token of each row is rotated at its own position
+        rope = RotaryEmbedding(DIM_PER_HEAD)
+        full = rope(x)
+        lengths = torch.randint(0, SEQ_LENGTH - 2, (BATCH_SIZE,))
+        rows = torch.arange(BATCH_SIZE)[:, None]
+        positions = lengths[:, None] + torch.arange(2)
+        out = rope(x[rows, positions], offset=lengths)
+        self.assertEqual(out.shape, (BATCH_SIZE, 2, N_HEADS, DIM_PER_HEAD))
+        self.assertTrue(torch.allclose(out, full[rows, positions], atol=1e-6))
+
+    def test_tables_grow_for_large_positions(self):
+        rope = RotaryEmbedding(DIM_PER_HEAD, max_seq_len=4)
+        y = x[:2, :1]
+        out = rope(y, offset=torch.tensor([3, 1000]))
+        self.assertEqual(rope.max_seq_len, 1001)
+        self.assertTrue(torch.allclose(out[1], RotaryEmbedding(DIM_PER_HEAD)(y[1:], offset=1000)[0]))
+        cos, sin = rope.tables(1001)
+        angles = 1000 * rope.theta
+        self.assertTrue(torch.allclose(cos[1000], angles.cos(), atol=1e-6))
+        self.assertTrue(torch.allclose(sin[1000], angles.sin(), atol=1e-6))